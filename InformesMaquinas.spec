@@ -26,7 +26,8 @@ exe = EXE(
     debug=False,
     bootloader_ignore_signals=False,
     strip=False,
-    upx=True,
+    # UPX reduce el ejecutable pero cada arranque paga la descompresión de todas las bibliotecas
+    upx=False,
     upx_exclude=[],
     runtime_tmpdir=None,
     console=False,
@@ -0,0 +1,150 @@
+"""Cantidad de informes por máquina y periodo (día, semana o mes).
+
+Las cifras salen de `informes_periodo`, que guarda el total de cada máquina
+por día, semana y mes y que los triggers de informes mantienen al día con
+cada alta, edición o borrado (como maquina_stats). Los periodos que el rango
+cubre enteros se leen tal cual; los extremos parciales de una semana o un mes
+se suman desde los totales por día. La consulta solo lee: no hay nada que
+recalcular ni guardar después de una escritura.
+"""
+from datetime import timedelta
+
+# Inicio del periodo de una fecha en SQL, por agrupación (las semanas empiezan el lunes).
+# Los triggers de informes_periodo usan las mismas expresiones sobre old.fecha y new.fecha
+PERIODOS_SQL = {
+    'dia': "{fecha}",
+    'semana': "date({fecha}, '-6 days', 'weekday 1')",
+    'mes': "substr({fecha}, 1, 8) || '01'",
+}
+AGRUPACIONES = tuple(PERIODOS_SQL)
+
+
+def inicio_periodo(agrupacion, dia):
+    """Primer día del periodo que contiene `dia`"""
+    if agrupacion == 'semana':
+        return dia - timedelta(days=dia.weekday())
+    if agrupacion == 'mes':
+        return dia.replace(day=1)
+    return dia
+
+
+def siguiente_periodo(agrupacion, inicio):
+    """Primer día del periodo siguiente al que empieza en `inicio`"""
+    if agrupacion == 'semana':
+        return inicio + timedelta(days=7)
+    if agrupacion == 'mes':
+        return (inicio.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return inicio + timedelta(days=1)
+
+
+def tramos(agrupacion, fecha_inicio, fecha_fin):
+    """(periodo, desde, hasta, entero) por cada periodo que toca el rango.
+
+    `desde` y `hasta` son los días del periodo dentro del rango; `entero`
+    indica que el rango cubre el periodo completo.
+    """
+    inicio = inicio_periodo(agrupacion, fecha_inicio)
+    while inicio <= fecha_fin:
+        siguiente = siguiente_periodo(agrupacion, inicio)
+        fin = siguiente - timedelta(days=1)
+        desde, hasta = max(inicio, fecha_inicio), min(fin, fecha_fin)
+        yield inicio, desde, hasta, desde == inicio and hasta == fin
+        inicio = siguiente
+
+
+def cantidad_periodos(agrupacion, fecha_inicio, fecha_fin):
+    """Cuántos periodos toca el rango (para acotar las consultas)"""
+    if fecha_fin < fecha_inicio:
+        return 0
+    if agrupacion == 'mes':
+        return (fecha_fin.year - fecha_inicio.year) * 12 + fecha_fin.month - fecha_inicio.month + 1
+    dias = (fecha_fin - inicio_periodo(agrupacion, fecha_inicio)).days
+    return dias // 7 + 1 if agrupacion == 'semana' else dias + 1
+
+
+def agrupacion_para_rango(fecha_inicio, fecha_fin):
+    """Agrupación legible para un rango: días hasta un mes, semanas hasta medio año, luego meses"""
+    dias = (fecha_fin - fecha_inicio).days + 1
+    if dias <= 31:
+        return 'dia'
+    return 'semana' if dias <= 183 else 'mes'
+
+
+def reconstruir_conteos_periodo(conn):
+    """Recalcula informes_periodo desde los informes.
+
+    Los triggers la mantienen al día; esto sirve para la migración inicial o
+    para corregirla si se editó la base fuera de la aplicación. Debe llamarse
+    dentro de una transacción.
+    """
+    conn.execute("DELETE FROM informes_periodo")
+    for agrupacion, sql in PERIODOS_SQL.items():
+        periodo = sql.format(fecha='fecha')
+        conn.execute(f"""INSERT INTO informes_periodo (agrupacion, periodo, maquina_id, total)
+                         SELECT ?, {periodo}, maquina_id, COUNT(*)
+                         FROM informes
+                         GROUP BY 2, 3""", (agrupacion,))
+
+
+def conteos_por_periodo(conn, agrupacion, fecha_inicio, fecha_fin):
+    """Lista de (periodo, {maquina_id: total}) en orden, uno por periodo del rango.
+
+    Una sola consulta (y por tanto una sola instantánea de los datos): los
+    periodos enteros salen de sus filas en informes_periodo y los extremos
+    parciales, de la suma de sus días.
+    """
+    todos = list(tramos(agrupacion, fecha_inicio, fecha_fin))
+    partes = []
+    parametros = []
+    enteros = [t for t in todos if t[3]]
+    if enteros:
+        partes.append("""SELECT periodo, maquina_id, total FROM informes_periodo
+                         WHERE agrupacion = ? AND periodo BETWEEN ? AND ?""")
+        parametros += [agrupacion, enteros[0][0].isoformat(), enteros[-1][0].isoformat()]
+    periodo = PERIODOS_SQL[agrupacion].format(fecha='periodo')
+    for _, desde, hasta, entero in todos:
+        if not entero:
+            partes.append(f"""SELECT {periodo}, maquina_id, SUM(total) FROM informes_periodo
+                              WHERE agrupacion = 'dia' AND periodo BETWEEN ? AND ?
+                              GROUP BY 1, 2""")
+            parametros += [desde.isoformat(), hasta.isoformat()]
+
+    conteos = {}
+    for inicio, maquina_id, total in conn.execute(' UNION ALL '.join(partes), parametros):
+        conteos.setdefault(inicio, {})[maquina_id] = total
+    return [(inicio.isoformat(), conteos.get(inicio.isoformat(), {})) for inicio, _, _, _ in todos]
+
+
+def actividad_maquinas(conn, agrupacion, fecha_inicio, fecha_fin, maquina_id=None, limite=None):
+    """Informes por máquina y periodo, con las máquinas de más a menos informes.
+
+    Devuelve un diccionario listo para enviar como JSON: los `periodos` (su
+    primer día), el `total` del rango, los totales `por_periodo` y, por cada
+    máquina con informes, su `total` y sus `conteos` alineados con `periodos`.
+    Con `limite` solo se incluyen las máquinas con más informes.
+    """
+    serie = conteos_por_periodo(conn, agrupacion, fecha_inicio, fecha_fin)
+    periodos = [periodo for periodo, _ in serie]
+    nombres = dict(conn.execute("SELECT id, nombre FROM maquinas"))
+
+    maquinas = {}
+    for indice, (_, totales) in enumerate(serie):
+        for id, total in totales.items():
+            if maquina_id is not None and id != maquina_id:
+                continue
+            if id not in maquinas:
+                maquinas[id] = [0] * len(serie)
+            maquinas[id][indice] = total
+
+    filas = [{'id': id, 'nombre': nombres.get(id, ''), 'total': sum(conteos), 'conteos': conteos}
+             for id, conteos in maquinas.items()]
+    filas.sort(key=lambda fila: (-fila['total'], fila['nombre']))
+    return {
+        'agrupacion': agrupacion,
+        'fecha_inicio': fecha_inicio.isoformat(),
+        'fecha_fin': fecha_fin.isoformat(),
+        'periodos': periodos,
+        'total': sum(fila['total'] for fila in filas),
+        'por_periodo': [sum(fila['conteos'][i] for fila in filas) for i in range(len(periodos))],
+        'maquinas': filas[:limite] if limite else filas,
+    }
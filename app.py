@@ -1,12 +1,50 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, send_file
-from datetime import datetime
+from flask import (Flask, render_template, request, redirect, url_for, flash, send_file, jsonify, Response,
+                   stream_with_context, session, make_response, g, has_request_context)
+from werkzeug.http import is_resource_modified
+from werkzeug.serving import is_running_from_reloader
+from datetime import date, datetime, timedelta, timezone
 import os
 import sys
 import sqlite3
 import json
-from fpdf import FPDF
-from PIL import Image
+import multiprocessing
+import base64
+import hashlib
+import re
+import shutil
+import tempfile
+import threading
+import time
+import db
+from db import conexion
+from migraciones import migrar
+from modelos import (COLUMNAS_INFORME, TABLAS_INFORME, IdsMaquinas, consultar_estado_datos, consultar_informes,
+                     consultar_maquinas_con_informes, consultar_maquinas_con_estadisticas, consultar_rango_fechas,
+                     consultar_version_datos, incrementar_version_datos,
+                     informe_desde_fila, reconstruir_estadisticas_maquinas)
+from informes_pdf import formatear_periodo, generar_informe
+from imagenes import (CacheDerivados, ImagenInvalida, ProcesadorImagenes, migrar_imagenes_antiguas, preparar_imagen,
+                      purgar_imagenes, validar_imagen)
+from trabajos_pdf import ColaInformes, PaqueteMaquinas, TERMINADO, resumen_actividad
+from cache_informes import CacheInformes
+from cache_fragmentos import CacheFragmentos
+from jinja2 import FileSystemBytecodeCache
+from busqueda import buscar_informes
+from importacion import Importador, detectar_formato, escribir_reporte_errores, leer_filas
+from exportacion import FORMATOS, GENERADORES, comprimir_gzip, consultar_filas_exportacion, generar_zip
+from metricas import Fases, MetricasAplicacion
+from limpieza import Limpiador
+from sincronizacion import codificar_respuesta, consultar_cambios
+from analitica import AGRUPACIONES, actividad_maquinas, cantidad_periodos, reconstruir_conteos_periodo
 import io
+import zipfile
+import click
+
+# En el ejecutable (PyInstaller) cada proceso de informes vuelve a ejecutar este archivo
+# como __main__: freeze_support() lo desvía a su tarea antes de crear carpetas, pools
+# o aplicar migraciones. Fuera del ejecutable no hace nada
+if __name__ == '__main__':
+    multiprocessing.freeze_support()
 
 # Función para obtener el directorio de recursos
 def resource_path(relative_path):
@@ -24,239 +62,435 @@ app.config['SECRET_KEY'] = 'tu_clave_secreta_aqui'
 app.config['UPLOAD_FOLDER'] = resource_path('static/uploads')
 app.config['REPORT_FOLDER'] = resource_path('reports')
 app.config['DATABASE'] = get_database_path()
+app.config['IMAGE_CACHE_FOLDER'] = resource_path('cache/imagenes')
+app.config['IMAGE_CACHE_MAX_BYTES'] = 200 * 1024 * 1024
+app.config['IMAGE_MAX_BYTES'] = 5 * 1024 * 1024
+app.config['IMAGE_WORKERS'] = 2
+app.config['PDF_WORKERS'] = 2
+# Procesos para el paquete de un PDF por máquina (uno por núcleo)
+app.config['PDF_BUNDLE_WORKERS'] = os.cpu_count() or 2
+app.config['REPORT_CACHE_MAX_BYTES'] = 500 * 1024 * 1024
+app.config['REPORT_CACHE_MAX_ENTRIES'] = 200
+# Plantillas compiladas en disco (None lo desactiva) y fragmentos HTML en memoria (0 entradas lo desactiva)
+app.config['TEMPLATE_CACHE_FOLDER'] = resource_path('cache/plantillas')
+app.config['FRAGMENT_CACHE_MAX_ENTRIES'] = 500
+app.config['FRAGMENT_CACHE_MAX_BYTES'] = 32 * 1024 * 1024
+app.config['DB_POOL_SIZE'] = 8
+app.config['INFORMES_POR_PAGINA'] = 20
+app.config['INFORMES_POR_PAGINA_MAX'] = 100
+app.config['RESULTADOS_BUSQUEDA_POR_PAGINA'] = 20
+app.config['IMPORTACION_TAMANO_LOTE'] = 1000
+app.config['UPLOADS_MAX_AGE'] = 365 * 24 * 3600
+# Servidor de producción (python app.py); los hilos no deberían superar DB_POOL_SIZE
+app.config['SERVER_HOST'] = '127.0.0.1'
+app.config['SERVER_PORT'] = 5000
+app.config['SERVER_THREADS'] = 8
+app.config['SERVER_CONNECTION_LIMIT'] = 100
+app.config['SERVER_BACKLOG'] = 64
+# Segundos que se esperan las peticiones en curso al detener el servidor
+app.config['SERVER_SHUTDOWN_TIMEOUT'] = 30
+# Limpieza en segundo plano: subidas sin informe e informes generados antiguos.
+# Nunca se tocan archivos más recientes que GC_GRACE_SECONDS (operaciones en curso)
+app.config['GC_INTERVAL_SECONDS'] = 3600
+app.config['GC_GRACE_SECONDS'] = 3600
+app.config['REPORT_MAX_AGE_DAYS'] = 7
+app.config['REPORT_JOBS_MAX_BYTES'] = 500 * 1024 * 1024
+# Sincronización incremental (/api/sincronizacion): cambios por lote, tope del lote en
+# bytes de filas, y días que se conservan las bajas antes de obligar a resincronizar
+app.config['SYNC_BATCH_SIZE'] = 500
+app.config['SYNC_BATCH_MAX'] = 5000
+app.config['SYNC_MAX_BYTES'] = 512 * 1024
+app.config['SYNC_TOMBSTONE_MAX_AGE_DAYS'] = 90
+# Analítica (/api/analitica): días que abarca si no se indica fecha_inicio y máximo de periodos por consulta
+app.config['ANALYTICS_DEFAULT_DAYS'] = 365
+app.config['ANALYTICS_MAX_PERIODS'] = 400
+# Registrar en consola las peticiones que tarden más de estos segundos (None lo desactiva)
+app.config['SLOW_REQUEST_SECONDS'] = None
+db.init_app(app)
 
-# Crear directorios si no existen
-for folder in [app.config['UPLOAD_FOLDER'], app.config['REPORT_FOLDER']]:
-    if not os.path.exists(folder):
-        os.makedirs(folder)
+# Momento del arranque; una versión nueva de las plantillas invalida las páginas que tenga el navegador
+ARRANQUE = datetime.now(timezone.utc).replace(microsecond=0)
 
-# Inicializar la base de datos
-def init_db():
-    """Inicializar la base de datos con las tablas necesarias"""
-    try:
-        conn = sqlite3.connect(app.config['DATABASE'])
-        c = conn.cursor()
-        
-        # Crear tabla de máquinas
-        c.execute('''CREATE TABLE IF NOT EXISTS maquinas
-                     (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                      nombre TEXT UNIQUE NOT NULL)''')
-        
-        # Crear tabla de informes
-        c.execute('''CREATE TABLE IF NOT EXISTS informes
-                     (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                      nombre_maquina TEXT NOT NULL,
-                      fecha DATE NOT NULL,
-                      hora TIME NOT NULL,
-                      descripcion TEXT NOT NULL,
-                      imagen TEXT,
-                      creado_en TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                      FOREIGN KEY (nombre_maquina) REFERENCES maquinas (nombre))''')
-        
-        conn.commit()
-        conn.close()
-        print("Base de datos inicializada correctamente")
-    except Exception as e:
-        print(f"Error inicializando base de datos: {e}")
-
-# Función auxiliar para parsear hora de manera segura
-def parse_hora(hora_str):
-    try:
-        if hora_str and hora_str.strip():  # Si hay hora y no está vacía
-            return datetime.strptime(hora_str, '%H:%M').time()
-        else:  # Si no hay hora, usar medianoche
-            return datetime.strptime('00:00', '%H:%M').time()
-    except ValueError:
-        # En caso de error, usar medianoche
-        return datetime.strptime('00:00', '%H:%M').time()
+# Métricas de peticiones, consultas SQL, informes PDF y caché de fragmentos (expuestas en /metrics)
+metricas = MetricasAplicacion()
 
-# Función para redimensionar imagen manteniendo proporciones
-def resize_image(image_path, max_width=150, max_height=150):
-    try:
-        with Image.open(image_path) as img:
-            # Calcular nuevas dimensiones manteniendo proporciones
-            img.thumbnail((max_width, max_height), Image.Resampling.LANCZOS)
-            return img
-    except Exception:
-        return None
+# Cachés, pools e hilos de fondo: los crea iniciar_aplicacion(), nunca la importación.
+# Los procesos de informes (spawn) vuelven a importar este módulo y solo usan las
+# funciones de trabajos_pdf, así que no crean carpetas, pools ni hilos
+PREFIJO_SUBIDAS = None
+cache_imagenes = None
+procesador_imagenes = None
+cache_informes = None
+cache_fragmentos = None
+cola_informes = None
+paquete_maquinas = None
+limpiador = None
+_iniciada = False
+_bloqueo_inicio = threading.Lock()
+
+# Contar cada consulta SQL en el total y, dentro de una petición, en los de la petición
+def medir_consulta(sql, segundos):
+    metricas.registrar_consulta(segundos)
+    if has_request_context() and 'inicio_peticion' in g:
+        g.consultas_sql += 1
+        g.segundos_sql += segundos
+
+# Id de cada máquina por nombre; las URLs usan el nombre y los informes el id
+ids_maquinas = IdsMaquinas()
 
 # Obtener todas las máquinas
 def get_maquinas():
     """Obtener todas las máquinas de la base de datos"""
     try:
-        conn = sqlite3.connect(app.config['DATABASE'])
-        c = conn.cursor()
-        c.execute("SELECT id, nombre FROM maquinas ORDER BY nombre")
-        maquinas = [{'id': row[0], 'nombre': row[1]} for row in c.fetchall()]
-        conn.close()
-        return maquinas
+        with conexion() as conn:
+            c = conn.cursor()
+            c.execute("SELECT id, nombre FROM maquinas ORDER BY nombre")
+            return [{'id': row[0], 'nombre': row[1]} for row in c.fetchall()]
     except sqlite3.OperationalError as e:
         print(f"Error obteniendo máquinas: {e}")
-        # Intentar crear las tablas si no existen
-        crear_tablas_iniciales()
+        # Intentar aplicar las migraciones pendientes
+        migrar()
         # Intentar de nuevo
         try:
-            conn = sqlite3.connect(app.config['DATABASE'])
-            c = conn.cursor()
-            c.execute("SELECT id, nombre FROM maquinas ORDER BY nombre")
-            maquinas = [{'id': row[0], 'nombre': row[1]} for row in c.fetchall()]
-            conn.close()
-            return maquinas
+            with conexion() as conn:
+                c = conn.cursor()
+                c.execute("SELECT id, nombre FROM maquinas ORDER BY nombre")
+                return [{'id': row[0], 'nombre': row[1]} for row in c.fetchall()]
         except:
             return []
 
+# Obtener las máquinas con el resumen de sus informes (una sola consulta)
+def get_maquinas_con_estadisticas():
+    mes = date.today().strftime('%Y-%m')
+    try:
+        with conexion() as conn:
+            return consultar_maquinas_con_estadisticas(conn, mes)
+    except sqlite3.OperationalError as e:
+        print(f"Error obteniendo estadísticas de máquinas: {e}")
+        # Intentar aplicar las migraciones pendientes
+        migrar()
+        with conexion() as conn:
+            return consultar_maquinas_con_estadisticas(conn, mes)
+
 # Agregar una máquina
 def add_maquina(nombre):
-    conn = sqlite3.connect(app.config['DATABASE'])
-    c = conn.cursor()
-    try:
-        c.execute("INSERT INTO maquinas (nombre) VALUES (?)", (nombre,))
-        conn.commit()
-        result = True
-    except sqlite3.IntegrityError:
-        result = False
-    conn.close()
-    return result
-
-# Eliminar una máquina y sus informes
+    with conexion() as conn:
+        try:
+            with conn:
+                conn.execute("INSERT INTO maquinas (nombre) VALUES (?)", (nombre,))
+                incrementar_version_datos(conn)
+            return True
+        except sqlite3.IntegrityError:
+            return False
+
+# Obtener el id de una máquina por su nombre (None si no existe)
+def get_id_maquina(nombre):
+    with conexion() as conn:
+        return ids_maquinas.obtener(conn, nombre)
+
+# Eliminar una máquina; sus informes se borran en cascada (informes.maquina_id)
 def delete_maquina(nombre):
-    conn = sqlite3.connect(app.config['DATABASE'])
-    c = conn.cursor()
-    c.execute("DELETE FROM informes WHERE nombre_maquina = ?", (nombre,))
-    c.execute("DELETE FROM maquinas WHERE nombre = ?", (nombre,))
-    conn.commit()
-    conn.close()
+    with conexion() as conn, conn:
+        conn.execute("DELETE FROM maquinas WHERE nombre = ?", (nombre,))
+        incrementar_version_datos(conn)
+    # Después de confirmar, para que nadie vuelva a guardar el id borrado
+    ids_maquinas.olvidar(nombre)
+    purgar_imagenes_sin_uso()
 
 # Obtener informes por máquina
 def get_informes_por_maquina(nombre_maquina):
-    conn = sqlite3.connect(app.config['DATABASE'])
-    c = conn.cursor()
-    c.execute("""SELECT id, nombre_maquina, fecha, hora, descripcion, imagen, creado_en 
-                 FROM informes 
-                 WHERE nombre_maquina = ? 
-                 ORDER BY fecha DESC, hora DESC""", (nombre_maquina,))
-    informes = []
-    for row in c.fetchall():
-        informes.append({
-            'id': row[0],
-            'nombre_maquina': row[1],
-            'fecha': datetime.strptime(row[2], '%Y-%m-%d').date(),
-            'hora': parse_hora(row[3]),
-            'descripcion': row[4],
-            'imagen': row[5],
-            'creado_en': datetime.strptime(row[6], '%Y-%m-%d %H:%M:%S')
-        })
-    conn.close()
-    return informes
+    maquina_id = get_id_maquina(nombre_maquina)
+    if maquina_id is None:
+        return []
+    with conexion() as conn:
+        c = conn.cursor()
+        c.execute(f"""SELECT {COLUMNAS_INFORME}
+                      FROM {TABLAS_INFORME}
+                      WHERE i.maquina_id = ?
+                      ORDER BY i.fecha DESC, i.hora DESC""", (maquina_id,))
+        return [informe_desde_fila(row) for row in c.fetchall()]
+
+# Codificar la posición (fecha, hora, id) de un informe como cursor de página
+def codificar_cursor(fecha, hora, id):
+    crudo = json.dumps([fecha, hora, id], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(crudo).decode('ascii').rstrip('=')
+
+# Decodificar un cursor de página; devuelve None si no es válido
+def decodificar_cursor(cursor):
+    try:
+        crudo = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        fecha, hora, id = json.loads(crudo)
+        if isinstance(fecha, str) and isinstance(hora, str) and isinstance(id, int):
+            return fecha, hora, id
+    except (ValueError, TypeError):
+        pass
+    return None
+
+# Obtener una página de informes de una máquina (paginación por cursor)
+def get_pagina_informes_maquina(nombre_maquina, limite=20, despues=None, antes=None):
+    """Página de informes ordenados por (fecha, hora, id) descendente.
+
+    `despues` y `antes` son cursores (fecha, hora, id) ya decodificados. Solo
+    se leen limite + 1 filas del índice, sin OFFSET, para saber si hay más.
+    """
+    maquina_id = get_id_maquina(nombre_maquina)
+    if maquina_id is None:
+        return {'informes': [], 'anterior': None, 'siguiente': None}
+    with conexion() as conn:
+        c = conn.cursor()
+        if antes is not None:
+            # Página anterior: recorrer hacia arriba y luego invertir
+            c.execute(f"""SELECT {COLUMNAS_INFORME}
+                          FROM {TABLAS_INFORME}
+                          WHERE i.maquina_id = ? AND (i.fecha, i.hora, i.id) > (?, ?, ?)
+                          ORDER BY i.fecha, i.hora, i.id
+                          LIMIT ?""", (maquina_id, *antes, limite + 1))
+            filas = c.fetchall()
+            hay_mas = len(filas) > limite
+            filas = filas[:limite][::-1]
+            hay_anterior, hay_siguiente = hay_mas, True
+        else:
+            if despues is not None:
+                c.execute(f"""SELECT {COLUMNAS_INFORME}
+                              FROM {TABLAS_INFORME}
+                              WHERE i.maquina_id = ? AND (i.fecha, i.hora, i.id) < (?, ?, ?)
+                              ORDER BY i.fecha DESC, i.hora DESC, i.id DESC
+                              LIMIT ?""", (maquina_id, *despues, limite + 1))
+            else:
+                c.execute(f"""SELECT {COLUMNAS_INFORME}
+                              FROM {TABLAS_INFORME}
+                              WHERE i.maquina_id = ?
+                              ORDER BY i.fecha DESC, i.hora DESC, i.id DESC
+                              LIMIT ?""", (maquina_id, limite + 1))
+            filas = c.fetchall()
+            hay_siguiente = len(filas) > limite
+            filas = filas[:limite]
+            hay_anterior = despues is not None
+
+    return {
+        'informes': [informe_desde_fila(row) for row in filas],
+        'anterior': codificar_cursor(filas[0][2], filas[0][3], filas[0][0]) if filas and hay_anterior else None,
+        'siguiente': codificar_cursor(filas[-1][2], filas[-1][3], filas[-1][0]) if filas and hay_siguiente else None,
+    }
+
+# Recorrer informes ordenados por máquina, fecha y hora sin cargarlos todos en memoria
+def iter_informes(fecha_inicio=None, fecha_fin=None):
+    with conexion() as conn:
+        yield from consultar_informes(conn, fecha_inicio, fecha_fin)
 
 # Obtener todos los informes
 def get_all_informes():
-    conn = sqlite3.connect(app.config['DATABASE'])
-    c = conn.cursor()
-    c.execute("""SELECT id, nombre_maquina, fecha, hora, descripcion, imagen, creado_en 
-                 FROM informes 
-                 ORDER BY nombre_maquina, fecha, hora""")
-    informes = []
-    for row in c.fetchall():
-        informes.append({
-            'id': row[0],
-            'nombre_maquina': row[1],
-            'fecha': datetime.strptime(row[2], '%Y-%m-%d').date(),
-            'hora': parse_hora(row[3]),
-            'descripcion': row[4],
-            'imagen': row[5],
-            'creado_en': datetime.strptime(row[6], '%Y-%m-%d %H:%M:%S')
-        })
-    conn.close()
-    return informes
+    return list(iter_informes())
 
 # Obtener informes por rango de fechas
 def get_informes_por_fechas(fecha_inicio, fecha_fin):
-    conn = sqlite3.connect(app.config['DATABASE'])
-    c = conn.cursor()
-    c.execute("""SELECT id, nombre_maquina, fecha, hora, descripcion, imagen, creado_en 
-                 FROM informes 
-                 WHERE fecha BETWEEN ? AND ?
-                 ORDER BY nombre_maquina, fecha, hora""", (fecha_inicio, fecha_fin))
-    informes = []
-    for row in c.fetchall():
-        informes.append({
-            'id': row[0],
-            'nombre_maquina': row[1],
-            'fecha': datetime.strptime(row[2], '%Y-%m-%d').date(),
-            'hora': parse_hora(row[3]),
-            'descripcion': row[4],
-            'imagen': row[5],
-            'creado_en': datetime.strptime(row[6], '%Y-%m-%d %H:%M:%S')
-        })
-    conn.close()
-    return informes
+    return list(iter_informes(fecha_inicio, fecha_fin))
+
+# Obtener la primera y la última fecha con informes
+def get_rango_fechas():
+    with conexion() as conn:
+        return consultar_rango_fechas(conn)
+
+# Obtener la versión actual de los datos (para invalidar cachés)
+def get_version_datos():
+    with conexion() as conn:
+        return consultar_version_datos(conn)
+
+# Obtener la versión de los datos y la fecha de su última modificación
+def get_estado_datos():
+    with conexion() as conn:
+        return consultar_estado_datos(conn)
 
 # Obtener un informe por su ID
 def get_informe_by_id(id):
-    conn = sqlite3.connect(app.config['DATABASE'])
-    c = conn.cursor()
-    c.execute("""SELECT id, nombre_maquina, fecha, hora, descripcion, imagen, creado_en 
-                 FROM informes 
-                 WHERE id = ?""", (id,))
-    row = c.fetchone()
-    if row:
-        informe = {
-            'id': row[0],
-            'nombre_maquina': row[1],
-            'fecha': datetime.strptime(row[2], '%Y-%m-%d').date(),
-            'hora': parse_hora(row[3]),
-            'descripcion': row[4],
-            'imagen': row[5],
-            'creado_en': datetime.strptime(row[6], '%Y-%m-%d %H:%M:%S')
-        }
-        conn.close()
-        return informe
-    conn.close()
-    return None
+    with conexion() as conn:
+        c = conn.cursor()
+        c.execute(f"""SELECT {COLUMNAS_INFORME}
+                      FROM {TABLAS_INFORME}
+                      WHERE i.id = ?""", (id,))
+        row = c.fetchone()
+    return informe_desde_fila(row) if row else None
+
+# Borrar del disco las imágenes que ya no usa ningún informe
+def purgar_imagenes_sin_uso():
+    with conexion() as conn:
+        return purgar_imagenes(conn, app.config['UPLOAD_FOLDER'])
 
 # Actualizar un informe existente
-def update_informe(id, nombre_maquina, fecha, hora, descripcion, imagen=None):
-    conn = sqlite3.connect(app.config['DATABASE'])
-    c = conn.cursor()
-    
+def update_informe(id, maquina_id, fecha, hora, descripcion, imagen=None):
+    """`imagen` es una ImagenPreparada nueva o None para conservar la actual"""
+    try:
+        with conexion() as conn, conn:
+            c = conn.cursor()
+
+            if imagen is not None:
+                # Si se proporciona una nueva imagen, actualizar todos los campos incluyendo la imagen
+                c.execute("""UPDATE informes 
+                             SET maquina_id = ?, fecha = ?, hora = ?, descripcion = ?, imagen = ?
+                             WHERE id = ?""", 
+                          (maquina_id, fecha, hora, descripcion, imagen.nombre, id))
+                imagen.colocar()
+            else:
+                # Si no se proporciona una nueva imagen, actualizar solo los otros campos
+                c.execute("""UPDATE informes 
+                             SET maquina_id = ?, fecha = ?, hora = ?, descripcion = ?
+                             WHERE id = ?""", 
+                          (maquina_id, fecha, hora, descripcion, id))
+            incrementar_version_datos(conn)
+    finally:
+        if imagen is not None:
+            imagen.descartar()
     if imagen is not None:
-        # Si se proporciona una nueva imagen, actualizar todos los campos incluyendo la imagen
-        c.execute("""UPDATE informes 
-                     SET nombre_maquina = ?, fecha = ?, hora = ?, descripcion = ?, imagen = ?
-                     WHERE id = ?""", 
-                  (nombre_maquina, fecha, hora, descripcion, imagen, id))
-    else:
-        # Si no se proporciona una nueva imagen, actualizar solo los otros campos
-        c.execute("""UPDATE informes 
-                     SET nombre_maquina = ?, fecha = ?, hora = ?, descripcion = ?
-                     WHERE id = ?""", 
-                  (nombre_maquina, fecha, hora, descripcion, id))
-    
-    conn.commit()
-    conn.close()
+        # La imagen anterior se borra solo si ningún otro informe la usa
+        purgar_imagenes_sin_uso()
+        procesador_imagenes.encolar(imagen.nombre)
 
 # Agregar un informe
-def add_informe(nombre_maquina, fecha, hora, descripcion, imagen):
-    conn = sqlite3.connect(app.config['DATABASE'])
-    c = conn.cursor()
-    c.execute("""INSERT INTO informes (nombre_maquina, fecha, hora, descripcion, imagen)
-                 VALUES (?, ?, ?, ?, ?)""", 
-              (nombre_maquina, fecha, hora, descripcion, imagen))
-    conn.commit()
-    informe_id = c.lastrowid
-    conn.close()
-    return informe_id
+def add_informe(maquina_id, fecha, hora, descripcion, imagen=None):
+    """`imagen` es una ImagenPreparada (ver preparar_imagen_subida) o None"""
+    try:
+        with conexion() as conn, conn:
+            c = conn.cursor()
+            c.execute("""INSERT INTO informes (maquina_id, fecha, hora, descripcion, imagen)
+                         VALUES (?, ?, ?, ?, ?)""", 
+                      (maquina_id, fecha, hora, descripcion, imagen.nombre if imagen else None))
+            # Colocar el archivo con la referencia ya registrada y el candado de escritura tomado
+            if imagen is not None:
+                imagen.colocar()
+            incrementar_version_datos(conn)
+            id = c.lastrowid
+    finally:
+        if imagen is not None:
+            imagen.descartar()
+    if imagen is not None:
+        # Las variantes se generan en segundo plano; mientras tanto se sirve la original
+        procesador_imagenes.encolar(imagen.nombre)
+    return id
+
+# Validar una imagen subida y dejarla lista para guardarse junto con su informe
+def preparar_imagen_subida(imagen):
+    extension = validar_imagen(imagen.stream, imagen.filename, app.config['IMAGE_MAX_BYTES'])
+    # El nombre es el hash del contenido: la misma foto se guarda una sola vez
+    return preparar_imagen(app.config['UPLOAD_FOLDER'], imagen.stream, extension)
+
+# URL de la variante de una imagen subida (o de la original si aún no está lista)
+@app.template_global()
+def url_imagen(nombre, variante='tarjeta'):
+    return url_for('static', filename=procesador_imagenes.url_variante(nombre, variante))
+
+# Con flask run o un servidor WSGI que importe app:app, la primera petición inicia la aplicación
+@app.before_request
+def asegurar_inicio():
+    if not _iniciada:
+        iniciar_aplicacion()
+
+# Empezar a medir la petición
+@app.before_request
+def iniciar_medicion():
+    g.inicio_peticion = time.perf_counter()
+    g.consultas_sql = 0
+    g.segundos_sql = 0.0
+
+@app.after_request
+def anotar_estado(respuesta):
+    g.estado_peticion = respuesta.status_code
+    return respuesta
+
+# Registrar la petición al terminar. Una respuesta con stream_with_context pasa
+# dos veces por aquí: al salir de la vista y al terminar el envío; se registra la segunda
+@app.teardown_request
+def registrar_peticion(exc=None):
+    if 'inicio_peticion' not in g:
+        return
+    if g.pop('transmitiendo', False) and exc is None:
+        return
+    segundos = time.perf_counter() - g.inicio_peticion
+    ruta = request.url_rule.rule if request.url_rule is not None else 'sin_ruta'
+    estado = 500 if exc is not None else g.get('estado_peticion', 500)
+    metricas.registrar_peticion(request.method, ruta, estado, segundos, g.consultas_sql, g.segundos_sql)
+    umbral = app.config['SLOW_REQUEST_SECONDS']
+    if umbral is not None and segundos >= umbral:
+        detalle = f" | PDF: {g.fases_pdf.resumen()}" if 'fases_pdf' in g else ''
+        print(f"Petición lenta: {request.method} {request.full_path.rstrip('?')} {estado} "
+              f"{segundos * 1000:.0f} ms ({g.consultas_sql} consultas SQL, {g.segundos_sql * 1000:.0f} ms en SQL)"
+              f"{detalle}")
+
+@app.route('/metrics')
+def exponer_metricas():
+    return Response(metricas.exponer(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+# Las subidas nunca cambian de contenido bajo el mismo nombre: caché inmutable de larga duración
+@app.after_request
+def cache_subidas(respuesta):
+    if (request.endpoint == 'static' and respuesta.status_code in (200, 206, 304)
+            and request.view_args.get('filename', '').startswith(PREFIJO_SUBIDAS)):
+        respuesta.cache_control.no_cache = None
+        respuesta.cache_control.public = True
+        respuesta.cache_control.max_age = app.config['UPLOADS_MAX_AGE']
+        respuesta.cache_control.immutable = True
+    return respuesta
+
+# Página con ETag y Last-Modified derivados de la versión de los datos; 304 si no cambió.
+# `generar` recibe esa misma versión para no volver a leerla
+def pagina_condicional(generar, *clave):
+    version, modificado_en = get_estado_datos()
+    # Un mensaje flash pendiente se muestra una sola vez: hay que generar la página
+    if session.get('_flashes'):
+        return generar(version)
+    # Las variantes nuevas de las imágenes cambian las URLs aunque los datos no cambien
+    partes = (ARRANQUE.isoformat(), version, procesador_imagenes.procesadas, request.full_path) + clave
+    etag = hashlib.sha1(repr(partes).encode('utf-8')).hexdigest()
+    ultima_modificacion = max(modificado_en, ARRANQUE)
+    # Last-Modified e If-Modified-Since van en segundos enteros: otra escritura en el mismo
+    # segundo no cambiaría la fecha. Solo se usan cuando ese segundo ya terminó; hasta
+    # entonces decide el ETag (que además tiene prioridad si el cliente envía If-None-Match)
+    if ultima_modificacion >= datetime.now(timezone.utc).replace(microsecond=0):
+        ultima_modificacion = None
+    if is_resource_modified(request.environ, etag, last_modified=ultima_modificacion):
+        respuesta = make_response(generar(version))
+    else:
+        respuesta = Response(status=304)
+    respuesta.set_etag(etag)
+    if ultima_modificacion is not None:
+        respuesta.last_modified = ultima_modificacion
+    # El navegador puede guardarla, pero debe revalidar en cada visita
+    respuesta.cache_control.private = True
+    respuesta.cache_control.no_cache = True
+    return respuesta
 
 @app.route('/')
 def index():
-    maquinas = get_maquinas()
-    return render_template('index.html', maquinas=maquinas)
+    # "Este mes" cambia con el calendario aunque los datos no cambien
+    mes = date.today().strftime('%Y-%m')
+
+    def generar(version):
+        lista_maquinas = cache_fragmentos.obtener(
+            version, ('lista_maquinas', mes),
+            lambda: render_template('fragmentos/lista_maquinas.html', maquinas=get_maquinas_con_estadisticas()))
+        return render_template('index.html', lista_maquinas=lista_maquinas)
+
+    return pagina_condicional(generar, mes)
 
 @app.route('/maquina/<string:nombre_maquina>')
 def ver_maquina(nombre_maquina):
-    informes = get_informes_por_maquina(nombre_maquina)
-    return render_template('maquina.html', nombre_maquina=nombre_maquina, informes=informes)
+    por_pagina = request.args.get('por_pagina', app.config['INFORMES_POR_PAGINA'], type=int)
+    por_pagina = max(1, min(por_pagina, app.config['INFORMES_POR_PAGINA_MAX']))
+    despues = decodificar_cursor(request.args.get('despues', ''))
+    antes = decodificar_cursor(request.args.get('antes', ''))
+
+    def fragmento():
+        pagina = get_pagina_informes_maquina(nombre_maquina, por_pagina, despues=despues, antes=antes)
+        return render_template('fragmentos/informes_maquina.html', nombre_maquina=nombre_maquina,
+                               informes=pagina['informes'], anterior=pagina['anterior'],
+                               siguiente=pagina['siguiente'], por_pagina=por_pagina)
+
+    def generar(version):
+        # Las variantes nuevas de las imágenes cambian sus URLs aunque los datos no cambien
+        clave = ('informes_maquina', nombre_maquina, por_pagina, despues, antes, procesador_imagenes.procesadas)
+        informes_maquina = cache_fragmentos.obtener(version, clave, fragmento)
+        return render_template('maquina.html', nombre_maquina=nombre_maquina, informes_maquina=informes_maquina)
+
+    return pagina_condicional(generar)
 
 @app.route('/nueva_maquina', methods=['GET', 'POST'])
 def nueva_maquina():
@@ -281,307 +515,446 @@ def nuevo_informe():
         fecha = request.form['fecha']
         hora = request.form['hora']
         descripcion = request.form['descripcion']
+        maquina_id = get_id_maquina(nombre_maquina) if nombre_maquina else None
         
-        if nombre_maquina and fecha and hora and descripcion:
-            # Guardar imagen si se proporciona
-            imagen_nombre = None
-            if 'imagen' in request.files:
-                imagen = request.files['imagen']
-                if imagen.filename != '':
-                    # Generar nombre único para la imagen
-                    extension = imagen.filename.rsplit('.', 1)[1].lower() if imagen.filename else ''
-                    imagen_nombre = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{nombre_maquina}.{extension}"
-                    imagen.save(os.path.join(app.config['UPLOAD_FOLDER'], imagen_nombre))
-            
-            # Crear el informe
-            add_informe(nombre_maquina, fecha, hora, descripcion, imagen_nombre)
-            flash('Informe agregado correctamente')
-            return redirect(url_for('ver_maquina', nombre_maquina=nombre_maquina))
+        if nombre_maquina and maquina_id is None:
+            flash('La máquina seleccionada no existe')
+        elif nombre_maquina and fecha and hora and descripcion:
+            # Preparar imagen si se proporciona
+            imagen_preparada = None
+            try:
+                if 'imagen' in request.files:
+                    imagen = request.files['imagen']
+                    if imagen.filename != '':
+                        imagen_preparada = preparar_imagen_subida(imagen)
+            except ImagenInvalida as e:
+                flash(str(e))
+            else:
+                # Crear el informe
+                try:
+                    add_informe(maquina_id, fecha, hora, descripcion, imagen_preparada)
+                except sqlite3.IntegrityError:
+                    # La máquina se eliminó mientras tanto
+                    ids_maquinas.olvidar(nombre_maquina)
+                    flash('La máquina seleccionada no existe')
+                else:
+                    flash('Informe agregado correctamente')
+                    return redirect(url_for('ver_maquina', nombre_maquina=nombre_maquina))
         else:
             flash('Por favor complete todos los campos obligatorios')
     
     maquinas = get_maquinas()
     return render_template('nuevo_informe.html', maquinas=maquinas, datetime=datetime)
 
+# Generar un informe PDF o reutilizar el que ya está en caché para la versión actual de los datos.
+# Con resumen (solo con rango de fechas) se añade la página de actividad por máquina y periodo
+def informe_en_cache(tipo, titulo, fecha_inicio, fecha_fin, periodo, resumen=False):
+    version, modificado_en = get_estado_datos()
+    clave = cache_informes.clave(tipo, titulo, fecha_inicio, fecha_fin, version, resumen)
+    filepath = cache_informes.obtener(clave)
+    if filepath is None:
+        filepath = cache_informes.ruta(clave)
+        fases = g.fases_pdf = Fases()
+        with fases.medir('consulta'):
+            periodo_text = periodo()
+            datos_resumen = None
+            if resumen:
+                with conexion() as conn:
+                    datos_resumen = resumen_actividad(conn, fecha_inicio, fecha_fin)
+        generar_informe(iter_informes(fecha_inicio, fecha_fin), titulo, periodo_text,
+                        app.config['UPLOAD_FOLDER'], filepath, cache_imagenes.obtener, fases=fases,
+                        resumen=datos_resumen, datos_al=modificado_en)
+        cache_informes.registrar(clave)
+        metricas.registrar_pdf(tipo, fases.tiempos)
+    return filepath
+
 @app.route('/generar_informe_pdf')
 def generar_informe_pdf():
-    # Obtener todos los informes
-    informes = get_all_informes()
-    
-    # Crear el PDF con diseño profesional
-    pdf = FPDF()
-    pdf.set_auto_page_break(auto=True, margin=15)
-    pdf.add_page()
-    
-    # Configurar fuentes y colores profesionales
-    pdf.set_fill_color(25, 118, 210)  # Azul corporativo
-    pdf.set_text_color(255, 255, 255)  # Blanco
-    pdf.set_draw_color(25, 118, 210)  # Azul corporativo
-    
-    # Encabezado profesional con logo (simulado)
-    pdf.set_font('Arial', 'B', 24)
-    pdf.cell(0, 20, 'INFORME TÉCNICO DE MÁQUINAS', 0, 1, 'C', True)
-    pdf.ln(2)
-    
-    # Línea divisoria
-    pdf.set_draw_color(255, 255, 255)
-    pdf.line(10, pdf.get_y(), 200, pdf.get_y())
-    pdf.ln(3)
-    
-    # Subtítulo con fechas en caja destacada
-    pdf.set_font('Arial', '', 14)
-    pdf.set_text_color(255, 255, 255)
-    
-    # Obtener el rango de fechas de los informes
-    if informes:
-        fechas = [i['fecha'] for i in informes]
-        fecha_inicio = min(fechas).strftime('%d/%m/%Y')
-        fecha_fin = max(fechas).strftime('%d/%m/%Y')
-        periodo_text = f'PERIODO: {fecha_inicio} AL {fecha_fin}'
-    else:
-        periodo_text = 'PERIODO: [Sin informes registrados]'
-    
-    pdf.cell(0, 12, periodo_text, 1, 1, 'C', True)
-    pdf.ln(8)
-    
-    # Información del técnico con diseño de tabla
-    pdf.set_text_color(0, 0, 0)
-    pdf.set_font('Arial', 'B', 12)
-    pdf.cell(45, 10, 'Técnico Responsable:', 1, 0, 'L')
-    pdf.set_font('Arial', '', 12)
-    pdf.cell(0, 10, 'Willian Ruiz Z', 1, 1, 'L')
-    pdf.ln(5)
-    
-    # Agrupar informes por máquina
-    informes_por_maquina = {}
-    for informe in informes:
-        if informe['nombre_maquina'] not in informes_por_maquina:
-            informes_por_maquina[informe['nombre_maquina']] = []
-        informes_por_maquina[informe['nombre_maquina']].append(informe)
-    
-    # Ordenar las máquinas alfabéticamente
-    maquinas_ordenadas = sorted(informes_por_maquina.keys())
-    
-    # Contenido por máquina con diseño mejorado
-    for nombre_maquina in maquinas_ordenadas:
-        # Verificar si hay espacio suficiente para la sección
-        if pdf.get_y() > 240:
-            pdf.add_page()
-        
-        # Título de la máquina con estilo profesional
-        pdf.set_fill_color(33, 150, 243)  # Azul más claro
-        pdf.set_text_color(255, 255, 255)
-        pdf.set_font('Arial', 'B', 16)
-        pdf.cell(0, 12, nombre_maquina, 1, 1, 'L', True)
-        pdf.ln(5)
-        
-        # Resetear colores para contenido
-        pdf.set_fill_color(255, 255, 255)
-        pdf.set_text_color(0, 0, 0)
-        pdf.set_font('Arial', '', 11)
-        
-        # Informes de la máquina
-        informes_maquina = informes_por_maquina[nombre_maquina]
-        # Ordenar por fecha y hora
-        informes_maquina.sort(key=lambda x: (x['fecha'], x['hora']))
-        
-        for informe in informes_maquina:
-            # Formatear la fecha y hora
-            fecha_str = informe['fecha'].strftime('%d/%m/%Y')
-            hora_str = informe['hora'].strftime('%H:%M') if informe['hora'].strftime('%H:%M') != '00:00' else ''
-            
-            # Crear entrada del informe con mejor organización
-            pdf.set_font('Arial', 'B', 11)
-            
-            # Línea de fecha y hora
-            linea_fecha = f"Fecha: {fecha_str}"
-            if hora_str:
-                linea_fecha += f" | Hora: {hora_str}"
-            
-            pdf.write(6, linea_fecha)
-            pdf.ln(6)
-            
-            # Descripción
-            pdf.set_font('Arial', '', 11)
-            pdf.write(6, informe['descripcion'].encode('latin-1', 'replace').decode('latin-1'))
-            pdf.ln(8)
-            
-            # Agregar imagen si existe (centrada y con espacio)
-            if informe['imagen']:
-                image_path = os.path.join(app.config['UPLOAD_FOLDER'], informe['imagen'])
-                if os.path.exists(image_path):
-                    try:
-                        # Verificar espacio suficiente
-                        if pdf.get_y() + 50 > pdf.h - pdf.b_margin:
-                            pdf.add_page()
-                            pdf.ln(5)
-                        
-                        # Centrar la imagen
-                        pdf.cell(0, 10, '', 0, 1, 'C')
-                        pdf.image(image_path, w=45, h=45)
-                        pdf.ln(5)
-                    except Exception as e:
-                        pass  # Si hay error con la imagen, continuar sin mostrarla
-            
-            # Línea divisoria sutil entre informes
-            pdf.set_draw_color(200, 200, 200)
-            pdf.line(15, pdf.get_y(), 195, pdf.get_y())
-            pdf.ln(5)
-        
-        pdf.ln(3)
-    
-    # Pie de página profesional
-    pdf.set_y(-20)
-    pdf.set_font('Arial', 'I', 8)
-    pdf.set_text_color(128, 128, 128)
-    pdf.cell(0, 10, f'Informe generado el {datetime.now().strftime("%d/%m/%Y a las %H:%M")}', 0, 0, 'C')
-    
-    # Guardar el PDF
-    filename = f"informe_maquinas_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-    filepath = os.path.join(app.config['REPORT_FOLDER'], filename)
-    pdf.output(filepath)
-    
+    # Periodo a partir de las fechas extremas registradas
+    filepath = informe_en_cache('general', 'INFORME TÉCNICO DE MÁQUINAS', None, None,
+                                lambda: formatear_periodo(*get_rango_fechas()))
+
     # Enviar el archivo para descarga
-    return send_file(filepath, as_attachment=True)
+    filename = f"informe_maquinas_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
+    return send_file(filepath, as_attachment=True, download_name=filename)
 
 @app.route('/generar_informe_personalizado', methods=['POST'])
 def generar_informe_personalizado():
     titulo = request.form['titulo']
     fecha_inicio = request.form['fecha_inicio']
     fecha_fin = request.form['fecha_fin']
-    
-    # Obtener informes por rango de fechas
-    informes = get_informes_por_fechas(fecha_inicio, fecha_fin)
-    
-    # Crear el PDF con diseño profesional
-    pdf = FPDF()
-    pdf.set_auto_page_break(auto=True, margin=15)
-    pdf.add_page()
-    
-    # Configurar fuentes y colores profesionales
-    pdf.set_fill_color(25, 118, 210)  # Azul corporativo
-    pdf.set_text_color(255, 255, 255)  # Blanco
-    pdf.set_draw_color(25, 118, 210)  # Azul corporativo
-    
-    # Encabezado profesional
-    pdf.set_font('Arial', 'B', 24)
-    pdf.cell(0, 20, titulo, 0, 1, 'C', True)
-    pdf.ln(2)
-    
-    # Línea divisoria
-    pdf.set_draw_color(255, 255, 255)
-    pdf.line(10, pdf.get_y(), 200, pdf.get_y())
-    pdf.ln(3)
-    
-    # Subtítulo con fechas en caja destacada
-    pdf.set_font('Arial', '', 14)
-    pdf.set_text_color(255, 255, 255)
-    fecha_inicio_fmt = datetime.strptime(fecha_inicio, '%Y-%m-%d').strftime('%d/%m/%Y')
-    fecha_fin_fmt = datetime.strptime(fecha_fin, '%Y-%m-%d').strftime('%d/%m/%Y')
-    periodo_text = f'PERIODO: {fecha_inicio_fmt} AL {fecha_fin_fmt}'
-    
-    pdf.cell(0, 12, periodo_text, 1, 1, 'C', True)
-    pdf.ln(8)
-    
-    # Información del técnico con diseño de tabla
-    pdf.set_text_color(0, 0, 0)
-    pdf.set_font('Arial', 'B', 12)
-    pdf.cell(45, 10, 'Técnico Responsable:', 1, 0, 'L')
-    pdf.set_font('Arial', '', 12)
-    pdf.cell(0, 10, 'Willian Ruiz Z', 1, 1, 'L')
-    pdf.ln(5)
-    
-    # Agrupar informes por máquina
-    informes_por_maquina = {}
-    for informe in informes:
-        if informe['nombre_maquina'] not in informes_por_maquina:
-            informes_por_maquina[informe['nombre_maquina']] = []
-        informes_por_maquina[informe['nombre_maquina']].append(informe)
-    
-    # Ordenar las máquinas alfabéticamente
-    maquinas_ordenadas = sorted(informes_por_maquina.keys())
-    
-    # Contenido por máquina con diseño mejorado
-    for nombre_maquina in maquinas_ordenadas:
-        # Verificar si hay espacio suficiente para la sección
-        if pdf.get_y() > 240:
-            pdf.add_page()
-        
-        # Título de la máquina con estilo profesional
-        pdf.set_fill_color(33, 150, 243)  # Azul más claro
-        pdf.set_text_color(255, 255, 255)
-        pdf.set_font('Arial', 'B', 16)
-        pdf.cell(0, 12, nombre_maquina, 1, 1, 'L', True)
-        pdf.ln(5)
-        
-        # Resetear colores para contenido
-        pdf.set_fill_color(255, 255, 255)
-        pdf.set_text_color(0, 0, 0)
-        pdf.set_font('Arial', '', 11)
-        
-        # Informes de la máquina
-        informes_maquina = informes_por_maquina[nombre_maquina]
-        # Ordenar por fecha y hora
-        informes_maquina.sort(key=lambda x: (x['fecha'], x['hora']))
-        
-        for informe in informes_maquina:
-            # Formatear la fecha y hora
-            fecha_str = informe['fecha'].strftime('%d/%m/%Y')
-            hora_str = informe['hora'].strftime('%H:%M') if informe['hora'].strftime('%H:%M') != '00:00' else ''
-            
-            # Crear entrada del informe con mejor organización
-            pdf.set_font('Arial', 'B', 11)
-            
-            # Línea de fecha y hora
-            linea_fecha = f"Fecha: {fecha_str}"
-            if hora_str:
-                linea_fecha += f" | Hora: {hora_str}"
-            
-            pdf.write(6, linea_fecha)
-            pdf.ln(6)
-            
-            # Descripción
-            pdf.set_font('Arial', '', 11)
-            pdf.write(6, informe['descripcion'].encode('latin-1', 'replace').decode('latin-1'))
-            pdf.ln(8)
-            
-            # Agregar imagen si existe (centrada y con espacio)
-            if informe['imagen']:
-                image_path = os.path.join(app.config['UPLOAD_FOLDER'], informe['imagen'])
-                if os.path.exists(image_path):
-                    try:
-                        # Verificar espacio suficiente
-                        if pdf.get_y() + 50 > pdf.h - pdf.b_margin:
-                            pdf.add_page()
-                            pdf.ln(5)
-                        
-                        # Centrar la imagen
-                        pdf.cell(0, 10, '', 0, 1, 'C')
-                        pdf.image(image_path, w=45, h=45)
-                        pdf.ln(5)
-                    except Exception as e:
-                        pass  # Si hay error con la imagen, continuar sin mostrarla
-            
-            # Línea divisoria sutil entre informes
-            pdf.set_draw_color(200, 200, 200)
-            pdf.line(15, pdf.get_y(), 195, pdf.get_y())
-            pdf.ln(5)
-        
-        pdf.ln(3)
-    
-    # Pie de página profesional
-    pdf.set_y(-20)
-    pdf.set_font('Arial', 'I', 8)
-    pdf.set_text_color(128, 128, 128)
-    pdf.cell(0, 10, f'Informe generado el {datetime.now().strftime("%d/%m/%Y a las %H:%M")}', 0, 0, 'C')
-    
-    # Guardar el PDF
-    filename = f"informe_personalizado_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-    filepath = os.path.join(app.config['REPORT_FOLDER'], filename)
-    pdf.output(filepath)
-    
+
+    periodo_text = formatear_periodo(date.fromisoformat(fecha_inicio), date.fromisoformat(fecha_fin))
+    filepath = informe_en_cache('personalizado', titulo, fecha_inicio, fecha_fin, lambda: periodo_text,
+                                resumen='resumen' in request.form)
+
     # Enviar el archivo para descarga
-    return send_file(filepath, as_attachment=True)
+    filename = f"informe_personalizado_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
+    return send_file(filepath, as_attachment=True, download_name=filename)
+
+# Nombre de archivo para el PDF de una máquina dentro del ZIP (sin caracteres que no admita Windows)
+def nombre_archivo_maquina(nombre_maquina, usados):
+    base = re.sub(r'[\\/:*?"<>|\x00-\x1f]+', '_', nombre_maquina).strip(' .') or 'maquina'
+    nombre = f"{base}.pdf"
+    copia = 2
+    while nombre.lower() in usados:
+        nombre = f"{base} ({copia}).pdf"
+        copia += 1
+    usados.add(nombre.lower())
+    return nombre
+
+# Un PDF por máquina, renderizados en paralelo y enviados en un ZIP a medida que terminan
+@app.route('/generar_paquete_maquinas', methods=['POST'])
+def generar_paquete_maquinas():
+    titulo = request.form.get('titulo', '').strip()
+    fecha_inicio = fecha_valida(request.form.get('fecha_inicio'))
+    fecha_fin = fecha_valida(request.form.get('fecha_fin'))
+    if not titulo or fecha_inicio is None or fecha_fin is None:
+        flash('Indique el título y un rango de fechas válido')
+        return redirect(url_for('index'))
+
+    with conexion() as conn:
+        maquinas = [(id, nombre) for id, nombre, _ in consultar_maquinas_con_informes(conn, fecha_inicio, fecha_fin)]
+    if not maquinas:
+        flash('No hay informes en el rango de fechas indicado')
+        return redirect(url_for('index'))
+
+    parametros = {
+        'database': app.config['DATABASE'],
+        'carpeta_imagenes': app.config['UPLOAD_FOLDER'],
+        'carpeta_cache': app.config['IMAGE_CACHE_FOLDER'],
+        'cache_max_bytes': app.config['IMAGE_CACHE_MAX_BYTES'],
+        'titulo': titulo,
+        'fecha_inicio': fecha_inicio,
+        'fecha_fin': fecha_fin,
+        'periodo_text': formatear_periodo(date.fromisoformat(fecha_inicio), date.fromisoformat(fecha_fin)),
+    }
+
+    def entradas():
+        carpeta = tempfile.mkdtemp(prefix='paquete_', dir=app.config['REPORT_FOLDER'])
+        try:
+            usados = set()
+            errores = []
+            for nombre_maquina, ruta, error in paquete_maquinas.renderizar(maquinas, parametros, carpeta):
+                if error is not None:
+                    errores.append(f"{nombre_maquina}: {error}")
+                    continue
+                yield nombre_archivo_maquina(nombre_maquina, usados), ruta
+                # La entrada ya está en el ZIP: el PDF no se vuelve a necesitar
+                os.remove(ruta)
+            if errores:
+                yield 'ERRORES.txt', '\n'.join(errores).encode('utf-8')
+        finally:
+            shutil.rmtree(carpeta, ignore_errors=True)
+
+    nombre = f"informes_por_maquina_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"
+    g.transmitiendo = True
+    return Response(stream_with_context(generar_zip(entradas())), mimetype='application/zip',
+                    headers={'Content-Disposition': f'attachment; filename="{nombre}"'})
+
+@app.route('/informes/cache')
+def estadisticas_cache_informes():
+    return jsonify(cache_informes.estadisticas())
+
+# Representación JSON de un trabajo de informe con sus URLs
+def respuesta_trabajo(trabajo):
+    datos = trabajo.como_dict()
+    datos['url_estado'] = url_for('estado_trabajo_informe', id=trabajo.id)
+    if datos['estado'] == TERMINADO:
+        datos['url_descarga'] = url_for('descargar_trabajo_informe', id=trabajo.id)
+    return datos
+
+@app.route('/informes/trabajos', methods=['POST'])
+def crear_trabajo_informe():
+    datos = request.get_json(silent=True) or request.form
+    tipo = datos.get('tipo', 'personalizado')
+
+    resumen = False
+    if tipo == 'general':
+        titulo, fecha_inicio, fecha_fin = 'INFORME TÉCNICO DE MÁQUINAS', None, None
+    elif tipo == 'personalizado':
+        titulo = datos.get('titulo', '')
+        fecha_inicio = datos.get('fecha_inicio', '')
+        fecha_fin = datos.get('fecha_fin', '')
+        try:
+            date.fromisoformat(fecha_inicio)
+            date.fromisoformat(fecha_fin)
+        except ValueError:
+            return jsonify({'error': 'Fechas inválidas, use el formato AAAA-MM-DD'}), 400
+        if not titulo:
+            return jsonify({'error': 'El título es obligatorio'}), 400
+        # Casilla del formulario ('on') o booleano en JSON
+        resumen = datos.get('resumen') not in (None, False, '', 'false', '0')
+    else:
+        return jsonify({'error': f'Tipo de informe desconocido: {tipo}'}), 400
+
+    trabajo = cola_informes.enviar(tipo, titulo, fecha_inicio, fecha_fin, app.config, get_version_datos(), resumen)
+    return jsonify(respuesta_trabajo(trabajo)), 202
+
+@app.route('/informes/trabajos/<string:id>')
+def estado_trabajo_informe(id):
+    trabajo = cola_informes.obtener(id)
+    if trabajo is None:
+        return jsonify({'error': 'Trabajo no encontrado'}), 404
+    return jsonify(respuesta_trabajo(trabajo))
+
+@app.route('/informes/trabajos/<string:id>/descarga')
+def descargar_trabajo_informe(id):
+    trabajo = cola_informes.obtener(id)
+    if trabajo is None:
+        return jsonify({'error': 'Trabajo no encontrado'}), 404
+    if trabajo.estado != TERMINADO:
+        return jsonify(respuesta_trabajo(trabajo)), 409
+    # El PDF de un trabajo con caché es la entrada de la caché: el desalojo o la limpieza
+    # pueden haberlo borrado. Abierto aquí, ya no desaparece a mitad del envío
+    try:
+        archivo = open(trabajo.ruta_salida, 'rb')
+    except FileNotFoundError:
+        datos = respuesta_trabajo(trabajo)
+        datos['error'] = 'El informe ya no está disponible; vuelva a solicitarlo'
+        return jsonify(datos), 410
+    return send_file(archivo, mimetype='application/pdf', as_attachment=True,
+                     download_name=trabajo.nombre_descarga)
+
+# Fecha ISO de un parámetro de la petición, o None si falta o no es válida
+def fecha_valida(valor):
+    try:
+        return date.fromisoformat(valor).isoformat() if valor else None
+    except ValueError:
+        return None
+
+# Leer y validar los parámetros de búsqueda de la petición
+def parametros_busqueda():
+    por_pagina = request.args.get('por_pagina', app.config['RESULTADOS_BUSQUEDA_POR_PAGINA'], type=int)
+    return {
+        'texto': request.args.get('q', '').strip(),
+        'nombre_maquina': request.args.get('maquina') or None,
+        'fecha_inicio': fecha_valida(request.args.get('fecha_inicio')),
+        'fecha_fin': fecha_valida(request.args.get('fecha_fin')),
+        'limite': max(1, min(por_pagina, app.config['INFORMES_POR_PAGINA_MAX'])),
+        'pagina': max(1, request.args.get('pagina', 1, type=int)),
+    }
+
+# Buscar con los parámetros de la petición; una máquina que no existe no tiene resultados
+def buscar_con_parametros(parametros):
+    filtros = dict(parametros)
+    nombre_maquina = filtros.pop('nombre_maquina')
+    maquina_id = None
+    if nombre_maquina is not None:
+        maquina_id = get_id_maquina(nombre_maquina)
+        if maquina_id is None:
+            return [], False
+    with conexion() as conn:
+        return buscar_informes(conn, maquina_id=maquina_id, **filtros)
+
+@app.route('/buscar')
+def buscar():
+    parametros = parametros_busqueda()
+    resultados, hay_mas = [], False
+    if parametros['texto']:
+        resultados, hay_mas = buscar_con_parametros(parametros)
+    return render_template('buscar.html', maquinas=get_maquinas(), resultados=resultados,
+                           hay_mas=hay_mas, **parametros)
+
+@app.route('/api/buscar')
+def api_buscar():
+    parametros = parametros_busqueda()
+    if not parametros['texto']:
+        return jsonify({'error': 'Falta el parámetro q'}), 400
+    resultados, hay_mas = buscar_con_parametros(parametros)
+    return jsonify({
+        'pagina': parametros['pagina'],
+        'hay_mas': hay_mas,
+        'resultados': [{
+            'id': informe.id,
+            'nombre_maquina': informe.nombre_maquina,
+            'fecha': informe.fecha.isoformat(),
+            'hora': informe.hora.strftime('%H:%M'),
+            'fragmento': str(fragmento),
+            'url': url_for('editar_informe', id=informe.id),
+        } for informe, fragmento in resultados],
+    })
+
+# Cambios de máquinas e informes posteriores a un cursor, para los clientes que
+# mantienen una copia local (solo transfieren lo que cambió desde la última vez)
+@app.route('/api/sincronizacion')
+def api_sincronizacion():
+    desde = request.args.get('desde', 0, type=int)
+    if desde < 0:
+        return jsonify({'error': 'El cursor no puede ser negativo'}), 400
+    limite = request.args.get('limite', app.config['SYNC_BATCH_SIZE'], type=int)
+    limite = max(1, min(limite, app.config['SYNC_BATCH_MAX']))
+    with conexion() as conn:
+        lote = consultar_cambios(conn, desde, limite, app.config['SYNC_MAX_BYTES'])
+    # Las imágenes se piden aparte: url_imagenes + informe.imagen
+    lote['url_imagenes'] = url_for('static', filename=PREFIJO_SUBIDAS)
+    cuerpo = codificar_respuesta(lote)
+    respuesta = Response(cuerpo, content_type='application/json')
+    respuesta.vary.add('Accept-Encoding')
+    if 'gzip' in request.accept_encodings and len(cuerpo) > 1024:
+        respuesta.set_data(b''.join(comprimir_gzip([cuerpo])))
+        respuesta.content_encoding = 'gzip'
+    respuesta.cache_control.no_store = True
+    return respuesta
+
+# Informes por máquina y por día, semana o mes, con las máquinas de más a menos informes.
+# Las cifras salen de los totales por periodo que mantienen los triggers (ver analitica.py)
+@app.route('/api/analitica')
+def api_analitica():
+    agrupacion = request.args.get('agrupacion', 'mes')
+    if agrupacion not in AGRUPACIONES:
+        return jsonify({'error': f"Agrupación desconocida: {agrupacion} (use {', '.join(AGRUPACIONES)})"}), 400
+    hoy = date.today()
+    fecha_fin = request.args.get('fecha_fin', hoy.isoformat())
+    fecha_inicio = request.args.get('fecha_inicio')
+    try:
+        fecha_fin = date.fromisoformat(fecha_fin)
+        fecha_inicio = (date.fromisoformat(fecha_inicio) if fecha_inicio
+                        else fecha_fin - timedelta(days=app.config['ANALYTICS_DEFAULT_DAYS'] - 1))
+    except ValueError:
+        return jsonify({'error': 'Fechas inválidas, use el formato AAAA-MM-DD'}), 400
+    if fecha_inicio > fecha_fin:
+        return jsonify({'error': 'fecha_inicio es posterior a fecha_fin'}), 400
+    max_periodos = app.config['ANALYTICS_MAX_PERIODS']
+    if cantidad_periodos(agrupacion, fecha_inicio, fecha_fin) > max_periodos:
+        return jsonify({'error': f'El rango abarca más de {max_periodos} periodos; use una agrupación mayor'}), 400
+
+    maquina_id = None
+    nombre_maquina = request.args.get('maquina')
+    if nombre_maquina:
+        maquina_id = get_id_maquina(nombre_maquina)
+        if maquina_id is None:
+            return jsonify({'error': f'Máquina no encontrada: {nombre_maquina}'}), 404
+    limite = request.args.get('limite', type=int)
+
+    with conexion() as conn:
+        return jsonify(actividad_maquinas(conn, agrupacion, fecha_inicio, fecha_fin, maquina_id,
+                                          limite if limite and limite > 0 else None))
+
+# Respuesta que exporta los informes fila a fila, comprimida si el cliente acepta gzip
+def respuesta_exportacion(formato, nombre_maquina=None, fecha_inicio=None, fecha_fin=None):
+    maquina_id = None
+    if nombre_maquina is not None:
+        maquina_id = get_id_maquina(nombre_maquina)
+        if maquina_id is None:
+            return jsonify({'error': f'Máquina no encontrada: {nombre_maquina}'}), 404
+
+    def generar():
+        with conexion() as conn:
+            yield from GENERADORES[formato](
+                consultar_filas_exportacion(conn, maquina_id, fecha_inicio, fecha_fin))
+
+    trozos = generar()
+    nombre = f"informes_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{formato}"
+    headers = {'Content-Disposition': f'attachment; filename="{nombre}"', 'Vary': 'Accept-Encoding'}
+    if 'gzip' in request.accept_encodings:
+        trozos = comprimir_gzip(trozos)
+        headers['Content-Encoding'] = 'gzip'
+    # La conexión de la petición sigue disponible mientras se envían los trozos
+    g.transmitiendo = True
+    return Response(stream_with_context(trozos), mimetype=FORMATOS[formato], headers=headers)
+
+@app.route('/exportar/<string:formato>')
+def exportar_informes(formato):
+    if formato not in FORMATOS:
+        return jsonify({'error': f'Formato no soportado: {formato}. Use csv o jsonl'}), 404
+    return respuesta_exportacion(formato, request.args.get('maquina') or None,
+                                 fecha_valida(request.args.get('fecha_inicio')),
+                                 fecha_valida(request.args.get('fecha_fin')))
+
+@app.route('/maquina/<string:nombre_maquina>/exportar/<string:formato>')
+def exportar_informes_maquina(nombre_maquina, formato):
+    if formato not in FORMATOS:
+        return jsonify({'error': f'Formato no soportado: {formato}. Use csv o jsonl'}), 404
+    return respuesta_exportacion(formato, nombre_maquina,
+                                 fecha_valida(request.args.get('fecha_inicio')),
+                                 fecha_valida(request.args.get('fecha_fin')))
+
+# Importar informes desde un archivo CSV o JSONL (y un ZIP opcional de imágenes)
+def importar_informes(archivo, formato, zip_imagenes=None, tamano_lote=None):
+    with conexion() as conn:
+        importador = Importador(conn, app.config['UPLOAD_FOLDER'], zip_imagenes,
+                                tamano_lote or app.config['IMPORTACION_TAMANO_LOTE'],
+                                app.config['IMAGE_MAX_BYTES'], procesador_imagenes.encolar)
+        return importador.importar(leer_filas(archivo, formato))
+
+@app.route('/importar', methods=['GET', 'POST'])
+def importar():
+    resultado = None
+    if request.method == 'POST':
+        archivo = request.files.get('archivo')
+        zip_imagenes = request.files.get('imagenes')
+        if archivo is None or archivo.filename == '':
+            flash('Seleccione un archivo CSV o JSONL')
+        else:
+            try:
+                formato = detectar_formato(archivo.filename)
+                if zip_imagenes is not None and zip_imagenes.filename != '':
+                    # ZipFile necesita acceso aleatorio; el stream de la subida puede no tenerlo
+                    zip_imagenes = io.BytesIO(zip_imagenes.read())
+                else:
+                    zip_imagenes = None
+                resultado = importar_informes(archivo.stream, formato, zip_imagenes)
+            except (ValueError, zipfile.BadZipFile) as e:
+                flash(str(e))
+            else:
+                flash(f'Se importaron {resultado.insertados} informes '
+                      f'({len(resultado.errores)} filas con errores)')
+    return render_template('importar.html', resultado=resultado, max_errores=200)
+
+@app.cli.command('importar')
+@click.argument('archivo', type=click.Path(exists=True, dir_okay=False))
+@click.option('--imagenes', type=click.Path(exists=True, dir_okay=False), help='ZIP con las imágenes')
+@click.option('--reporte', type=click.Path(dir_okay=False), help='CSV donde escribir los errores por fila')
+@click.option('--lote', type=int, default=None, help='Filas por transacción')
+def importar_comando(archivo, imagenes, reporte, lote):
+    """Importa informes históricos desde un CSV o JSONL"""
+    iniciar_aplicacion(limpieza=False)
+    try:
+        formato = detectar_formato(archivo)
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint='ARCHIVO')
+    with open(archivo, 'rb') as f:
+        try:
+            resultado = importar_informes(f, formato, imagenes, lote)
+        except ValueError as e:
+            # Codificación no reconocida: no se importó ninguna fila
+            raise click.ClickException(str(e))
+    click.echo(f"Informes importados: {resultado.insertados}")
+    click.echo(f"Máquinas creadas: {resultado.maquinas_creadas}")
+    click.echo(f"Imágenes guardadas: {resultado.imagenes}")
+    click.echo(f"Filas con errores: {len(resultado.errores)}")
+    if reporte:
+        with open(reporte, 'w', newline='', encoding='utf-8') as destino:
+            escribir_reporte_errores(resultado, destino)
+    else:
+        for fila, mensaje in resultado.errores[:20]:
+            click.echo(f"  fila {fila}: {mensaje}")
+        if len(resultado.errores) > 20:
+            click.echo(f"  ... y {len(resultado.errores) - 20} más (use --reporte para verlos todos)")
+    # Las variantes de las imágenes se generan en segundo plano
+    procesador_imagenes.cerrar()
+
+@app.cli.command('limpiar')
+@click.option('--simular', is_flag=True, help='Solo mostrar lo que se eliminaría')
+def limpiar_comando(simular):
+    """Eliminar subidas sin informe e informes generados antiguos"""
+    iniciar_aplicacion(limpieza=False)
+    liberado = limpiador.pasada(simular=simular)
+    accion = 'Se eliminarían' if simular else 'Eliminados'
+    click.echo(f"{accion} {liberado.archivos} archivos ({liberado.bytes / 1024 / 1024:.1f} MB)")
+    if liberado.categorias:
+        click.echo(liberado.resumen())
+
+@app.cli.command('reconstruir-estadisticas')
+def reconstruir_estadisticas_comando():
+    """Recalcula desde cero las estadísticas por máquina y por periodo"""
+    iniciar_aplicacion(limpieza=False)
+    with conexion() as conn, conn:
+        reconstruir_estadisticas_maquinas(conn)
+        reconstruir_conteos_periodo(conn)
+        maquinas = conn.execute("SELECT COUNT(*) FROM maquina_stats").fetchone()[0]
+    click.echo(f"Estadísticas recalculadas para {maquinas} máquinas")
 
 @app.route('/eliminar_maquina/<string:nombre_maquina>', methods=['POST'])
 def eliminar_maquina(nombre_maquina):
@@ -612,33 +985,35 @@ def actualizar_informe(id):
     fecha = request.form['fecha']
     hora = request.form['hora']
     descripcion = request.form['descripcion']
+    maquina_id = get_id_maquina(nombre_maquina) if nombre_maquina else None
     
-    if nombre_maquina and fecha and hora and descripcion:
-        # Verificar si se ha subido una nueva imagen
-        imagen_nombre = informe['imagen']  # Mantener la imagen existente por defecto
-        
+    if nombre_maquina and maquina_id is None:
+        flash('La máquina seleccionada no existe')
+        maquinas = get_maquinas()
+        return render_template('editar_informe.html', informe=informe, maquinas=maquinas, datetime=datetime)
+    elif nombre_maquina and fecha and hora and descripcion:
+        # Verificar si se ha subido una nueva imagen; si no, se conserva la existente
+        imagen_preparada = None
+
         if 'imagen' in request.files:
             imagen = request.files['imagen']
             if imagen.filename != '':
-                # Eliminar la imagen anterior si existe
-                if informe['imagen']:
-                    imagen_anterior_path = os.path.join(app.config['UPLOAD_FOLDER'], informe['imagen'])
-                    if os.path.exists(imagen_anterior_path):
-                        os.remove(imagen_anterior_path)
-                
-                # Guardar la nueva imagen
-                extension = imagen.filename.rsplit('.', 1)[1].lower() if imagen.filename else ''
-                imagen_nombre = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{nombre_maquina}.{extension}"
-                imagen.save(os.path.join(app.config['UPLOAD_FOLDER'], imagen_nombre))
-            elif informe['imagen']:
-                # Si no se sube una nueva imagen pero había una anterior, mantener la anterior
-                imagen_nombre = informe['imagen']
-            else:
-                # Si no hay imagen nueva ni anterior, establecer como None
-                imagen_nombre = None
-        
-        # Actualizar el informe
-        update_informe(id, nombre_maquina, fecha, hora, descripcion, imagen_nombre)
+                try:
+                    imagen_preparada = preparar_imagen_subida(imagen)
+                except ImagenInvalida as e:
+                    flash(str(e))
+                    maquinas = get_maquinas()
+                    return render_template('editar_informe.html', informe=informe, maquinas=maquinas, datetime=datetime)
+
+        # Actualizar el informe; la imagen anterior se borra si ningún otro informe la usa
+        try:
+            update_informe(id, maquina_id, fecha, hora, descripcion, imagen_preparada)
+        except sqlite3.IntegrityError:
+            # La máquina se eliminó mientras tanto
+            ids_maquinas.olvidar(nombre_maquina)
+            flash('La máquina seleccionada no existe')
+            maquinas = get_maquinas()
+            return render_template('editar_informe.html', informe=informe, maquinas=maquinas, datetime=datetime)
         flash('Informe actualizado correctamente')
         return redirect(url_for('ver_maquina', nombre_maquina=nombre_maquina))
     else:
@@ -646,40 +1021,105 @@ def actualizar_informe(id):
         maquinas = get_maquinas()
         return render_template('editar_informe.html', informe=informe, maquinas=maquinas, datetime=datetime)
 
-def crear_tablas_iniciales():
-    """Crear tablas iniciales si no existen"""
-    try:
-        conn = sqlite3.connect(app.config['DATABASE'])
-        c = conn.cursor()
-        
-        # Crear tabla de máquinas
-        c.execute('''CREATE TABLE IF NOT EXISTS maquinas
-                     (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                      nombre TEXT UNIQUE NOT NULL)''')
-        
-        # Crear tabla de informes
-        c.execute('''CREATE TABLE IF NOT EXISTS informes
-                     (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                      nombre_maquina TEXT NOT NULL,
-                      fecha DATE NOT NULL,
-                      hora TIME NOT NULL,
-                      descripcion TEXT NOT NULL,
-                      imagen TEXT,
-                      creado_en TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                      FOREIGN KEY (nombre_maquina) REFERENCES maquinas (nombre))''')
-        
-        conn.commit()
-        conn.close()
-        print("Tablas creadas correctamente")
-        return True
-    except Exception as e:
-        print(f"Error creando tablas: {e}")
-        return False
-
-# Inicializar la base de datos
-init_db()
-# Asegurarse de que las tablas existen
-crear_tablas_iniciales()
+# Pasar las imágenes con nombre antiguo al almacenamiento por contenido
+def migrar_imagenes():
+    with conexion() as conn:
+        migradas = migrar_imagenes_antiguas(conn, app.config['UPLOAD_FOLDER'])
+    for nombre in migradas:
+        procesador_imagenes.encolar(nombre)
+    if migradas:
+        print(f"Imágenes migradas al almacenamiento por contenido: {len(migradas)}")
+
+# Crear los servicios, aplicar las migraciones pendientes del esquema y de las imágenes e
+# iniciar la limpieza en segundo plano. La llaman python app.py (servir), el hijo del
+# recargador de --debug y, con flask run o un servidor WSGI que importe app:app, la
+# primera petición. Los comandos de consola no inician la limpieza
+def iniciar_aplicacion(limpieza=True):
+    global _iniciada, PREFIJO_SUBIDAS, cache_imagenes, procesador_imagenes, cache_informes, cache_fragmentos
+    global cola_informes, paquete_maquinas, limpiador
+    with _bloqueo_inicio:
+        if _iniciada:
+            return
+        # Las plantillas compiladas se reutilizan entre procesos: un arranque nuevo (o el
+        # ejecutable) no vuelve a compilarlas. Jinja comprueba que el código fuente no haya cambiado
+        if app.config['TEMPLATE_CACHE_FOLDER']:
+            os.makedirs(app.config['TEMPLATE_CACHE_FOLDER'], exist_ok=True)
+            app.jinja_env.bytecode_cache = FileSystemBytecodeCache(app.config['TEMPLATE_CACHE_FOLDER'])
+
+        # Prefijo (relativo a static/) de las imágenes subidas y sus variantes
+        PREFIJO_SUBIDAS = os.path.relpath(app.config['UPLOAD_FOLDER'], app.static_folder).replace(os.sep, '/') + '/'
+
+        # Caché de imágenes reducidas para incrustar en los PDF (45 mm a 150 dpi)
+        cache_imagenes = CacheDerivados(app.config['IMAGE_CACHE_FOLDER'], app.config['IMAGE_CACHE_MAX_BYTES'],
+                                        ancho_mm=45, dpi=150)
+
+        # Procesamiento de imágenes subidas (variantes web y de impresión) en segundo plano
+        procesador_imagenes = ProcesadorImagenes(app.config['UPLOAD_FOLDER'], cache_imagenes,
+                                                 app.config['IMAGE_WORKERS'], prefijo_url=PREFIJO_SUBIDAS)
+
+        # Caché de informes PDF generados, invalidada por la versión de los datos
+        cache_informes = CacheInformes(app.config['REPORT_FOLDER'], app.config['REPORT_CACHE_MAX_BYTES'],
+                                       app.config['REPORT_CACHE_MAX_ENTRIES'])
+
+        # Lista de máquinas y páginas de informes ya renderizadas, invalidadas por la versión de los datos
+        cache_fragmentos = CacheFragmentos(app.config['FRAGMENT_CACHE_MAX_ENTRIES'],
+                                           app.config['FRAGMENT_CACHE_MAX_BYTES'])
+        metricas.registrar_cache_fragmentos(cache_fragmentos)
+
+        # Cola de informes PDF generados en segundo plano
+        cola_informes = ColaInformes(os.path.join(app.config['REPORT_FOLDER'], 'trabajos'),
+                                     app.config['PDF_WORKERS'], cache=cache_informes,
+                                     al_medir=metricas.registrar_pdf)
+
+        # Paquetes de un PDF por máquina renderizados en paralelo
+        paquete_maquinas = PaqueteMaquinas(app.config['PDF_BUNDLE_WORKERS'], al_medir=metricas.registrar_pdf)
+
+        # Limpieza periódica de subidas huérfanas e informes generados
+        limpiador = Limpiador(app.config['UPLOAD_FOLDER'], app.config['REPORT_FOLDER'], cache_informes,
+                              intervalo=app.config['GC_INTERVAL_SECONDS'], gracia=app.config['GC_GRACE_SECONDS'],
+                              max_edad_informes=app.config['REPORT_MAX_AGE_DAYS'] * 24 * 3600,
+                              max_bytes_trabajos=app.config['REPORT_JOBS_MAX_BYTES'],
+                              max_edad_bajas=app.config['SYNC_TOMBSTONE_MAX_AGE_DAYS'],
+                              al_liberar=metricas.registrar_limpieza)
+
+        db.observar_consultas(medir_consulta)
+        migrar()
+        migrar_imagenes()
+        if limpieza:
+            limpiador.iniciar()
+        _iniciada = True
+
+# Vaciar las colas de fondo y cerrar las conexiones al apagar el servidor
+def apagar():
+    global _iniciada
+    with _bloqueo_inicio:
+        if not _iniciada:
+            return
+        limpiador.detener()
+        cola_informes.cerrar(esperar=True)
+        paquete_maquinas.cerrar(esperar=True)
+        procesador_imagenes.cerrar(esperar=True)
+        db.get_pool(app).cerrar_todo()
+        db.observar_consultas(None)
+        _iniciada = False
 
 if __name__ == '__main__':
-    app.run(debug=True)
\ No newline at end of file
+    import argparse
+    parser = argparse.ArgumentParser(description='Informes de Máquinas')
+    parser.add_argument('--host', default=app.config['SERVER_HOST'])
+    parser.add_argument('--puerto', type=int, default=app.config['SERVER_PORT'])
+    parser.add_argument('--hilos', type=int, default=app.config['SERVER_THREADS'])
+    parser.add_argument('--max-conexiones', type=int, default=app.config['SERVER_CONNECTION_LIMIT'])
+    parser.add_argument('--cola', type=int, default=app.config['SERVER_BACKLOG'])
+    parser.add_argument('--debug', action='store_true', help='Servidor de desarrollo con recarga y depurador')
+    args = parser.parse_args()
+
+    if args.debug:
+        # El padre del recargador solo vigila los archivos; inicia la aplicación el hijo que atiende
+        if is_running_from_reloader():
+            iniciar_aplicacion()
+        app.run(host=args.host, port=args.puerto, debug=True)
+    else:
+        from servidor import servir
+        servir(app, al_iniciar=[iniciar_aplicacion], al_apagar=[apagar], espera_maxima=app.config['SERVER_SHUTDOWN_TIMEOUT'], host=args.host,
+               puerto=args.puerto, hilos=args.hilos, max_conexiones=args.max_conexiones, cola=args.cola)
@@ -0,0 +1,95 @@
+"""Tiempo de /api/analitica, en reposo y justo después de guardar un informe.
+
+Siembra una base temporal (por defecto un millón de informes en tres años) y
+pide la analítica por día, semana y mes. "reposo" repite la petición sin
+cambios en los datos; "tras alta" guarda antes un informe de hoy (el periodo
+en curso cambia con cada petición) y descuenta el tiempo de ese alta.
+Termina con error si algún caso supera --objetivo-ms.
+
+Uso: python -m benchmarks.bench_analitica [--maquinas 200] [--informes 1000000] [--repeticiones 5]
+                                          [--objetivo-ms 100]
+"""
+import sys
+import time
+import argparse
+from datetime import date, timedelta
+
+from benchmarks.entorno import copia_temporal
+from benchmarks.suite import medir
+
+
+def consultas():
+    """(nombre, parámetros de /api/analitica) de los casos a medir"""
+    hoy = date.today()
+    return [
+        ('dia.90_dias', {'agrupacion': 'dia', 'fecha_inicio': (hoy - timedelta(days=89)).isoformat()}),
+        ('dia.365_dias', {'agrupacion': 'dia'}),
+        ('semana.365_dias', {'agrupacion': 'semana'}),
+        ('semana.3_anios', {'agrupacion': 'semana', 'fecha_inicio': (hoy - timedelta(days=3 * 365)).isoformat()}),
+        ('mes.3_anios', {'agrupacion': 'mes', 'fecha_inicio': (hoy - timedelta(days=3 * 365)).isoformat()}),
+        ('mes.3_anios.top10', {'agrupacion': 'mes', 'limite': 10,
+                               'fecha_inicio': (hoy - timedelta(days=3 * 365)).isoformat()}),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Analítica por periodo en reposo y tras una escritura')
+    parser.add_argument('--maquinas', type=int, default=200)
+    parser.add_argument('--informes', type=int, default=1000000)
+    parser.add_argument('--repeticiones', type=int, default=5)
+    parser.add_argument('--objetivo-ms', type=float, default=100.0)
+    args = parser.parse_args()
+
+    with copia_temporal('bench_analitica_'):
+        import app as aplicacion
+        aplicacion.iniciar_aplicacion()
+        from db import conexion
+        from benchmarks.sembrar import sembrar
+
+        inicio = time.perf_counter()
+        with conexion() as conn:
+            sembrar(conn, None, args.maquinas, args.informes, 0)
+            conn.execute("ANALYZE")
+        print(f"{args.maquinas} máquinas, {args.informes} informes sembrados en "
+              f"{time.perf_counter() - inicio:.1f} s\n")
+
+        cliente = aplicacion.app.test_client()
+
+        def pedir(parametros):
+            respuesta = cliente.get('/api/analitica', query_string=parametros)
+            assert respuesta.status_code == 200, (parametros, respuesta.status_code)
+            return respuesta.get_data()
+
+        with conexion() as conn:
+            maquina_id = conn.execute("SELECT MIN(id) FROM maquinas").fetchone()[0]
+
+        def alta():
+            with conexion() as conn, conn:
+                conn.execute("INSERT INTO informes (maquina_id, fecha, hora, descripcion) VALUES (?, ?, ?, ?)",
+                             (maquina_id, date.today().isoformat(), '08:30', 'Informe del benchmark'))
+
+        resultados = {}
+        for nombre, parametros in consultas():
+            def tras_alta(parametros=parametros):
+                alta()
+                pedir(parametros)
+            # El alta se mide aparte y se descuenta
+            solo_alta = medir(alta, args.repeticiones)['mediana_s']
+            resultados[nombre] = (medir(lambda parametros=parametros: pedir(parametros),
+                                        args.repeticiones)['mediana_s'],
+                                  max(0.0, medir(tras_alta, args.repeticiones)['mediana_s'] - solo_alta))
+        aplicacion.apagar()
+
+    print(f"{'Consulta':<22} {'reposo':>10} {'tras alta':>10}")
+    lentas = []
+    for nombre, (reposo, tras_alta) in resultados.items():
+        print(f"{nombre:<22} {reposo * 1000:>8.1f}ms {tras_alta * 1000:>8.1f}ms")
+        if max(reposo, tras_alta) * 1000 > args.objetivo_ms:
+            lentas.append(nombre)
+    if lentas:
+        print(f"\nSuperan {args.objetivo_ms:.0f} ms: {', '.join(lentas)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
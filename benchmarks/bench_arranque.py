@@ -0,0 +1,141 @@
+"""Sonda de arranque: cuánto tarda la aplicación en estar lista en un proceso nuevo.
+
+Cada repetición lanza un intérprete limpio en el directorio actual (que debe
+tener la base de datos y las plantillas) y mide por separado:
+
+- importaciones: los módulos que importa app.py (Flask, modelos, etc.)
+- creacion_app: el resto de `import app` e iniciar_aplicacion() (configuración, colas, migraciones)
+- primera_peticion: la primera carga del índice (compila la plantilla)
+- primer_pdf: el primer informe PDF pequeño (carga fpdf y PIL)
+
+También comprueba que fpdf y PIL no se carguen antes de necesitarlos.
+
+Uso: python -m benchmarks.bench_arranque [--repeticiones 5] [--informes 5000]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+from benchmarks.entorno import RAIZ, copia_temporal
+
+FASES = ('importaciones', 'creacion_app', 'primera_peticion', 'primer_pdf')
+# Módulos pesados que solo deben cargarse al generar un PDF o procesar una imagen
+DIFERIDOS = ('fpdf', 'PIL')
+
+SONDA = r'''
+import ast, importlib, json, os, sys, time
+from datetime import date
+
+raiz, titulo = sys.argv[1], sys.argv[2]
+with open(os.path.join(raiz, 'app.py'), encoding='utf-8') as f:
+    arbol = ast.parse(f.read())
+modulos = [a.name for n in arbol.body if isinstance(n, ast.Import) for a in n.names]
+modulos += [n.module for n in arbol.body if isinstance(n, ast.ImportFrom)]
+diferidos = sys.argv[3].split(',')
+tiempos = {}
+
+inicio = time.perf_counter()
+for modulo in modulos:
+    importlib.import_module(modulo)
+tiempos['importaciones'] = time.perf_counter() - inicio
+
+inicio = time.perf_counter()
+import app
+app.iniciar_aplicacion()
+tiempos['creacion_app'] = time.perf_counter() - inicio
+
+inicio = time.perf_counter()
+cliente = app.app.test_client()
+respuesta = cliente.get('/')
+assert respuesta.status_code == 200, respuesta.status_code
+tiempos['primera_peticion'] = time.perf_counter() - inicio
+cargados_antes = [m for m in diferidos if m in sys.modules]
+
+# Un solo día: el informe es pequeño y lo que se mide es la carga de fpdf y PIL
+hoy = date.today().isoformat()
+inicio = time.perf_counter()
+respuesta = cliente.post('/generar_informe_personalizado',
+                         data={'titulo': titulo, 'fecha_inicio': hoy, 'fecha_fin': hoy})
+respuesta.get_data()
+respuesta.close()
+assert respuesta.status_code == 200, respuesta.status_code
+tiempos['primer_pdf'] = time.perf_counter() - inicio
+
+app.apagar()
+print(json.dumps({'tiempos': tiempos, 'cargados_antes': cargados_antes}))
+'''
+
+
+def ejecutar_sonda(titulo):
+    """Lanza un proceso nuevo; devuelve (tiempos por fase, total del proceso, módulos cargados antes de tiempo)"""
+    entorno = dict(os.environ, PYTHONPATH=RAIZ + os.pathsep + os.environ.get('PYTHONPATH', ''))
+    inicio = time.perf_counter()
+    salida = subprocess.run([sys.executable, '-c', SONDA, RAIZ, titulo, ','.join(DIFERIDOS)],
+                            env=entorno, capture_output=True, text=True, check=True)
+    total = time.perf_counter() - inicio
+    datos = json.loads(salida.stdout.strip().splitlines()[-1])
+    return datos['tiempos'], total, datos['cargados_antes']
+
+
+def medir_arranque(repeticiones=5):
+    """Resultados por fase con el mismo formato que la suite (claves arranque.*)"""
+    # Una ejecución previa aplica las migraciones y calienta la caché de archivos del sistema
+    ejecutar_sonda('ARRANQUE PREVIO')
+    muestras = {fase: [] for fase in FASES + ('proceso_total',)}
+    cargados = set()
+    for i in range(repeticiones):
+        # Un título distinto en cada proceso para que el PDF no salga de la caché de informes
+        tiempos, total, cargados_antes = ejecutar_sonda(f'ARRANQUE {i}')
+        for fase in FASES:
+            muestras[fase].append(tiempos[fase])
+        muestras['proceso_total'].append(total)
+        cargados.update(cargados_antes)
+    resultados = {
+        f'arranque.{fase}': {
+            'mediana_s': statistics.median(valores),
+            'min_s': min(valores),
+            'max_s': max(valores),
+            'repeticiones': repeticiones,
+            'pico_mb': None,
+        }
+        for fase, valores in muestras.items()
+    }
+    return resultados, sorted(cargados)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Tiempo de arranque de la aplicación en un proceso nuevo')
+    parser.add_argument('--repeticiones', type=int, default=5)
+    parser.add_argument('--maquinas', type=int, default=50)
+    parser.add_argument('--informes', type=int, default=5000)
+    args = parser.parse_args()
+
+    with copia_temporal('bench_arranque_'):
+        from db import conectar
+        from benchmarks.sembrar import sembrar
+
+        # La primera sonda crea el esquema; después se siembran los datos
+        ejecutar_sonda('ESQUEMA')
+        conn = conectar(os.path.abspath('informes.db'))
+        try:
+            sembrar(conn, None, args.maquinas, args.informes, imagenes=0)
+        finally:
+            conn.close()
+        print(f"Arranque con {args.maquinas} máquinas y {args.informes} informes")
+
+        resultados, cargados = medir_arranque(args.repeticiones)
+
+    for nombre, r in resultados.items():
+        print(f"{nombre:<30} {r['mediana_s'] * 1000:>8.1f} ms  (mín {r['min_s'] * 1000:.1f}, "
+              f"máx {r['max_s'] * 1000:.1f})")
+    if cargados:
+        print(f"Cargados antes del primer PDF: {', '.join(cargados)}; deberían importarse al usarse")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
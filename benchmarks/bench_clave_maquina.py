@@ -0,0 +1,181 @@
+"""Antes y después de la clave entera de la máquina (migración 8).
+
+Crea una base temporal con el esquema de la versión 7 (informes.nombre_maquina
+de texto), la siembra, mide el tamaño de la tabla y los índices de informes y
+las consultas habituales; luego aplica la migración 8 (informes.maquina_id),
+mide cuánto tarda y repite las mismas mediciones con las consultas nuevas.
+
+En "después" el id de la máquina se da por resuelto: en la aplicación sale de
+la caché de nombre → id (modelos.IdsMaquinas) sin tocar la base de datos.
+
+Uso: python -m benchmarks.bench_clave_maquina [--maquinas 200] [--informes 200000] [--repeticiones 5]
+"""
+import os
+import time
+import random
+import argparse
+import tempfile
+from datetime import date, timedelta
+
+from benchmarks.suite import medir
+from benchmarks.sembrar import descripcion, nombres_maquinas
+
+# Consultas equivalentes con la clave de texto (versión 7) y con la entera (versión 8).
+# Los parámetros :maquina, :fecha_inicio y :fecha_fin se completan en cada caso
+CONSULTAS = {
+    'pagina_maquina': (
+        """SELECT id, nombre_maquina, fecha, hora, descripcion, imagen, creado_en
+           FROM informes WHERE nombre_maquina = :maquina
+           ORDER BY fecha DESC, hora DESC, id DESC LIMIT 21""",
+        """SELECT i.id, m.nombre, i.fecha, i.hora, i.descripcion, i.imagen, i.creado_en
+           FROM informes i JOIN maquinas m ON m.id = i.maquina_id WHERE i.maquina_id = :maquina
+           ORDER BY i.fecha DESC, i.hora DESC, i.id DESC LIMIT 21""",
+    ),
+    'informes_maquina_anio': (
+        """SELECT id, nombre_maquina, fecha, hora, descripcion, imagen, creado_en
+           FROM informes WHERE fecha BETWEEN :fecha_inicio AND :fecha_fin AND nombre_maquina = :maquina
+           ORDER BY nombre_maquina, fecha, hora""",
+        """SELECT i.id, m.nombre, i.fecha, i.hora, i.descripcion, i.imagen, i.creado_en
+           FROM informes i JOIN maquinas m ON m.id = i.maquina_id
+           WHERE i.fecha BETWEEN :fecha_inicio AND :fecha_fin AND i.maquina_id = :maquina
+           ORDER BY m.nombre, i.fecha, i.hora""",
+    ),
+    'maquinas_con_informes_anio': (
+        """SELECT nombre_maquina, COUNT(*) AS total FROM informes
+           WHERE fecha BETWEEN :fecha_inicio AND :fecha_fin
+           GROUP BY nombre_maquina ORDER BY total DESC, nombre_maquina""",
+        """SELECT m.id, m.nombre, COUNT(*) AS total FROM informes i JOIN maquinas m ON m.id = i.maquina_id
+           WHERE i.fecha BETWEEN :fecha_inicio AND :fecha_fin
+           GROUP BY i.maquina_id ORDER BY total DESC, m.nombre""",
+    ),
+    'listado_completo': (
+        """SELECT id, nombre_maquina, fecha, hora, descripcion, imagen, creado_en
+           FROM informes ORDER BY nombre_maquina, fecha, hora""",
+        """SELECT i.id, m.nombre, i.fecha, i.hora, i.descripcion, i.imagen, i.creado_en
+           FROM informes i JOIN maquinas m ON m.id = i.maquina_id ORDER BY m.nombre, i.fecha, i.hora""",
+    ),
+    'estadisticas_maquinas': (
+        """SELECT m.id, m.nombre, COALESCE(s.total, 0), s.ultima_fecha FROM maquinas m
+           LEFT JOIN maquina_stats s ON s.nombre_maquina = m.nombre ORDER BY m.nombre""",
+        """SELECT m.id, m.nombre, COALESCE(s.total, 0), s.ultima_fecha FROM maquinas m
+           LEFT JOIN maquina_stats s ON s.maquina_id = m.id ORDER BY m.nombre""",
+    ),
+}
+
+# Borrar una máquina con sus informes (dentro de una transacción que se revierte)
+BORRADO = (
+    ["DELETE FROM informes WHERE nombre_maquina = :maquina", "DELETE FROM maquinas WHERE nombre = :maquina"],
+    ["DELETE FROM maquinas WHERE id = :maquina"],
+)
+
+
+def sembrar_v7(conn, maquinas, informes, semilla=1, lote=10000):
+    """Inserta informes sintéticos con la clave de texto de la versión 7"""
+    aleatorio = random.Random(semilla)
+    nombres = nombres_maquinas(maquinas)
+    hoy = date.today()
+
+    def filas():
+        for _ in range(informes):
+            fecha = hoy - timedelta(days=aleatorio.randrange(3 * 365))
+            hora = '' if aleatorio.random() < 0.1 else f"{aleatorio.randint(6, 21):02d}:{aleatorio.randrange(60):02d}"
+            yield aleatorio.choice(nombres), fecha.isoformat(), hora, descripcion(aleatorio), None
+
+    with conn:
+        conn.executemany("INSERT INTO maquinas (nombre) VALUES (?)", [(n,) for n in nombres])
+    pendientes = filas()
+    while True:
+        bloque = [fila for _, fila in zip(range(lote), pendientes)]
+        if not bloque:
+            break
+        with conn:
+            conn.executemany("""INSERT INTO informes (nombre_maquina, fecha, hora, descripcion, imagen)
+                                VALUES (?, ?, ?, ?, ?)""", bloque)
+    return nombres
+
+
+def tamanos(conn):
+    """Bytes en disco de la tabla informes, de cada uno de sus índices y de la base completa"""
+    objetos = conn.execute("""SELECT name FROM sqlite_schema
+                              WHERE tbl_name = 'informes' AND type IN ('table', 'index')""").fetchall()
+    resultado = {}
+    for (nombre,) in objetos:
+        resultado[nombre] = conn.execute("SELECT SUM(pgsize) FROM dbstat WHERE name = ?", (nombre,)).fetchone()[0]
+    paginas = conn.execute("PRAGMA page_count").fetchone()[0]
+    resultado['(base completa)'] = paginas * conn.execute("PRAGMA page_size").fetchone()[0]
+    return resultado
+
+
+def medir_consultas(conn, indice, maquinas, repeticiones):
+    hoy = date.today()
+    periodo = {'fecha_inicio': (hoy - timedelta(days=365)).isoformat(), 'fecha_fin': hoy.isoformat()}
+    resultados = {}
+    for caso, sqls in CONSULTAS.items():
+        def consulta(sql=sqls[indice]):
+            for maquina in maquinas:
+                conn.execute(sql, dict(periodo, maquina=maquina)).fetchall()
+                if ':maquina' not in sql:
+                    break
+        resultados[caso] = medir(consulta, repeticiones)
+
+    def borrar():
+        for maquina in maquinas[:3]:
+            conn.execute("BEGIN")
+            try:
+                for sql in BORRADO[indice]:
+                    conn.execute(sql, {'maquina': maquina})
+            finally:
+                conn.rollback()
+    resultados['borrar_maquina'] = medir(borrar, repeticiones)
+    return resultados
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Tamaño y consultas con clave de máquina de texto y entera')
+    parser.add_argument('--maquinas', type=int, default=200)
+    parser.add_argument('--informes', type=int, default=200000)
+    parser.add_argument('--repeticiones', type=int, default=5)
+    args = parser.parse_args()
+
+    from db import conectar
+    from migraciones import VERSION_ACTUAL, aplicar_migraciones
+
+    with tempfile.TemporaryDirectory(prefix='bench_clave_maquina_') as carpeta:
+        conn = conectar(os.path.join(carpeta, 'informes.db'), wal=True)
+        try:
+            aplicar_migraciones(conn, hasta=7)
+            nombres = sembrar_v7(conn, args.maquinas, args.informes)
+            # Tamaños comparables: sin páginas libres ni restos de la siembra
+            conn.execute("VACUUM")
+            # Una muestra de máquinas repartida por el orden alfabético
+            muestra = nombres[::max(1, len(nombres) // 10)]
+            print(f"{args.maquinas} máquinas, {args.informes} informes; consultas sobre {len(muestra)} máquinas\n")
+
+            tamanos_antes = tamanos(conn)
+            antes = medir_consultas(conn, 0, muestra, args.repeticiones)
+
+            inicio = time.perf_counter()
+            aplicar_migraciones(conn, hasta=VERSION_ACTUAL)
+            duracion_migracion = time.perf_counter() - inicio
+            conn.execute("VACUUM")
+
+            ids = dict(conn.execute("SELECT nombre, id FROM maquinas"))
+            tamanos_despues = tamanos(conn)
+            despues = medir_consultas(conn, 1, [ids[n] for n in muestra], args.repeticiones)
+        finally:
+            conn.close()
+
+    print(f"\nMigración 8: {duracion_migracion:.2f} s\n")
+    print(f"{'Tamaño':<32} {'antes':>10} {'después':>10} {'cambio':>8}")
+    for nombre in sorted(tamanos_antes.keys() & tamanos_despues.keys()):
+        a, d = tamanos_antes[nombre], tamanos_despues[nombre]
+        print(f"{nombre:<32} {a / 1024 / 1024:>8.2f}MB {d / 1024 / 1024:>8.2f}MB {(d - a) / a * 100:>+7.1f}%")
+
+    print(f"\n{'Consulta':<32} {'antes':>10} {'después':>10} {'cambio':>8}")
+    for caso in antes:
+        a, d = antes[caso]['mediana_s'] * 1000, despues[caso]['mediana_s'] * 1000
+        print(f"{caso:<32} {a:>8.2f}ms {d:>8.2f}ms {(d - a) / a * 100:>+7.1f}%")
+
+
+if __name__ == '__main__':
+    main()
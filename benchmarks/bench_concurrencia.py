@@ -0,0 +1,93 @@
+"""Prueba de carga: varios kioscos navegando a la vez contra el servidor de producción.
+
+Levanta la aplicación con waitress sobre una copia temporal (base de datos,
+plantillas y estáticos) y simula kioscos que recorren el índice, las páginas
+de máquinas y la búsqueda. Mide el rendimiento con distinto número de hilos.
+
+Uso: python -m benchmarks.bench_concurrencia [kioscos] [segundos] [hilos,...]
+"""
+import sys
+import time
+import random
+import logging
+import threading
+import http.client
+from urllib.parse import quote
+
+from benchmarks.entorno import copia_temporal
+from benchmarks.sembrar import sembrar
+
+PALABRAS = ['monedero', 'billetero', 'impresora', 'display', 'lector', 'tarjeta', 'rotor', 'router']
+
+
+def kiosco(puerto, rutas, fin, latencias, errores):
+    conn = http.client.HTTPConnection('127.0.0.1', puerto, timeout=30)
+    etags = {}
+    while time.perf_counter() < fin:
+        ruta = random.choice(rutas)
+        cabeceras = {'If-None-Match': etags[ruta]} if ruta in etags else {}
+        inicio = time.perf_counter()
+        try:
+            conn.request('GET', ruta, headers=cabeceras)
+            respuesta = conn.getresponse()
+            respuesta.read()
+        except (OSError, http.client.HTTPException):
+            errores.append(ruta)
+            conn.close()
+            conn = http.client.HTTPConnection('127.0.0.1', puerto, timeout=30)
+            continue
+        latencias.append(time.perf_counter() - inicio)
+        if respuesta.status not in (200, 304):
+            errores.append(ruta)
+        elif respuesta.getheader('ETag'):
+            etags[ruta] = respuesta.getheader('ETag')
+    conn.close()
+
+
+def medir(app, servidor_factory, rutas, kioscos, segundos, hilos):
+    servidor = servidor_factory(app, host='127.0.0.1', puerto=0, hilos=hilos)
+    hilo_servidor = threading.Thread(target=servidor.run, daemon=True)
+    hilo_servidor.start()
+    latencias, errores = [], []
+    fin = time.perf_counter() + segundos
+    clientes = [threading.Thread(target=kiosco, args=(servidor.effective_port, rutas, fin, latencias, errores))
+                for _ in range(kioscos)]
+    for cliente in clientes:
+        cliente.start()
+    for cliente in clientes:
+        cliente.join()
+    # Esperar las peticiones en curso y cerrar desde el hilo del servidor
+    servidor.task_dispatcher.shutdown()
+    servidor.trigger.pull_trigger(servidor.close)
+    hilo_servidor.join(timeout=5)
+    latencias.sort()
+    p50 = latencias[len(latencias) // 2] * 1000 if latencias else 0
+    p95 = latencias[int(len(latencias) * 0.95)] * 1000 if latencias else 0
+    print(f"{hilos:>5} hilos {len(latencias) / segundos:>10,.0f} pet/s   p50 {p50:>7.1f} ms   "
+          f"p95 {p95:>7.1f} ms   errores {len(errores)}")
+
+
+def main():
+    kioscos = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    segundos = float(sys.argv[2]) if len(sys.argv) > 2 else 10
+    lista_hilos = [int(h) for h in sys.argv[3].split(',')] if len(sys.argv) > 3 else [1, 4, 8]
+
+    # waitress avisa de cada petición en cola; aquí la cola llena es lo esperado
+    logging.getLogger('waitress.queue').setLevel(logging.ERROR)
+    with copia_temporal('bench_concurrencia_'):
+        import app as aplicacion
+        aplicacion.iniciar_aplicacion()
+        from db import conexion
+        from servidor import crear_servidor
+
+        with conexion() as conn:
+            maquinas = sembrar(conn, maquinas=40, informes=8000, imagenes=0)
+        rutas = ['/'] + [f"/maquina/{quote(m)}" for m in maquinas] + [f"/buscar?q={p}" for p in PALABRAS]
+        print(f"{kioscos} kioscos durante {segundos:.0f} s por configuración")
+        for hilos in lista_hilos:
+            medir(aplicacion.app, crear_servidor, rutas, kioscos, segundos, hilos)
+        aplicacion.apagar()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""Exportación en streaming de muchos informes con un presupuesto fijo de memoria.
+
+Crea una base temporal con filas sintéticas, la exporta en CSV y JSONL
+(con y sin gzip) consumiendo los trozos uno a uno, y falla si el pico de
+memoria supera el presupuesto.
+
+Uso: python -m benchmarks.bench_exportacion [filas] [presupuesto_mb]
+"""
+import os
+import sys
+import time
+import tempfile
+import tracemalloc
+
+from flask import Flask
+
+import db
+from db import conexion
+from migraciones import migrar
+from exportacion import GENERADORES, comprimir_gzip, consultar_filas_exportacion
+
+
+def filas_sinteticas(n):
+    for i in range(n):
+        dia = 1 + i % 28
+        hora = '' if i % 10 == 0 else f"{i % 24:02d}:{i % 60:02d}"
+        yield (f"Maquina {i % 50}", f"20{10 + i % 15}-{1 + i % 12:02d}-{dia:02d}", hora,
+               f"Descripción del informe {i}: revisión del monedero y limpieza del lector", None)
+
+
+def poblar(n):
+    with conexion() as conn, conn:
+        conn.executemany("INSERT INTO maquinas (nombre) VALUES (?)", [(f"Maquina {i}",) for i in range(50)])
+        conn.executemany("""INSERT INTO informes (maquina_id, fecha, hora, descripcion, imagen)
+                            VALUES ((SELECT id FROM maquinas WHERE nombre = ?), ?, ?, ?, ?)""",
+                         filas_sinteticas(n))
+
+
+def medir(formato, gzip):
+    with conexion() as conn:
+        trozos = GENERADORES[formato](consultar_filas_exportacion(conn))
+        if gzip:
+            trozos = comprimir_gzip(trozos)
+        tracemalloc.start()
+        inicio = time.perf_counter()
+        total = 0
+        for trozo in trozos:
+            total += len(trozo)
+        duracion = time.perf_counter() - inicio
+        pico = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return duracion, total, pico
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 500000
+    presupuesto = float(sys.argv[2]) if len(sys.argv) > 2 else 8.0
+
+    with tempfile.TemporaryDirectory() as carpeta:
+        app = Flask(__name__)
+        app.config['DATABASE'] = os.path.join(carpeta, 'bench.db')
+        db.init_app(app)
+        with app.app_context():
+            migrar()
+            inicio = time.perf_counter()
+            poblar(n)
+            print(f"{n} filas insertadas en {time.perf_counter() - inicio:.1f} s")
+
+            excedido = False
+            for formato in GENERADORES:
+                for gzip in (False, True):
+                    duracion, total, pico = medir(formato, gzip)
+                    nombre = f"{formato}{'+gzip' if gzip else ''}"
+                    pico_mb = pico / 1024 / 1024
+                    print(f"{nombre:<12} {n / duracion:>12,.0f} filas/s {total / 1024 / 1024:>8.1f} MB enviados"
+                          f" {pico_mb:>6.1f} MB pico")
+                    excedido |= pico_mb > presupuesto
+
+    if excedido:
+        print(f"El pico de memoria superó el presupuesto de {presupuesto} MB")
+        sys.exit(1)
+    print(f"Memoria dentro del presupuesto de {presupuesto} MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""Micro-benchmark: mapeo de filas de informes a diccionarios vs. Informe.
+
+Uso: python -m benchmarks.bench_mapeo_informes [filas]
+"""
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+from modelos import informe_desde_fila
+
+
+def _parse_hora_anterior(hora_str):
+    try:
+        if hora_str and hora_str.strip():
+            return datetime.strptime(hora_str, '%H:%M').time()
+        else:
+            return datetime.strptime('00:00', '%H:%M').time()
+    except ValueError:
+        return datetime.strptime('00:00', '%H:%M').time()
+
+
+def _dict_anterior(row):
+    # Copia del mapeo que existía en cada función de app.py
+    return {
+        'id': row[0],
+        'nombre_maquina': row[1],
+        'fecha': datetime.strptime(row[2], '%Y-%m-%d').date(),
+        'hora': _parse_hora_anterior(row[3]),
+        'descripcion': row[4],
+        'imagen': row[5],
+        'creado_en': datetime.strptime(row[6], '%Y-%m-%d %H:%M:%S')
+    }
+
+
+def filas_sinteticas(n):
+    filas = []
+    for i in range(n):
+        dia = 1 + i % 28
+        hora = '' if i % 10 == 0 else f"{i % 24:02d}:{i % 60:02d}"
+        filas.append((i, f"Maquina {i % 50}", f"2025-{1 + i % 12:02d}-{dia:02d}", hora,
+                      f"Descripción del informe {i}", None, f"2025-10-{dia:02d} 12:00:00"))
+    return filas
+
+
+def medir(nombre, mapeo, filas):
+    inicio = time.perf_counter()
+    resultado = [mapeo(row) for row in filas]
+    duracion = time.perf_counter() - inicio
+    del resultado
+
+    tracemalloc.start()
+    resultado = [mapeo(row) for row in filas]
+    memoria = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del resultado
+
+    print(f"{nombre:<12} {len(filas) / duracion:>12,.0f} filas/s {memoria / 1024 / 1024:>8.1f} MB")
+    return duracion, memoria
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    filas = filas_sinteticas(n)
+    print(f"Mapeo de {n} filas")
+    t_dict, m_dict = medir('dict', _dict_anterior, filas)
+    t_inf, m_inf = medir('Informe', informe_desde_fila, filas)
+    print(f"Aceleración: {t_dict / t_inf:.1f}x | Memoria: {m_inf / m_dict:.0%} de la anterior")
+
+
+if __name__ == '__main__':
+    main()
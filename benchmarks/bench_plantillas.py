@@ -0,0 +1,117 @@
+"""Renderizado de las páginas de inicio y de máquina, con y sin cachés.
+
+Mide dos cosas sobre una copia temporal con datos sembrados:
+
+- primer renderizado en un proceso nuevo (compila base.html, index.html,
+  maquina.html y sus fragmentos), sin la caché de bytecode de Jinja y con ella
+  ya llena en TEMPLATE_CACHE_FOLDER
+- renderizado en caliente de las mismas páginas, sin la caché de fragmentos y
+  con ella (la lista de máquinas y la página de informes se reutilizan
+  mientras no cambie la versión de los datos)
+
+Uso: python -m benchmarks.bench_plantillas [--maquinas 200] [--informes 100000] [--repeticiones 20]
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+from urllib.parse import quote
+
+from benchmarks.entorno import RAIZ, copia_temporal
+from benchmarks.suite import medir
+
+SONDA = r'''
+import json, sys, time
+import app
+
+app.iniciar_aplicacion()
+if sys.argv[2] == 'sin_cache':
+    # Aún no se cargó ninguna plantilla: se compilan todas como antes de la caché
+    app.app.jinja_env.bytecode_cache = None
+cliente = app.app.test_client()
+tiempos = {}
+for nombre, ruta in (('index', '/'), ('maquina', '/maquina/' + sys.argv[1])):
+    inicio = time.perf_counter()
+    respuesta = cliente.get(ruta)
+    respuesta.get_data()
+    assert respuesta.status_code == 200, (ruta, respuesta.status_code)
+    tiempos[nombre] = time.perf_counter() - inicio
+app.apagar()
+print(json.dumps(tiempos))
+'''
+
+
+def ejecutar_sonda(maquina, modo):
+    """Primer renderizado de cada página en un proceso nuevo; segundos por página"""
+    entorno = dict(os.environ, PYTHONPATH=RAIZ + os.pathsep + os.environ.get('PYTHONPATH', ''))
+    salida = subprocess.run([sys.executable, '-c', SONDA, maquina, modo],
+                            env=entorno, capture_output=True, text=True, check=True)
+    return json.loads(salida.stdout.strip().splitlines()[-1])
+
+
+def primer_renderizado(maquina, repeticiones):
+    """{modo: {pagina: mediana en segundos}} para 'sin_cache' y 'con_cache'"""
+    # La primera ejecución llena la caché de bytecode (y aplica las migraciones)
+    ejecutar_sonda(maquina, 'con_cache')
+    resultados = {}
+    for modo in ('sin_cache', 'con_cache'):
+        muestras = [ejecutar_sonda(maquina, modo) for _ in range(repeticiones)]
+        resultados[modo] = {pagina: statistics.median(m[pagina] for m in muestras) for pagina in muestras[0]}
+    return resultados
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Renderizado de páginas con y sin cachés de plantillas')
+    parser.add_argument('--maquinas', type=int, default=200)
+    parser.add_argument('--informes', type=int, default=100000)
+    parser.add_argument('--repeticiones', type=int, default=20)
+    args = parser.parse_args()
+
+    with copia_temporal('bench_plantillas_'):
+        import app as aplicacion
+        aplicacion.iniciar_aplicacion()
+        from db import conexion
+        from benchmarks.sembrar import sembrar
+
+        with conexion() as conn:
+            nombres = sembrar(conn, None, args.maquinas, args.informes, 0)
+        maquina = quote(nombres[len(nombres) // 2])
+        print(f"{args.maquinas} máquinas, {args.informes} informes\n")
+
+        cliente = aplicacion.app.test_client()
+
+        def get(ruta):
+            def pedir():
+                respuesta = cliente.get(ruta)
+                respuesta.get_data()
+                assert respuesta.status_code == 200, (ruta, respuesta.status_code)
+            return pedir
+
+        paginas = {'index': get('/'), 'maquina': get(f'/maquina/{maquina}')}
+        cache = aplicacion.cache_fragmentos
+        max_entradas = cache.max_entradas
+        caliente = {}
+        for modo, entradas in (('sin_cache', 0), ('con_cache', max_entradas)):
+            cache.max_entradas = entradas
+            caliente[modo] = {nombre: medir(pedir, args.repeticiones)['mediana_s'] for nombre, pedir in paginas.items()}
+        cache.max_entradas = max_entradas
+        estadisticas = cache.estadisticas()
+        aplicacion.apagar()
+
+        primero = primer_renderizado(maquina, max(3, args.repeticiones // 4))
+
+    for titulo, resultados in (('Primer renderizado (proceso nuevo, caché de bytecode)', primero),
+                               ('En caliente (caché de fragmentos)', caliente)):
+        print(titulo)
+        print(f"  {'Página':<10} {'sin caché':>10} {'con caché':>10} {'cambio':>8}")
+        for pagina in resultados['sin_cache']:
+            a, d = resultados['sin_cache'][pagina] * 1000, resultados['con_cache'][pagina] * 1000
+            print(f"  {pagina:<10} {a:>8.2f}ms {d:>8.2f}ms {(d - a) / a * 100:>+7.1f}%")
+        print()
+    print(f"Fragmentos: {estadisticas}")
+
+
+if __name__ == '__main__':
+    main()
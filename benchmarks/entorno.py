@@ -0,0 +1,31 @@
+"""Copia temporal de trabajo para ejecutar la aplicación en los benchmarks.
+
+app.py resuelve la base de datos, las plantillas y los estáticos desde el
+directorio actual; los benchmarks trabajan en una copia para no tocar los
+datos reales.
+"""
+import os
+import sys
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@contextmanager
+def copia_temporal(prefijo='bench_'):
+    """Cambia a un directorio temporal con plantillas y estáticos (sin subidas)"""
+    carpeta = tempfile.mkdtemp(prefix=prefijo)
+    anterior = os.getcwd()
+    shutil.copytree(os.path.join(RAIZ, 'templates'), os.path.join(carpeta, 'templates'))
+    shutil.copytree(os.path.join(RAIZ, 'static'), os.path.join(carpeta, 'static'),
+                    ignore=shutil.ignore_patterns('uploads'))
+    if RAIZ not in sys.path:
+        sys.path.insert(0, RAIZ)
+    os.chdir(carpeta)
+    try:
+        yield carpeta
+    finally:
+        os.chdir(anterior)
+        shutil.rmtree(carpeta, ignore_errors=True)
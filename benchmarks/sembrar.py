@@ -0,0 +1,139 @@
+"""Generador de datos sintéticos: máquinas, informes e imágenes a la escala deseada.
+
+Las descripciones imitan las novedades reales (acción, componente, hallazgo)
+y las imágenes son fotos generadas con ruido y degradados, guardadas por
+contenido como las subidas.
+
+Uso: python -m benchmarks.sembrar BASE_DE_DATOS [--maquinas 200] [--informes 200000]
+                                 [--imagenes 200] [--uploads static/uploads]
+"""
+import io
+import os
+import time
+import random
+import argparse
+from datetime import date, timedelta
+
+from PIL import Image, ImageDraw
+
+from imagenes import preparar_imagen
+from modelos import incrementar_version_datos
+
+LUGARES = ['Gran Avenida', 'Cable Aéreo', 'Estación Central', 'Terminal Norte', 'Parque Berrío', 'Industriales',
+           'Poblado', 'Aguacatala', 'San Antonio', 'Universidad', 'Hospital', 'Acevedo', 'Niquía', 'Envigado']
+OPERADORES = ['Inder', 'SuSuerte', 'Metro', 'Recaudo', 'Cívica', 'Tullave']
+ACCIONES = ['se realiza mantenimiento preventivo', 'se realiza la revisión', 'se reemplaza', 'se limpia',
+            'se calibra', 'se ajusta', 'se actualiza el firmware', 'se inspecciona', 'se reinicia']
+COMPONENTES = ['del monedero', 'del billetero', 'de la impresora térmica', 'del display táctil',
+               'del lector de tarjetas', 'de la tarjeta unificadora', 'del módulo OTP', 'del rotor del motor',
+               'de la fuente de poder', 'del router 4G', 'de la cerradura', 'del dispensador']
+HALLAZGOS = ['Se encontró un corto en el cableado', 'No se evidencian fallas',
+             'La máquina no cuenta con dinero para operar', 'Se detecta atasco de billetes',
+             'El papel de la impresora estaba agotado', 'La pantalla no respondía al tacto',
+             'Se encontró polvo acumulado en los ventiladores', 'El lector rechazaba tarjetas válidas']
+CIERRES = ['La máquina presta el servicio con normalidad.', 'Se programa una nueva visita para mañana.',
+           'Se informa al encargado para que realice el cargue.', 'Queda pendiente el repuesto.',
+           'Se aprovecha para realizar el mantenimiento trimestral.']
+
+
+def nombres_maquinas(n):
+    # Operador y lugar recorren todas sus combinaciones; el número las distingue después
+    combinaciones = len(OPERADORES) * len(LUGARES)
+    return [f"{OPERADORES[i % len(OPERADORES)]} - {LUGARES[(i // len(OPERADORES)) % len(LUGARES)]}"
+            f" {i // combinaciones + 1:02d}" for i in range(n)]
+
+
+def descripcion(aleatorio):
+    texto = f"*{aleatorio.choice(ACCIONES)} {aleatorio.choice(COMPONENTES)}.\n{aleatorio.choice(HALLAZGOS)}."
+    if aleatorio.random() < 0.6:
+        texto += f"\n\n*{aleatorio.choice(CIERRES)}"
+    return texto
+
+
+# Generar una foto sintética en JPEG (degradado, ruido y algunas formas)
+def foto_sintetica(aleatorio, ancho=1280, alto=960):
+    ruido = Image.effect_noise((ancho // 4, alto // 4), 40).resize((ancho, alto))
+    fondo = Image.merge('RGB', [ruido.point(lambda v, d=aleatorio.randint(-60, 60): max(0, min(255, v + d)))
+                                for _ in range(3)])
+    dibujo = ImageDraw.Draw(fondo)
+    for _ in range(6):
+        x, y = aleatorio.randrange(ancho), aleatorio.randrange(alto)
+        lado = aleatorio.randint(60, 400)
+        color = tuple(aleatorio.randrange(256) for _ in range(3))
+        dibujo.rectangle([x, y, x + lado, y + lado * 3 // 4], fill=color)
+    salida = io.BytesIO()
+    fondo.save(salida, 'JPEG', quality=85)
+    return salida
+
+
+def generar_imagenes(carpeta_uploads, cantidad, aleatorio):
+    """Guarda `cantidad` fotos por contenido y devuelve sus nombres"""
+    nombres = []
+    for _ in range(cantidad):
+        preparada = preparar_imagen(carpeta_uploads, foto_sintetica(aleatorio), 'jpg')
+        preparada.colocar()
+        nombres.append(preparada.nombre)
+    return nombres
+
+
+def sembrar(conn, carpeta_uploads=None, maquinas=200, informes=200000, imagenes=200,
+            proporcion_con_imagen=0.3, anios=3, semilla=1, lote=10000):
+    """Inserta máquinas e informes sintéticos; devuelve los nombres de las máquinas"""
+    aleatorio = random.Random(semilla)
+    nombres = nombres_maquinas(maquinas)
+    fotos = generar_imagenes(carpeta_uploads, imagenes, aleatorio) if imagenes and carpeta_uploads else []
+    hoy = date.today()
+    dias = anios * 365
+
+    def filas():
+        for _ in range(informes):
+            fecha = hoy - timedelta(days=aleatorio.randrange(dias))
+            hora = '' if aleatorio.random() < 0.1 else f"{aleatorio.randint(6, 21):02d}:{aleatorio.randrange(60):02d}"
+            imagen = aleatorio.choice(fotos) if fotos and aleatorio.random() < proporcion_con_imagen else None
+            yield ids[aleatorio.choice(nombres)], fecha.isoformat(), hora, descripcion(aleatorio), imagen
+
+    with conn:
+        conn.executemany("INSERT OR IGNORE INTO maquinas (nombre) VALUES (?)", [(n,) for n in nombres])
+    ids = dict(conn.execute("SELECT nombre, id FROM maquinas"))
+    pendientes = filas()
+    while True:
+        bloque = [fila for _, fila in zip(range(lote), pendientes)]
+        if not bloque:
+            break
+        with conn:
+            conn.executemany("""INSERT INTO informes (maquina_id, fecha, hora, descripcion, imagen)
+                                VALUES (?, ?, ?, ?, ?)""", bloque)
+    with conn:
+        incrementar_version_datos(conn)
+    return nombres
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Llena una base de datos con informes sintéticos')
+    parser.add_argument('base_de_datos')
+    parser.add_argument('--maquinas', type=int, default=200)
+    parser.add_argument('--informes', type=int, default=200000)
+    parser.add_argument('--imagenes', type=int, default=200)
+    parser.add_argument('--uploads', default=os.path.join('static', 'uploads'))
+    parser.add_argument('--semilla', type=int, default=1)
+    args = parser.parse_args()
+
+    from flask import Flask
+    import db
+    from db import conexion
+    from migraciones import migrar
+
+    app = Flask(__name__)
+    app.config['DATABASE'] = os.path.abspath(args.base_de_datos)
+    db.init_app(app)
+    with app.app_context():
+        migrar()
+        inicio = time.perf_counter()
+        with conexion() as conn:
+            sembrar(conn, args.uploads, args.maquinas, args.informes, args.imagenes, semilla=args.semilla)
+    print(f"{args.maquinas} máquinas, {args.informes} informes y {args.imagenes} imágenes "
+          f"en {time.perf_counter() - inicio:.1f} s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,216 @@
+"""Suite de benchmarks de arranque, rutas, generación de PDF y funciones de datos.
+
+Siembra una copia temporal de la aplicación a la escala indicada, mide cada
+caso (mediana de varias repeticiones y pico de memoria con tracemalloc) y
+guarda los resultados en JSON. Con --comparar se contrasta con una ejecución
+anterior y el proceso termina con código 1 si algún caso empeoró más que la
+tolerancia.
+
+Uso: python -m benchmarks.suite [--maquinas 200] [--informes 200000] [--imagenes 200]
+                               [--repeticiones 3] [--salida resultados.json]
+                               [--comparar anterior.json] [--tolerancia 0.2] [--umbral-ms 1]
+                               [--solo patrón]
+"""
+import gc
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import statistics
+import tracemalloc
+from datetime import datetime
+from urllib.parse import quote
+
+from benchmarks.entorno import copia_temporal
+from benchmarks.bench_arranque import medir_arranque
+
+
+def medir(funcion, repeticiones):
+    """Mediana, mínimo y máximo en segundos, más el pico de memoria de una ejecución aparte"""
+    tiempos = []
+    for _ in range(repeticiones):
+        gc.collect()
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    # tracemalloc ralentiza: la memoria se mide en una ejecución que no cuenta para el tiempo
+    gc.collect()
+    tracemalloc.start()
+    funcion()
+    pico = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {
+        'mediana_s': statistics.median(tiempos),
+        'min_s': min(tiempos),
+        'max_s': max(tiempos),
+        'repeticiones': repeticiones,
+        'pico_mb': round(pico / 1024 / 1024, 2),
+    }
+
+
+def casos(aplicacion, maquinas):
+    """Lista de (nombre, función) a medir"""
+    from db import conexion
+    from modelos import incrementar_version_datos
+
+    cliente = aplicacion.app.test_client()
+    maquina = maquinas[len(maquinas) // 2]
+    hoy = datetime.now().date()
+    mes_inicio = hoy.replace(day=1).isoformat()
+
+    def get(ruta, esperado=200):
+        def pedir():
+            respuesta = cliente.get(ruta)
+            datos = respuesta.get_data()
+            respuesta.close()
+            assert respuesta.status_code == esperado, (ruta, respuesta.status_code)
+            return datos
+        return pedir
+
+    def post(ruta, datos):
+        def pedir():
+            respuesta = cliente.post(ruta, data=datos)
+            respuesta.get_data()
+            respuesta.close()
+            assert respuesta.status_code == 200, (ruta, respuesta.status_code)
+        return pedir
+
+    def sin_cache(funcion):
+        # Una versión nueva de los datos invalida la caché de informes PDF
+        def ejecutar():
+            with conexion() as conn, conn:
+                incrementar_version_datos(conn)
+            funcion()
+        return ejecutar
+
+    def primera_pagina():
+        aplicacion.get_pagina_informes_maquina(maquina, aplicacion.app.config['INFORMES_POR_PAGINA'])
+
+    personalizado = {'titulo': 'INFORME DEL MES', 'fecha_inicio': mes_inicio, 'fecha_fin': hoy.isoformat()}
+    # Un cliente al que le faltan los últimos 50 cambios
+    with conexion() as conn:
+        cursor_reciente = max(0, conn.execute("SELECT MAX(seq) FROM cambios").fetchone()[0] - 50)
+    return [
+        ('ruta.index', get('/')),
+        ('ruta.ver_maquina', get(f"/maquina/{quote(maquina)}")),
+        ('ruta.buscar', get('/buscar?q=monedero')),
+        ('ruta.exportar_csv', get('/exportar/csv')),
+        ('ruta.api_sincronizacion.completa', get('/api/sincronizacion')),
+        ('ruta.api_sincronizacion.delta', get(f'/api/sincronizacion?desde={cursor_reciente}')),
+        ('ruta.api_analitica.semana', get('/api/analitica?agrupacion=semana')),
+        ('ruta.api_analitica.mes', get('/api/analitica?agrupacion=mes&fecha_inicio=2000-01-01')),
+        ('ruta.generar_informe_pdf.frio', sin_cache(get('/generar_informe_pdf'))),
+        ('ruta.generar_informe_pdf.cache', get('/generar_informe_pdf')),
+        ('ruta.generar_informe_personalizado.frio',
+         sin_cache(post('/generar_informe_personalizado', personalizado))),
+        ('ruta.generar_informe_personalizado.cache', post('/generar_informe_personalizado', personalizado)),
+        ('datos.get_maquinas', aplicacion.get_maquinas),
+        ('datos.get_maquinas_con_estadisticas', aplicacion.get_maquinas_con_estadisticas),
+        ('datos.get_informes_por_maquina', lambda: aplicacion.get_informes_por_maquina(maquina)),
+        ('datos.get_pagina_informes_maquina', primera_pagina),
+        ('datos.get_all_informes', aplicacion.get_all_informes),
+        ('datos.get_informes_por_fechas', lambda: aplicacion.get_informes_por_fechas(mes_inicio, hoy.isoformat())),
+        ('datos.get_rango_fechas', aplicacion.get_rango_fechas),
+        ('datos.get_version_datos', aplicacion.get_version_datos),
+        ('datos.get_informe_by_id', lambda: aplicacion.get_informe_by_id(1)),
+    ]
+
+
+def comparar(actual, anterior, tolerancia, umbral_s):
+    """Imprime la variación de cada caso; devuelve los que empeoraron más que la tolerancia.
+
+    Las diferencias menores que `umbral_s` no cuentan: en los casos de
+    fracciones de milisegundo el ruido supera fácilmente cualquier porcentaje.
+    """
+    regresiones = []
+    print(f"\n{'caso':<45} {'anterior':>10} {'actual':>10} {'cambio':>8}")
+    for nombre, resultado in actual['resultados'].items():
+        previo = anterior.get('resultados', {}).get(nombre)
+        if previo is None:
+            continue
+        cambio = resultado['mediana_s'] / previo['mediana_s'] - 1 if previo['mediana_s'] else 0
+        marca = ''
+        if cambio > tolerancia and resultado['mediana_s'] - previo['mediana_s'] > umbral_s:
+            regresiones.append(nombre)
+            marca = '  <-- regresión'
+        print(f"{nombre:<45} {previo['mediana_s'] * 1000:>8.1f}ms {resultado['mediana_s'] * 1000:>8.1f}ms "
+              f"{cambio:>+7.0%}{marca}")
+    return regresiones
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks de rutas, PDF y funciones de datos')
+    parser.add_argument('--maquinas', type=int, default=200)
+    parser.add_argument('--informes', type=int, default=200000)
+    parser.add_argument('--imagenes', type=int, default=200)
+    parser.add_argument('--repeticiones', type=int, default=3)
+    parser.add_argument('--salida', default='resultados_benchmark.json')
+    parser.add_argument('--comparar', help='JSON de una ejecución anterior')
+    parser.add_argument('--tolerancia', type=float, default=0.2, help='Empeoramiento permitido (0.2 = 20%%)')
+    parser.add_argument('--umbral-ms', type=float, default=1.0,
+                        help='Diferencia absoluta mínima para considerar una regresión')
+    parser.add_argument('--solo', help='Medir solo los casos cuyo nombre contiene este texto')
+    args = parser.parse_args()
+    # La salida y la comparación son relativas al directorio desde el que se ejecuta
+    salida = os.path.abspath(args.salida)
+    anterior = None
+    if args.comparar:
+        with open(os.path.abspath(args.comparar), encoding='utf-8') as f:
+            anterior = json.load(f)
+
+    with copia_temporal('bench_suite_'):
+        import app as aplicacion
+        aplicacion.iniciar_aplicacion()
+        from db import conexion
+        from benchmarks.sembrar import sembrar
+
+        inicio = time.perf_counter()
+        with conexion() as conn:
+            maquinas = sembrar(conn, aplicacion.app.config['UPLOAD_FOLDER'], args.maquinas, args.informes,
+                               args.imagenes)
+        siembra = time.perf_counter() - inicio
+        print(f"Datos sembrados en {siembra:.1f} s: {args.maquinas} máquinas, {args.informes} informes, "
+              f"{args.imagenes} imágenes")
+
+        resultados = {}
+        # El arranque se mide en procesos nuevos sobre los mismos datos sembrados
+        if not args.solo or args.solo in 'arranque.':
+            arranque, cargados = medir_arranque(args.repeticiones)
+            for nombre, r in arranque.items():
+                resultados[nombre] = r
+                print(f"{nombre:<45} {r['mediana_s'] * 1000:>10.1f} ms")
+            if cargados:
+                print(f"Aviso: {', '.join(cargados)} se cargan antes del primer PDF")
+        for nombre, funcion in casos(aplicacion, maquinas):
+            if args.solo and args.solo not in nombre:
+                continue
+            resultados[nombre] = medir(funcion, args.repeticiones)
+            r = resultados[nombre]
+            print(f"{nombre:<45} {r['mediana_s'] * 1000:>10.1f} ms {r['pico_mb']:>9.1f} MB pico")
+        aplicacion.apagar()
+
+    actual = {
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'plataforma': platform.platform(),
+        'escala': {'maquinas': args.maquinas, 'informes': args.informes, 'imagenes': args.imagenes},
+        'siembra_s': siembra,
+        'resultados': resultados,
+    }
+    with open(salida, 'w', encoding='utf-8') as f:
+        json.dump(actual, f, indent=2, ensure_ascii=False)
+    print(f"\nResultados guardados en {salida}")
+
+    if anterior is not None:
+        if anterior.get('escala') != actual['escala']:
+            print(f"Aviso: la escala anterior era {anterior.get('escala')}")
+        regresiones = comparar(actual, anterior, args.tolerancia, args.umbral_ms / 1000)
+        if regresiones:
+            print(f"\n{len(regresiones)} casos empeoraron más de {args.tolerancia:.0%}")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
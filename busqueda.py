@@ -0,0 +1,62 @@
+import re
+from markupsafe import Markup, escape
+
+from modelos import COLUMNAS_INFORME, informe_desde_fila
+
+# Marcadores internos del fragmento; se reemplazan por <mark> después de escapar el texto
+_INICIO_MARCA = '\x02'
+_FIN_MARCA = '\x03'
+
+_PALABRA = re.compile(r'\w+', re.UNICODE)
+
+
+# Convertir el texto del usuario en una consulta FTS5 segura
+def construir_consulta_fts(texto):
+    """Cada palabra se busca como prefijo y todas deben aparecer.
+
+    "impre bill" -> "impre"* AND "bill"*. Los operadores y comillas del
+    usuario se ignoran para que ninguna entrada produzca un error de sintaxis.
+    """
+    palabras = _PALABRA.findall(texto or '')
+    return ' AND '.join(f'"{p}"*' for p in palabras)
+
+
+# Fragmento con las coincidencias resaltadas, listo para insertar en HTML
+def resaltar(fragmento):
+    texto = str(escape(fragmento))
+    return Markup(texto.replace(_INICIO_MARCA, '<mark>').replace(_FIN_MARCA, '</mark>'))
+
+
+def buscar_informes(conn, texto, maquina_id=None, fecha_inicio=None, fecha_fin=None,
+                    limite=20, pagina=1):
+    """Busca informes por descripción ordenados por relevancia (bm25).
+
+    Devuelve (resultados, hay_mas); cada resultado es (Informe, fragmento).
+    """
+    consulta = construir_consulta_fts(texto)
+    if not consulta:
+        return [], False
+
+    condiciones = ["informes_fts MATCH ?"]
+    parametros = [consulta]
+    if maquina_id is not None:
+        condiciones.append("i.maquina_id = ?")
+        parametros.append(maquina_id)
+    if fecha_inicio:
+        condiciones.append("i.fecha >= ?")
+        parametros.append(fecha_inicio)
+    if fecha_fin:
+        condiciones.append("i.fecha <= ?")
+        parametros.append(fecha_fin)
+    parametros += [limite + 1, (pagina - 1) * limite]
+
+    filas = conn.execute(f"""SELECT {COLUMNAS_INFORME},
+                                    snippet(informes_fts, 0, '{_INICIO_MARCA}', '{_FIN_MARCA}', '…', 16)
+                             FROM informes_fts
+                             JOIN informes i ON i.id = informes_fts.rowid
+                             JOIN maquinas m ON m.id = i.maquina_id
+                             WHERE {' AND '.join(condiciones)}
+                             ORDER BY informes_fts.rank
+                             LIMIT ? OFFSET ?""", parametros).fetchall()
+    hay_mas = len(filas) > limite
+    return [(informe_desde_fila(row), resaltar(row[7])) for row in filas[:limite]], hay_mas
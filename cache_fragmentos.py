@@ -0,0 +1,60 @@
+import threading
+from collections import OrderedDict
+
+from markupsafe import Markup
+
+
+class CacheFragmentos:
+    """Caché en memoria de fragmentos HTML ya renderizados.
+
+    Cada fragmento se guarda para la versión de los datos con la que se
+    generó; cualquier escritura incrementa la versión y la primera petición
+    que la ve descarta todos los fragmentos. Se desaloja por LRU cuando se
+    supera el número máximo de entradas o el tamaño total. Con
+    `max_entradas=0` no guarda nada.
+    """
+
+    def __init__(self, max_entradas=500, max_bytes=32 * 1024 * 1024):
+        self.max_entradas = max_entradas
+        self.max_bytes = max_bytes
+        self.aciertos = 0
+        self.fallos = 0
+        self._lock = threading.Lock()
+        self._version = None
+        self._entradas = OrderedDict()  # clave -> (html, tamaño), de menos a más reciente
+        self._total = 0
+
+    def obtener(self, version, clave, generar):
+        """HTML del fragmento `clave` para `version`; si no está lo genera con `generar()`"""
+        with self._lock:
+            if self._version is None or version > self._version:
+                self._entradas.clear()
+                self._total = 0
+                self._version = version
+            entrada = self._entradas.get(clave) if version == self._version else None
+            if entrada is not None:
+                self._entradas.move_to_end(clave)
+                self.aciertos += 1
+                return entrada[0]
+            self.fallos += 1
+
+        html = Markup(generar())
+        tamano = len(html.encode('utf-8'))
+        with self._lock:
+            # Una petición que leyó una versión anterior no guarda lo que generó
+            if self.max_entradas > 0 and version == self._version and clave not in self._entradas:
+                self._entradas[clave] = (html, tamano)
+                self._total += tamano
+                while len(self._entradas) > self.max_entradas or self._total > self.max_bytes:
+                    _, (_, liberado) = self._entradas.popitem(last=False)
+                    self._total -= liberado
+        return html
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                'aciertos': self.aciertos,
+                'fallos': self.fallos,
+                'entradas': len(self._entradas),
+                'bytes': self._total,
+            }
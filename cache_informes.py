@@ -0,0 +1,119 @@
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+PREFIJO = 'cache_'
+
+
+class CacheInformes:
+    """Caché de informes PDF ya generados, guardados en REPORT_FOLDER.
+
+    La clave incluye el tipo de informe, el título, el rango de fechas y la
+    versión de los datos, así que cualquier escritura invalida las entradas
+    anteriores sin tener que recorrerlas. Se desaloja por LRU cuando se supera
+    el número máximo de entradas o el tamaño total.
+    """
+
+    def __init__(self, carpeta, max_bytes=500 * 1024 * 1024, max_entradas=200):
+        self.carpeta = carpeta
+        self.max_bytes = max_bytes
+        self.max_entradas = max_entradas
+        self.aciertos = 0
+        self.fallos = 0
+        self._lock = threading.Lock()
+        self._entradas = OrderedDict()  # clave hash -> tamaño, de menos a más reciente
+        self._total = 0
+        os.makedirs(carpeta, exist_ok=True)
+        self._cargar()
+
+    def _cargar(self):
+        # Reconstruir el índice desde disco, ordenado por último uso
+        encontrados = []
+        with os.scandir(self.carpeta) as it:
+            for entrada in it:
+                if entrada.is_file() and entrada.name.startswith(PREFIJO) and entrada.name.endswith('.pdf'):
+                    st = entrada.stat()
+                    encontrados.append((st.st_mtime, entrada.name[len(PREFIJO):-4], st.st_size))
+        for _, clave, tamano in sorted(encontrados):
+            self._entradas[clave] = tamano
+            self._total += tamano
+
+    @staticmethod
+    def clave(tipo, titulo, fecha_inicio, fecha_fin, version, resumen=False):
+        valores = (tipo, titulo, fecha_inicio, fecha_fin, version) + (('resumen',) if resumen else ())
+        base = '\x1f'.join(str(v) for v in valores)
+        return hashlib.sha256(base.encode('utf-8')).hexdigest()[:32]
+
+    def ruta(self, clave):
+        return os.path.join(self.carpeta, f"{PREFIJO}{clave}.pdf")
+
+    def obtener(self, clave):
+        """Ruta del PDF en caché o None; actualiza los contadores"""
+        with self._lock:
+            if clave in self._entradas and os.path.exists(self.ruta(clave)):
+                self._entradas.move_to_end(clave)
+                self.aciertos += 1
+                try:
+                    os.utime(self.ruta(clave))
+                except OSError:
+                    pass
+                return self.ruta(clave)
+            if clave in self._entradas:
+                # El archivo desapareció del disco
+                self._total -= self._entradas.pop(clave)
+            self.fallos += 1
+            return None
+
+    def registrar(self, clave):
+        """Registra el PDF ya escrito en ruta(clave) y desaloja si hace falta"""
+        try:
+            tamano = os.path.getsize(self.ruta(clave))
+        except OSError:
+            return
+        with self._lock:
+            self._total += tamano - self._entradas.pop(clave, 0)
+            self._entradas[clave] = tamano
+            # Nunca se desaloja la entrada recién registrada
+            while len(self._entradas) > 1 and (len(self._entradas) > self.max_entradas or self._total > self.max_bytes):
+                antigua, tamano_antigua = self._entradas.popitem(last=False)
+                self._total -= tamano_antigua
+                try:
+                    os.remove(self.ruta(antigua))
+                except OSError:
+                    pass
+
+    def expirar(self, max_edad, simular=False):
+        """Elimina las entradas sin usar desde hace más de `max_edad` segundos; devuelve (entradas, bytes)"""
+        limite = time.time() - max_edad
+        eliminadas = liberados = 0
+        with self._lock:
+            # De menos a más reciente: obtener() renueva la fecha de cada acierto
+            for clave in list(self._entradas):
+                try:
+                    usado_en = os.path.getmtime(self.ruta(clave))
+                except OSError:
+                    usado_en = 0
+                if usado_en > limite:
+                    break
+                tamano = self._entradas[clave]
+                if not simular:
+                    del self._entradas[clave]
+                    self._total -= tamano
+                    try:
+                        os.remove(self.ruta(clave))
+                    except OSError:
+                        pass
+                eliminadas += 1
+                liberados += tamano
+        return eliminadas, liberados
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                'aciertos': self.aciertos,
+                'fallos': self.fallos,
+                'entradas': len(self._entradas),
+                'bytes': self._total,
+            }
@@ -0,0 +1,220 @@
+import sqlite3
+import threading
+import queue
+from time import perf_counter
+from contextlib import contextmanager
+from flask import g, has_app_context, current_app
+
+# Pragmas aplicados a cada conexión nueva
+PRAGMAS = {
+    'busy_timeout': 5000,       # Esperar hasta 5 s si otra conexión tiene el candado
+    'synchronous': 'NORMAL',    # Seguro en modo WAL y mucho más rápido que FULL
+    'cache_size': -16000,       # ~16 MB de caché de páginas por conexión
+    'mmap_size': 67108864,      # 64 MB de lectura mapeada en memoria
+    'temp_store': 'MEMORY',
+    'foreign_keys': 'ON',       # informes.maquina_id: borrar una máquina borra sus informes
+}
+
+# App registrada para usar el pool fuera de un contexto de aplicación (hilos, CLI)
+_app_por_defecto = None
+
+# Función que recibe (sql, segundos) tras cada consulta; None desactiva la medición
+_observador = None
+
+
+def observar_consultas(funcion):
+    """Registra la función a la que se informa la duración de cada consulta"""
+    global _observador
+    _observador = funcion
+
+
+class CursorMedido(sqlite3.Cursor):
+    """Cursor que informa al observador la duración de cada ejecución.
+
+    Se mide la ejecución (que en un SELECT incluye obtener la primera fila);
+    las filas que se leen después al recorrer el cursor no se cuentan.
+    """
+
+    def execute(self, sql, parametros=()):
+        if _observador is None:
+            return super().execute(sql, parametros)
+        inicio = perf_counter()
+        try:
+            return super().execute(sql, parametros)
+        finally:
+            _observador(sql, perf_counter() - inicio)
+
+    def executemany(self, sql, parametros):
+        if _observador is None:
+            return super().executemany(sql, parametros)
+        inicio = perf_counter()
+        try:
+            return super().executemany(sql, parametros)
+        finally:
+            _observador(sql, perf_counter() - inicio)
+
+    def executescript(self, script):
+        if _observador is None:
+            return super().executescript(script)
+        inicio = perf_counter()
+        try:
+            return super().executescript(script)
+        finally:
+            _observador(script, perf_counter() - inicio)
+
+
+class ConexionMedida(sqlite3.Connection):
+    """Conexión cuyos cursores (también los de conn.execute) son CursorMedido"""
+
+    def cursor(self, factory=CursorMedido):
+        return super().cursor(factory)
+
+    def execute(self, sql, parametros=()):
+        return self.cursor().execute(sql, parametros)
+
+    def executemany(self, sql, parametros):
+        return self.cursor().executemany(sql, parametros)
+
+    def executescript(self, script):
+        return self.cursor().executescript(script)
+
+
+def conectar(ruta, wal=False):
+    """Abre una conexión con los pragmas de la aplicación (sin pasar por el pool)"""
+    conn = sqlite3.connect(ruta, timeout=PRAGMAS['busy_timeout'] / 1000, check_same_thread=False,
+                           factory=ConexionMedida)
+    # El modo WAL es persistente en el archivo, basta con activarlo una vez
+    if wal:
+        conn.execute("PRAGMA journal_mode=WAL")
+    for nombre, valor in PRAGMAS.items():
+        conn.execute(f"PRAGMA {nombre}={valor}")
+    return conn
+
+
+class PoolAgotado(sqlite3.OperationalError):
+    """No se pudo obtener una conexión del pool a tiempo"""
+
+
+class PoolConexiones:
+    """Pool acotado de conexiones SQLite reutilizables entre peticiones"""
+
+    def __init__(self, ruta, tamano=8, timeout=10.0):
+        self.ruta = ruta
+        self.tamano = tamano
+        self.timeout = timeout
+        self._libres = queue.LifoQueue()
+        self._cupos = threading.BoundedSemaphore(tamano)
+        self._lock = threading.Lock()
+        self._todas = set()
+        self._wal_activado = False
+
+    def _crear_conexion(self):
+        conn = conectar(self.ruta, wal=not self._wal_activado)
+        self._wal_activado = True
+        return conn
+
+    def obtener(self):
+        """Toma una conexión libre o crea una nueva si hay cupo"""
+        if not self._cupos.acquire(timeout=self.timeout):
+            raise PoolAgotado(f"No hay conexiones disponibles tras {self.timeout} s")
+        try:
+            try:
+                return self._libres.get_nowait()
+            except queue.Empty:
+                conn = self._crear_conexion()
+                with self._lock:
+                    self._todas.add(conn)
+                return conn
+        except Exception:
+            self._cupos.release()
+            raise
+
+    def liberar(self, conn):
+        """Devuelve la conexión al pool descartando cualquier transacción abierta"""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            self._libres.put(conn)
+        except sqlite3.Error:
+            # Conexión dañada: cerrarla y dejar que se cree otra
+            with self._lock:
+                self._todas.discard(conn)
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+        finally:
+            self._cupos.release()
+
+    def cerrar_todo(self):
+        """Cierra todas las conexiones libres del pool"""
+        while True:
+            try:
+                conn = self._libres.get_nowait()
+            except queue.Empty:
+                break
+            with self._lock:
+                self._todas.discard(conn)
+            conn.close()
+
+
+def init_app(app):
+    """Registra el pool de conexiones en la aplicación"""
+    global _app_por_defecto
+    app.config.setdefault('DB_POOL_SIZE', 8)
+    app.config.setdefault('DB_POOL_TIMEOUT', 10.0)
+    app.extensions['db_pool'] = PoolConexiones(app.config['DATABASE'],
+                                               app.config['DB_POOL_SIZE'],
+                                               app.config['DB_POOL_TIMEOUT'])
+    app.teardown_appcontext(_liberar_conexion_peticion)
+    _app_por_defecto = app
+
+
+def get_pool(app=None):
+    """Obtiene el pool de la aplicación actual (o de la registrada por defecto)"""
+    if app is None:
+        app = current_app._get_current_object() if has_app_context() else _app_por_defecto
+    if app is None:
+        raise RuntimeError("El pool de conexiones no ha sido inicializado")
+    pool = app.extensions['db_pool']
+    # Si cambió la ruta de la base de datos (p. ej. en pruebas), rehacer el pool
+    if pool.ruta != app.config['DATABASE']:
+        pool.cerrar_todo()
+        pool = PoolConexiones(app.config['DATABASE'], app.config['DB_POOL_SIZE'],
+                              app.config['DB_POOL_TIMEOUT'])
+        app.extensions['db_pool'] = pool
+    return pool
+
+
+def get_db():
+    """Conexión asociada a la petición actual; se libera al terminar la petición"""
+    if 'db_conn' not in g:
+        pool = get_pool()
+        g.db_conn = pool.obtener()
+        g.db_pool = pool
+    return g.db_conn
+
+
+def _liberar_conexion_peticion(exc=None):
+    conn = g.pop('db_conn', None)
+    pool = g.pop('db_pool', None)
+    if conn is not None:
+        pool.liberar(conn)
+
+
+@contextmanager
+def conexion():
+    """Entrega una conexión del pool y garantiza su liberación.
+
+    Dentro de una petición reutiliza la conexión de la petición; fuera de ella
+    (hilos de fondo, comandos) toma una prestada y la devuelve al salir.
+    """
+    if has_app_context():
+        yield get_db()
+        return
+    pool = get_pool()
+    conn = pool.obtener()
+    try:
+        yield conn
+    finally:
+        pool.liberar(conn)
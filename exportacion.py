@@ -0,0 +1,140 @@
+import io
+import csv
+import json
+import zlib
+import zipfile
+
+from modelos import CAMPOS_INFORME, COLUMNAS_INFORME
+
+# Nombres de las columnas exportadas, en el orden de COLUMNAS_INFORME
+CAMPOS = CAMPOS_INFORME
+
+FORMATOS = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+}
+
+# Tamaño aproximado de cada trozo enviado al cliente
+TAMANO_TROZO = 64 * 1024
+
+
+def consultar_filas_exportacion(conn, maquina_id=None, fecha_inicio=None, fecha_fin=None):
+    """Recorre las filas crudas de los informes sin cargarlas en memoria.
+
+    Se recorre el cursor directamente (sin fetchall) y los valores se exportan
+    tal como están guardados, sin convertirlos a Informe.
+    """
+    condiciones = []
+    parametros = []
+    if maquina_id is not None:
+        condiciones.append("i.maquina_id = ?")
+        parametros.append(maquina_id)
+    if fecha_inicio:
+        condiciones.append("i.fecha >= ?")
+        parametros.append(fecha_inicio)
+    if fecha_fin:
+        condiciones.append("i.fecha <= ?")
+        parametros.append(fecha_fin)
+    where = f"WHERE {' AND '.join(condiciones)}" if condiciones else ''
+    c = conn.cursor()
+    c.arraysize = 500
+    # Máquinas por nombre y sus informes por idx_informes_maquina_fecha: sin ordenar en memoria
+    c.execute(f"""SELECT {COLUMNAS_INFORME}
+                  FROM maquinas m CROSS JOIN informes i ON i.maquina_id = m.id
+                  {where}
+                  ORDER BY m.nombre, i.fecha, i.hora, i.id""", parametros)
+    yield from c
+
+
+# Convertir las filas en trozos de CSV codificados en UTF-8
+def generar_csv(filas):
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    # BOM para que Excel abra bien las tildes; el importador lo acepta
+    buffer.write('\ufeff')
+    escritor.writerow(CAMPOS)
+    for fila in filas:
+        escritor.writerow(fila)
+        if buffer.tell() >= TAMANO_TROZO:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+# Convertir las filas en trozos de JSONL (un objeto por línea)
+def generar_jsonl(filas):
+    partes = []
+    tamano = 0
+    for fila in filas:
+        linea = json.dumps(dict(zip(CAMPOS, fila)), ensure_ascii=False)
+        partes.append(linea)
+        tamano += len(linea) + 1
+        if tamano >= TAMANO_TROZO:
+            partes.append('')
+            yield '\n'.join(partes).encode('utf-8')
+            partes = []
+            tamano = 0
+    if partes:
+        partes.append('')
+        yield '\n'.join(partes).encode('utf-8')
+
+
+GENERADORES = {
+    'csv': generar_csv,
+    'jsonl': generar_jsonl,
+}
+
+
+# Comprimir en gzip sobre la marcha, sin acumular la salida completa
+def comprimir_gzip(trozos, nivel=6):
+    compresor = zlib.compressobj(nivel, zlib.DEFLATED, 31)
+    for trozo in trozos:
+        comprimido = compresor.compress(trozo)
+        if comprimido:
+            yield comprimido
+    yield compresor.flush()
+
+
+class _SalidaTrozos:
+    """Destino no buscable para zipfile: guarda lo escrito hasta que se recoge"""
+
+    def __init__(self):
+        self._trozos = []
+
+    def write(self, datos):
+        self._trozos.append(bytes(datos))
+        return len(datos)
+
+    def flush(self):
+        pass
+
+    def recoger(self):
+        datos = b''.join(self._trozos)
+        self._trozos.clear()
+        return datos
+
+
+# Empaquetar archivos en un ZIP sobre la marcha; cada entrada es (nombre, ruta o bytes)
+def generar_zip(entradas, nivel=1):
+    # Sin seek, zipfile escribe los tamaños después de cada entrada: no hace falta
+    # tener el ZIP completo en memoria ni en disco. Los PDF ya van comprimidos,
+    # así que basta el nivel más rápido.
+    salida = _SalidaTrozos()
+    with zipfile.ZipFile(salida, 'w', zipfile.ZIP_DEFLATED, compresslevel=nivel) as zf:
+        for nombre, origen in entradas:
+            if isinstance(origen, bytes):
+                zf.writestr(nombre, origen)
+            else:
+                with open(origen, 'rb') as f, zf.open(nombre, 'w') as destino:
+                    for bloque in iter(lambda: f.read(TAMANO_TROZO), b''):
+                        destino.write(bloque)
+                        datos = salida.recoger()
+                        if datos:
+                            yield datos
+            datos = salida.recoger()
+            if datos:
+                yield datos
+    # Directorio central
+    yield salida.recoger()
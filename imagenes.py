@@ -0,0 +1,324 @@
+import os
+import hashlib
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+# PIL se importa dentro de cada función: así no retrasa el arranque de la aplicación
+
+MM_POR_PULGADA = 25.4
+
+# Formatos aceptados en las subidas (extensión -> formato de Pillow)
+EXTENSIONES_PERMITIDAS = {
+    'png': 'PNG', 'jpg': 'JPEG', 'jpeg': 'JPEG', 'gif': 'GIF', 'webp': 'WEBP', 'bmp': 'BMP',
+}
+
+# Variantes web generadas para cada subida: nombre -> lado máximo en px
+VARIANTES_WEB = {
+    'mini': 320,     # Miniatura (formulario de edición)
+    'tarjeta': 800,  # Tarjetas de maquina.html
+}
+CARPETA_VARIANTES = 'variantes'
+
+
+# Función para redimensionar imagen manteniendo proporciones
+def resize_image(image_path, max_width=150, max_height=150):
+    from PIL import Image, ImageOps
+    try:
+        with Image.open(image_path) as img:
+            img = ImageOps.exif_transpose(img)
+            # Calcular nuevas dimensiones manteniendo proporciones
+            img.thumbnail((max_width, max_height), Image.Resampling.LANCZOS)
+            img.load()
+            return img
+    except Exception:
+        return None
+
+
+# Aplanar transparencias sobre fondo blanco para poder guardar como JPEG
+def aplanar(img):
+    from PIL import Image
+    if img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info):
+        img = img.convert('RGBA')
+        fondo = Image.new('RGB', img.size, (255, 255, 255))
+        fondo.paste(img, mask=img.getchannel('A'))
+        return fondo
+    return img.convert('RGB') if img.mode != 'RGB' else img
+
+
+class CacheDerivados:
+    """Caché en disco de imágenes reducidas a resolución de impresión.
+
+    Cada derivado se identifica por la ruta de origen, su fecha de
+    modificación y el tamaño de impresión, así que editar o reemplazar una
+    imagen genera un derivado nuevo. Cuando la caché supera max_bytes se
+    eliminan los derivados usados hace más tiempo.
+    """
+
+    def __init__(self, carpeta, max_bytes=200 * 1024 * 1024, ancho_mm=45, dpi=150, calidad=85):
+        self.carpeta = carpeta
+        self.max_bytes = max_bytes
+        self.lado_px = round(ancho_mm / MM_POR_PULGADA * dpi)
+        self.calidad = calidad
+        self._lock = threading.Lock()
+        os.makedirs(carpeta, exist_ok=True)
+
+    def _clave(self, ruta, mtime_ns):
+        base = f"{os.path.abspath(ruta)}|{mtime_ns}|{self.lado_px}|{self.calidad}"
+        return hashlib.sha1(base.encode('utf-8')).hexdigest()
+
+    def obtener(self, ruta):
+        """Ruta del derivado de impresión; si no se puede generar, la original"""
+        try:
+            mtime_ns = os.stat(ruta).st_mtime_ns
+        except OSError:
+            return ruta
+        destino = os.path.join(self.carpeta, self._clave(ruta, mtime_ns) + '.jpg')
+
+        if os.path.exists(destino):
+            # Marcar como usado recientemente para el desalojo LRU
+            try:
+                os.utime(destino)
+            except OSError:
+                pass
+            return destino
+
+        img = resize_image(ruta, self.lado_px, self.lado_px)
+        if img is None:
+            return ruta
+        temporal = f"{destino}.{threading.get_ident()}.tmp"
+        try:
+            aplanar(img).save(temporal, 'JPEG', quality=self.calidad, optimize=True)
+            os.replace(temporal, destino)
+        except OSError:
+            if os.path.exists(temporal):
+                os.remove(temporal)
+            return ruta
+        self.desalojar()
+        return destino
+
+    def desalojar(self):
+        """Elimina los derivados menos usados hasta quedar bajo max_bytes"""
+        with self._lock:
+            entradas = []
+            total = 0
+            with os.scandir(self.carpeta) as it:
+                for entrada in it:
+                    if entrada.is_file() and entrada.name.endswith('.jpg'):
+                        st = entrada.stat()
+                        entradas.append((st.st_mtime, st.st_size, entrada.path))
+                        total += st.st_size
+            if total <= self.max_bytes:
+                return 0
+            liberado = 0
+            for _, tamano, ruta in sorted(entradas):
+                if total - liberado <= self.max_bytes:
+                    break
+                try:
+                    os.remove(ruta)
+                    liberado += tamano
+                except OSError:
+                    pass
+            return liberado
+
+
+class ImagenInvalida(ValueError):
+    """La imagen subida no se puede aceptar"""
+
+
+# Validar una imagen subida; devuelve la extensión normalizada
+def validar_imagen(stream, filename, max_bytes):
+    extension = filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
+    if extension not in EXTENSIONES_PERMITIDAS:
+        raise ImagenInvalida('Formato de imagen no permitido. Use JPG, PNG, GIF, WEBP o BMP')
+
+    # Tamaño del archivo sin leerlo completo en memoria
+    stream.seek(0, os.SEEK_END)
+    tamano = stream.tell()
+    stream.seek(0)
+    if tamano > max_bytes:
+        raise ImagenInvalida(f'La imagen supera el tamaño máximo de {max_bytes // (1024 * 1024)} MB')
+
+    from PIL import Image, UnidentifiedImageError
+    try:
+        with Image.open(stream) as img:
+            img.verify()
+    except (UnidentifiedImageError, OSError, SyntaxError):
+        raise ImagenInvalida('El archivo subido no es una imagen válida') from None
+    finally:
+        stream.seek(0)
+    return extension
+
+
+# Nombre de una imagen por su contenido, repartido en dos niveles: ab/cd/abcd….ext
+def nombre_por_contenido(digest, extension):
+    return f"{digest[:2]}/{digest[2:4]}/{digest}.{extension}"
+
+
+class ImagenPreparada:
+    """Imagen escrita en un temporal y nombrada por el hash de su contenido.
+
+    colocar() la mueve a su ruta definitiva; debe llamarse dentro de la
+    transacción que guarda la referencia para no competir con la purga de
+    imágenes sin referencias. Si la misma imagen ya existe no se duplica.
+    """
+
+    def __init__(self, carpeta_uploads, temporal, nombre):
+        self.carpeta_uploads = carpeta_uploads
+        self.temporal = temporal
+        self.nombre = nombre
+
+    @property
+    def ruta(self):
+        return os.path.join(self.carpeta_uploads, self.nombre)
+
+    def colocar(self):
+        if self.temporal is None:
+            return
+        if os.path.exists(self.ruta):
+            os.remove(self.temporal)
+        else:
+            os.makedirs(os.path.dirname(self.ruta), exist_ok=True)
+            os.replace(self.temporal, self.ruta)
+        self.temporal = None
+
+    def descartar(self):
+        if self.temporal is not None and os.path.exists(self.temporal):
+            os.remove(self.temporal)
+        self.temporal = None
+
+
+# Copiar una imagen ya validada a un temporal calculando su hash
+def preparar_imagen(carpeta_uploads, stream, extension, tamano_bloque=64 * 1024):
+    os.makedirs(carpeta_uploads, exist_ok=True)
+    digest = hashlib.sha256()
+    temporal = os.path.join(carpeta_uploads, f".subida.{uuid.uuid4().hex}.tmp")
+    stream.seek(0)
+    try:
+        with open(temporal, 'wb') as destino:
+            for bloque in iter(lambda: stream.read(tamano_bloque), b''):
+                digest.update(bloque)
+                destino.write(bloque)
+    except BaseException:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        raise
+    return ImagenPreparada(carpeta_uploads, temporal, nombre_por_contenido(digest.hexdigest(), extension))
+
+
+# Borrar del disco las imágenes que ya no referencia ningún informe
+def purgar_imagenes(conn, carpeta_uploads):
+    """Se hace con el candado de escritura tomado (la primera sentencia es un
+    DELETE), así una subida simultánea del mismo contenido no puede colocar el
+    archivo entre la consulta y el borrado. Devuelve las imágenes eliminadas.
+    """
+    with conn:
+        rutas = [row[0] for row in conn.execute("DELETE FROM imagenes WHERE referencias <= 0 RETURNING ruta")]
+        for ruta in rutas:
+            eliminar_imagen(carpeta_uploads, ruta)
+    return rutas
+
+
+# Pasar las imágenes con nombre antiguo (fecha_máquina.ext) al almacenamiento por contenido
+def migrar_imagenes_antiguas(conn, carpeta_uploads):
+    """Devuelve los nombres nuevos de las imágenes migradas"""
+    migradas = []
+    antiguas = [row[0] for row in conn.execute("SELECT ruta FROM imagenes WHERE ruta NOT LIKE '%/%'")]
+    for antigua in antiguas:
+        ruta = os.path.join(carpeta_uploads, antigua)
+        if not os.path.exists(ruta):
+            print(f"Imagen no encontrada, se mantiene el nombre antiguo: {antigua}")
+            continue
+        extension = antigua.rsplit('.', 1)[1].lower() if '.' in antigua else 'bin'
+        with open(ruta, 'rb') as f:
+            preparada = preparar_imagen(carpeta_uploads, f, extension)
+        try:
+            with conn:
+                # Los triggers trasladan las referencias al nombre nuevo
+                conn.execute("UPDATE informes SET imagen = ? WHERE imagen = ?", (preparada.nombre, antigua))
+                preparada.colocar()
+        finally:
+            preparada.descartar()
+        migradas.append(preparada.nombre)
+    if migradas:
+        purgar_imagenes(conn, carpeta_uploads)
+    return migradas
+
+
+# Ruta de una variante web de una imagen subida
+def ruta_variante(carpeta_uploads, nombre, variante):
+    base = nombre.rsplit('.', 1)[0]
+    return os.path.join(carpeta_uploads, CARPETA_VARIANTES, f"{base}.{variante}.webp")
+
+
+# Generar las variantes web (WebP) de una imagen ya guardada
+def generar_variantes(carpeta_uploads, nombre, calidad=80):
+    from PIL import Image, ImageOps
+    origen = os.path.join(carpeta_uploads, nombre)
+    os.makedirs(os.path.dirname(ruta_variante(carpeta_uploads, nombre, 'mini')), exist_ok=True)
+    with Image.open(origen) as img:
+        # Respetar la orientación de la cámara antes de reducir
+        img = ImageOps.exif_transpose(img)
+        if img.mode not in ('RGB', 'RGBA'):
+            img = img.convert('RGBA' if 'A' in img.mode or 'transparency' in img.info else 'RGB')
+        # De la más grande a la más pequeña, reutilizando la anterior
+        for variante, lado in sorted(VARIANTES_WEB.items(), key=lambda v: -v[1]):
+            img.thumbnail((lado, lado), Image.Resampling.LANCZOS)
+            destino = ruta_variante(carpeta_uploads, nombre, variante)
+            temporal = f"{destino}.{threading.get_ident()}.tmp"
+            img.save(temporal, 'WEBP', quality=calidad, method=4)
+            os.replace(temporal, destino)
+
+
+# Eliminar una imagen subida junto con sus variantes
+def eliminar_imagen(carpeta_uploads, nombre):
+    rutas = [os.path.join(carpeta_uploads, nombre)]
+    rutas += [ruta_variante(carpeta_uploads, nombre, v) for v in VARIANTES_WEB]
+    for ruta in rutas:
+        try:
+            os.remove(ruta)
+        except FileNotFoundError:
+            pass
+
+
+class ProcesadorImagenes:
+    """Procesa las imágenes subidas en segundo plano con un pool de hilos acotado.
+
+    Mientras las variantes no existen, las plantillas muestran la original.
+    `prefijo_url` es la carpeta de las subidas relativa a static/ (con la barra final).
+    """
+
+    def __init__(self, carpeta_uploads, cache_derivados=None, max_hilos=2, prefijo_url='uploads/'):
+        self.carpeta_uploads = carpeta_uploads
+        self.prefijo_url = prefijo_url
+        self.cache_derivados = cache_derivados
+        self._executor = ThreadPoolExecutor(max_workers=max_hilos, thread_name_prefix='imagenes')
+        # Imágenes procesadas desde el arranque; cambia cuando aparecen variantes nuevas
+        self.procesadas = 0
+        self._lock = threading.Lock()
+
+    def encolar(self, nombre):
+        return self._executor.submit(self._procesar, nombre)
+
+    def _procesar(self, nombre):
+        try:
+            # Una imagen repetida ya tiene sus variantes
+            if not all(os.path.exists(ruta_variante(self.carpeta_uploads, nombre, v)) for v in VARIANTES_WEB):
+                generar_variantes(self.carpeta_uploads, nombre)
+            # Variante de impresión: precalentar la caché de derivados del PDF
+            if self.cache_derivados is not None:
+                self.cache_derivados.obtener(os.path.join(self.carpeta_uploads, nombre))
+        except Exception as e:
+            print(f"Error procesando imagen {nombre}: {e}")
+        finally:
+            with self._lock:
+                self.procesadas += 1
+
+    def url_variante(self, nombre, variante):
+        """Nombre relativo a static/ de la variante, o de la original si aún no existe"""
+        if os.path.exists(ruta_variante(self.carpeta_uploads, nombre, variante)):
+            return f"{self.prefijo_url}{CARPETA_VARIANTES}/{nombre.rsplit('.', 1)[0]}.{variante}.webp"
+        return f"{self.prefijo_url}{nombre}"
+
+    def cerrar(self, esperar=True):
+        self._executor.shutdown(wait=esperar)
@@ -0,0 +1,279 @@
+import io
+import os
+import csv
+import codecs
+import shutil
+import tempfile
+import json
+import zipfile
+from datetime import datetime
+
+from modelos import incrementar_version_datos, parse_hora_estricta
+from imagenes import ImagenInvalida, preparar_imagen, validar_imagen
+
+# Columnas esperadas en el archivo de importación
+COLUMNAS = ('nombre_maquina', 'fecha', 'hora', 'descripcion', 'imagen')
+OBLIGATORIAS = ('nombre_maquina', 'fecha', 'descripcion')
+
+# Formatos de fecha aceptados (ISO y el habitual de las hojas de cálculo)
+FORMATOS_FECHA = ('%Y-%m-%d', '%d/%m/%Y')
+
+# Codificaciones aceptadas, en orden: UTF-8 (con o sin BOM) y la "ANSI" con la que
+# Excel en Windows guarda los CSV en español
+CODIFICACIONES = ('utf-8-sig', 'cp1252')
+TAMANO_BLOQUE = 64 * 1024
+
+
+class ResultadoImportacion:
+    """Resumen de una importación con los errores por fila"""
+
+    def __init__(self):
+        self.insertados = 0
+        self.maquinas_creadas = 0
+        self.imagenes = 0
+        self.errores = []  # (número de fila, mensaje)
+
+    def error(self, fila, mensaje):
+        self.errores.append((fila, mensaje))
+
+    def como_dict(self):
+        return {
+            'insertados': self.insertados,
+            'maquinas_creadas': self.maquinas_creadas,
+            'imagenes': self.imagenes,
+            'errores': [{'fila': fila, 'error': mensaje} for fila, mensaje in self.errores],
+        }
+
+
+# Detectar el formato por la extensión del archivo
+def detectar_formato(nombre_archivo):
+    extension = nombre_archivo.rsplit('.', 1)[-1].lower() if '.' in nombre_archivo else ''
+    if extension in ('jsonl', 'ndjson', 'json'):
+        return 'jsonl'
+    if extension in ('csv', 'txt'):
+        return 'csv'
+    raise ValueError('Formato de archivo no soportado. Use CSV o JSONL')
+
+
+def detectar_codificacion(archivo_binario):
+    """Codificación de CODIFICACIONES con la que se decodifica el archivo entero.
+
+    Se recorre el archivo por bloques (sin cargarlo) y se vuelve al inicio, así
+    un error de codificación se detecta antes de importar ninguna fila. Un
+    archivo que mezcla UTF-8 con otra codificación se rechaza en lugar de
+    leerlo como cp1252 con los acentos en UTF-8 dañados.
+    """
+    inicio = archivo_binario.tell()
+    try:
+        for codificacion in CODIFICACIONES:
+            archivo_binario.seek(inicio)
+            decodificador = codecs.getincrementaldecoder(codificacion)()
+            hay_no_ascii = False
+            try:
+                while True:
+                    bloque = archivo_binario.read(TAMANO_BLOQUE)
+                    texto = decodificador.decode(bloque, final=not bloque)
+                    hay_no_ascii = hay_no_ascii or not texto.isascii()
+                    if not bloque:
+                        return codificacion
+            except UnicodeDecodeError as e:
+                # Acentos en UTF-8 válido antes del primer byte inválido
+                hay_no_ascii = hay_no_ascii or not e.object[:e.start].isascii()
+                if hay_no_ascii and codificacion == CODIFICACIONES[0]:
+                    raise ValueError('El archivo mezcla texto en UTF-8 con otra codificación. '
+                                     'Guárdelo de nuevo como CSV UTF-8') from None
+        raise ValueError('No se reconoce la codificación del archivo. Guárdelo como CSV UTF-8')
+    finally:
+        archivo_binario.seek(inicio)
+
+
+# Leer las filas del archivo como (número de fila, dict) sin cargarlo entero
+def leer_filas(archivo_binario, formato):
+    if not archivo_binario.seekable():
+        # La codificación se comprueba antes de leer las filas: hace falta volver al inicio
+        copia = tempfile.SpooledTemporaryFile(max_size=TAMANO_BLOQUE * 16)
+        shutil.copyfileobj(archivo_binario, copia, TAMANO_BLOQUE)
+        copia.seek(0)
+        archivo_binario = copia
+    texto = io.TextIOWrapper(archivo_binario, encoding=detectar_codificacion(archivo_binario), newline='')
+    if formato == 'jsonl':
+        for numero, linea in enumerate(texto, start=1):
+            if not linea.strip():
+                continue
+            try:
+                datos = json.loads(linea)
+            except ValueError as e:
+                yield numero, ValueError(f'JSON inválido: {e}')
+                continue
+            if not isinstance(datos, dict):
+                yield numero, ValueError('Cada línea debe ser un objeto JSON')
+                continue
+            yield numero, datos
+    else:
+        # Las hojas de cálculo en español suelen exportar con punto y coma
+        muestra = texto.read(8192)
+        texto.seek(0)
+        try:
+            dialecto = csv.Sniffer().sniff(muestra, delimiters=',;\t')
+        except csv.Error:
+            dialecto = csv.excel
+        lector = csv.DictReader(texto, dialect=dialecto)
+        # La fila 1 es la cabecera
+        for numero, datos in enumerate(lector, start=2):
+            yield numero, datos
+
+
+def _parsear_fecha(valor):
+    for formato in FORMATOS_FECHA:
+        try:
+            return datetime.strptime(valor, formato).date().isoformat()
+        except ValueError:
+            pass
+    raise ValueError(f'Fecha inválida: {valor!r} (use AAAA-MM-DD o DD/MM/AAAA)')
+
+
+# Validar y normalizar una fila; lanza ValueError con el motivo
+def validar_fila(datos):
+    valores = {c: str(datos.get(c) or '').strip() for c in COLUMNAS}
+    faltantes = [c for c in OBLIGATORIAS if not valores[c]]
+    if faltantes:
+        raise ValueError(f"Faltan campos obligatorios: {', '.join(faltantes)}")
+    valores['fecha'] = _parsear_fecha(valores['fecha'])
+    # Misma interpretación que parse_hora: vacía equivale a medianoche, pero
+    # una hora escrita y no reconocida es un error en lugar de medianoche
+    if valores['hora']:
+        try:
+            valores['hora'] = parse_hora_estricta(valores['hora']).strftime('%H:%M')
+        except ValueError:
+            raise ValueError(f"Hora inválida: {valores['hora']!r} (use HH:MM)") from None
+    return valores
+
+
+class Importador:
+    """Importa informes en lotes, cada lote en una sola transacción.
+
+    Si un lote falla en la base de datos (p. ej. una restricción que viola
+    una fila) se vuelve a guardar fila por fila, así el error queda solo en
+    esa fila y el resto del lote se importa.
+
+    Las máquinas que no existen se crean. Las imágenes se toman del ZIP por
+    nombre y se guardan por contenido como las subidas, así que una foto que
+    aparece en varias filas se almacena una sola vez.
+    """
+
+    def __init__(self, conn, carpeta_uploads, zip_imagenes=None, tamano_lote=1000,
+                 max_bytes_imagen=5 * 1024 * 1024, al_guardar_imagen=None):
+        self.conn = conn
+        self.carpeta_uploads = carpeta_uploads
+        self.zip = zipfile.ZipFile(zip_imagenes) if zip_imagenes is not None else None
+        self.tamano_lote = tamano_lote
+        self.max_bytes_imagen = max_bytes_imagen
+        self.al_guardar_imagen = al_guardar_imagen
+        self.resultado = ResultadoImportacion()
+        # Imágenes del lote en curso ya preparadas, por miembro del ZIP
+        self._preparadas = {}
+        # Los nombres dentro del ZIP se buscan sin carpetas ni mayúsculas
+        self._miembros = {}
+        if self.zip is not None:
+            for info in self.zip.infolist():
+                if not info.is_dir():
+                    self._miembros[os.path.basename(info.filename).lower()] = info
+
+    def _preparar_imagen(self, nombre):
+        if self.zip is None:
+            raise ValueError(f'La fila indica la imagen {nombre!r} pero no se adjuntó un ZIP')
+        info = self._miembros.get(os.path.basename(nombre).lower())
+        if info is None:
+            raise ValueError(f'La imagen {nombre!r} no está en el ZIP')
+        if info.filename in self._preparadas:
+            return self._preparadas[info.filename]
+        if info.file_size > self.max_bytes_imagen:
+            raise ValueError(f'La imagen {nombre!r} supera el tamaño máximo')
+        contenido = io.BytesIO(self.zip.read(info))
+        try:
+            extension = validar_imagen(contenido, nombre, self.max_bytes_imagen)
+        except ImagenInvalida as e:
+            raise ValueError(f'{nombre}: {e}') from None
+        preparada = preparar_imagen(self.carpeta_uploads, contenido, extension)
+        self._preparadas[info.filename] = preparada
+        return preparada
+
+    def _guardar(self, lote):
+        """Guarda las filas en una sola transacción; devuelve las imágenes colocadas"""
+        # Varias filas pueden compartir la misma imagen preparada
+        imagenes = list({id(imagen): imagen for _, _, imagen in lote if imagen}.values())
+        with self.conn:
+            # rowcount no incluye las filas que escriben los triggers (p. ej. en cambios)
+            creadas = self.conn.executemany("INSERT OR IGNORE INTO maquinas (nombre) VALUES (?)",
+                                            {(valores['nombre_maquina'],) for _, valores, _ in lote}).rowcount
+            self.conn.executemany("""INSERT INTO informes (maquina_id, fecha, hora, descripcion, imagen)
+                                     VALUES ((SELECT id FROM maquinas WHERE nombre = ?), ?, ?, ?, ?)""",
+                                  [(v['nombre_maquina'], v['fecha'], v['hora'], v['descripcion'],
+                                    imagen.nombre if imagen else None)
+                                   for _, v, imagen in lote])
+            # Los archivos se colocan con las referencias ya registradas
+            for imagen in imagenes:
+                imagen.colocar()
+            incrementar_version_datos(self.conn)
+        self.resultado.insertados += len(lote)
+        self.resultado.maquinas_creadas += creadas
+        return imagenes
+
+    def _insertar_lote(self, lote):
+        preparadas = list(self._preparadas.values())
+        self._preparadas = {}
+        colocadas = []
+        try:
+            colocadas = self._guardar(lote)
+        except Exception:
+            # El lote se revirtió entero: se reintenta fila por fila para que
+            # solo fallen (y se informen) las filas con el problema
+            for numero, valores, imagen in lote:
+                try:
+                    colocadas += self._guardar([(numero, valores, imagen)])
+                except Exception as e:
+                    self.resultado.error(numero, f'Error guardando la fila: {e}')
+                    if imagen:
+                        self.resultado.imagenes -= 1
+        finally:
+            for preparada in preparadas:
+                preparada.descartar()
+        if self.al_guardar_imagen is not None:
+            for nombre in {imagen.nombre for imagen in colocadas}:
+                self.al_guardar_imagen(nombre)
+
+    def importar(self, filas):
+        """Procesa las filas (número, dict o excepción) y devuelve el resultado"""
+        lote = []
+        for numero, datos in filas:
+            if isinstance(datos, Exception):
+                self.resultado.error(numero, str(datos))
+                continue
+            try:
+                valores = validar_fila(datos)
+                imagen = None
+                if valores['imagen']:
+                    imagen = self._preparar_imagen(valores['imagen'])
+                    self.resultado.imagenes += 1
+            except ValueError as e:
+                self.resultado.error(numero, str(e))
+                continue
+            lote.append((numero, valores, imagen))
+            if len(lote) >= self.tamano_lote:
+                self._insertar_lote(lote)
+                lote = []
+        if lote:
+            self._insertar_lote(lote)
+        for preparada in self._preparadas.values():
+            preparada.descartar()
+        if self.zip is not None:
+            self.zip.close()
+        return self.resultado
+
+
+def escribir_reporte_errores(resultado, destino):
+    """Escribe los errores por fila en CSV (fila, error)"""
+    escritor = csv.writer(destino)
+    escritor.writerow(['fila', 'error'])
+    for fila, mensaje in resultado.errores:
+        escritor.writerow([fila, mensaje])
@@ -0,0 +1,283 @@
+import os
+import tempfile
+from datetime import datetime
+from itertools import groupby
+from operator import attrgetter
+
+from metricas import Fases
+
+TECNICO_RESPONSABLE = 'Willian Ruiz Z'
+FUENTE = 'helvetica'  # Equivalente a Arial entre las fuentes base del PDF
+
+# Colores corporativos
+AZUL_CORPORATIVO = (25, 118, 210)
+AZUL_CLARO = (33, 150, 243)
+BLANCO = (255, 255, 255)
+NEGRO = (0, 0, 0)
+GRIS_DIVISOR = (200, 200, 200)
+GRIS_PIE = (128, 128, 128)
+
+# Tamaño de las imágenes de evidencia en mm
+TAMANO_IMAGEN = 45
+
+# Cada cuántas filas se notifica el progreso del renderizado
+FILAS_POR_AVISO = 50
+
+# Máquinas que se listan en la página de resumen
+MAQUINAS_RESUMEN = 15
+
+# Cabecera de la tabla de periodos del resumen, por agrupación
+TITULOS_PERIODO = {'dia': 'Día', 'semana': 'Semana del', 'mes': 'Mes'}
+
+
+# Texto del periodo del informe a partir de las fechas extremas
+def formatear_periodo(fecha_inicio, fecha_fin):
+    if fecha_inicio is None or fecha_fin is None:
+        return 'PERIODO: [Sin informes registrados]'
+    return f"PERIODO: {fecha_inicio.strftime('%d/%m/%Y')} AL {fecha_fin.strftime('%d/%m/%Y')}"
+
+
+# Texto de un periodo del resumen a partir de su primer día (AAAA-MM-DD)
+def formatear_inicio_periodo(agrupacion, inicio):
+    dia = datetime.strptime(inicio, '%Y-%m-%d')
+    return dia.strftime('%m/%Y') if agrupacion == 'mes' else dia.strftime('%d/%m/%Y')
+
+
+class RenderizadorInforme:
+    """Motor de renderizado compartido por los informes PDF.
+
+    Recibe los informes ya ordenados por máquina, fecha y hora (como los
+    devuelve SQL) y los agrupa al vuelo, sin volver a ordenarlos. El tiempo
+    se reparte en las fases consulta, agrupacion, maquetacion, imagenes y
+    serializacion (ver `fases`).
+
+    Con `resumen` (el resultado de analitica.actividad_maquinas) se añade
+    tras el encabezado una página con las máquinas con más informes y los
+    informes por periodo.
+
+    Con `datos_al` (la fecha UTC de la última modificación de los datos) el
+    pie muestra esa fecha en lugar de la hora de generación: un PDF de la
+    caché se sirve sin cambios mientras los datos no cambien.
+    """
+
+    def __init__(self, titulo, periodo_text, carpeta_imagenes, preparar_imagen=None, al_progresar=None,
+                 fases=None, resumen=None, datos_al=None):
+        self.titulo = titulo
+        self.periodo_text = periodo_text
+        self.carpeta_imagenes = carpeta_imagenes
+        # Función opcional que devuelve la ruta a incrustar (p. ej. un derivado reducido)
+        self.preparar_imagen = preparar_imagen
+        # Función opcional que recibe (maquinas, filas) renderizadas hasta el momento
+        self.al_progresar = al_progresar
+        self.resumen = resumen
+        self.datos_al = datos_al
+        self.maquinas_renderizadas = 0
+        self.filas_renderizadas = 0
+        self.fases = fases if fases is not None else Fases()
+        # fpdf (con fontTools) es lo más lento de importar: se carga con el primer informe
+        from fpdf import FPDF
+        self.pdf = FPDF()
+        self.pdf.set_auto_page_break(auto=True, margin=15)
+
+    def renderizar(self, informes):
+        """Dibuja el documento completo y devuelve el objeto FPDF"""
+        fases = self.fases
+        # Las filas llegan de un cursor: obtener cada una es tiempo de consulta (SQL y conversión)
+        informes = fases.iterar(informes, 'consulta')
+        grupos = fases.iterar(groupby(informes, key=attrgetter('nombre_maquina')), 'agrupacion')
+        with fases.medir('maquetacion'):
+            self.pdf.add_page()
+            self._encabezado()
+            if self.resumen is not None:
+                self._resumen()
+                self.pdf.add_page()
+            for nombre_maquina, informes_maquina in grupos:
+                self._seccion_maquina(nombre_maquina, fases.iterar(informes_maquina, 'agrupacion'))
+                self.maquinas_renderizadas += 1
+                self._notificar()
+            self._pie()
+        return self.pdf
+
+    def _notificar(self):
+        if self.al_progresar is not None:
+            self.al_progresar(self.maquinas_renderizadas, self.filas_renderizadas)
+
+    def guardar(self, ruta):
+        # Escribir en un temporal para que nadie lea un PDF a medio escribir. El nombre es
+        # único: dos hilos pueden guardar a la vez el mismo informe (misma ruta de caché)
+        descriptor, temporal = tempfile.mkstemp(prefix=f"{os.path.basename(ruta)}.", suffix='.tmp',
+                                                dir=os.path.dirname(ruta) or '.')
+        os.close(descriptor)
+        try:
+            with self.fases.medir('serializacion'):
+                self.pdf.output(temporal)
+            os.replace(temporal, ruta)
+        except BaseException:
+            if os.path.exists(temporal):
+                os.remove(temporal)
+            raise
+        return ruta
+
+    def _encabezado(self):
+        pdf = self.pdf
+
+        # Configurar fuentes y colores profesionales
+        pdf.set_fill_color(*AZUL_CORPORATIVO)
+        pdf.set_text_color(*BLANCO)
+        pdf.set_draw_color(*AZUL_CORPORATIVO)
+
+        # Encabezado profesional
+        pdf.set_font(FUENTE, 'B', 24)
+        pdf.cell(0, 20, self.titulo, 0, 1, 'C', True)
+        pdf.ln(2)
+
+        # Línea divisoria
+        pdf.set_draw_color(*BLANCO)
+        pdf.line(10, pdf.get_y(), 200, pdf.get_y())
+        pdf.ln(3)
+
+        # Subtítulo con fechas en caja destacada
+        pdf.set_font(FUENTE, '', 14)
+        pdf.cell(0, 12, self.periodo_text, 1, 1, 'C', True)
+        pdf.ln(8)
+
+        # Información del técnico con diseño de tabla
+        pdf.set_text_color(*NEGRO)
+        pdf.set_font(FUENTE, 'B', 12)
+        pdf.cell(45, 10, 'Técnico Responsable:', 1, 0, 'L')
+        pdf.set_font(FUENTE, '', 12)
+        pdf.cell(0, 10, TECNICO_RESPONSABLE, 1, 1, 'L')
+        pdf.ln(5)
+
+    def _resumen(self):
+        pdf = self.pdf
+        resumen = self.resumen
+        total = resumen['total']
+
+        pdf.set_fill_color(*AZUL_CLARO)
+        pdf.set_text_color(*BLANCO)
+        pdf.set_font(FUENTE, 'B', 16)
+        pdf.cell(0, 12, 'Resumen de actividad', 1, 1, 'L', True)
+        pdf.ln(4)
+
+        pdf.set_text_color(*NEGRO)
+        pdf.set_draw_color(*GRIS_DIVISOR)
+        pdf.set_font(FUENTE, '', 11)
+        pdf.cell(0, 8, f"Informes en el periodo: {total}", 0, 1, 'L')
+        pdf.ln(2)
+
+        # Máquinas con más informes
+        pdf.set_font(FUENTE, 'B', 11)
+        pdf.cell(130, 8, 'Máquina', 1, 0, 'L')
+        pdf.cell(30, 8, 'Informes', 1, 0, 'R')
+        pdf.cell(30, 8, '%', 1, 1, 'R')
+        pdf.set_font(FUENTE, '', 11)
+        for maquina in resumen['maquinas'][:MAQUINAS_RESUMEN]:
+            pdf.cell(130, 7, maquina['nombre'], 1, 0, 'L')
+            pdf.cell(30, 7, str(maquina['total']), 1, 0, 'R')
+            pdf.cell(30, 7, f"{maquina['total'] * 100 / total:.1f}", 1, 1, 'R')
+        pdf.ln(6)
+
+        # Informes de todas las máquinas por periodo
+        agrupacion = resumen['agrupacion']
+        pdf.set_font(FUENTE, 'B', 11)
+        pdf.cell(60, 8, TITULOS_PERIODO[agrupacion], 1, 0, 'L')
+        pdf.cell(30, 8, 'Informes', 1, 1, 'R')
+        pdf.set_font(FUENTE, '', 11)
+        for inicio, cantidad in zip(resumen['periodos'], resumen['por_periodo']):
+            pdf.cell(60, 7, formatear_inicio_periodo(agrupacion, inicio), 1, 0, 'L')
+            pdf.cell(30, 7, str(cantidad), 1, 1, 'R')
+
+    def _seccion_maquina(self, nombre_maquina, informes_maquina):
+        pdf = self.pdf
+
+        # Verificar si hay espacio suficiente para la sección
+        if pdf.get_y() > 240:
+            pdf.add_page()
+
+        # Título de la máquina con estilo profesional
+        pdf.set_fill_color(*AZUL_CLARO)
+        pdf.set_text_color(*BLANCO)
+        pdf.set_font(FUENTE, 'B', 16)
+        pdf.cell(0, 12, nombre_maquina, 1, 1, 'L', True)
+        pdf.ln(5)
+
+        # Colores del contenido: se fijan una vez por sección
+        pdf.set_fill_color(*BLANCO)
+        pdf.set_text_color(*NEGRO)
+        pdf.set_draw_color(*GRIS_DIVISOR)
+
+        for informe in informes_maquina:
+            self._entrada(informe)
+            self.filas_renderizadas += 1
+            if self.filas_renderizadas % FILAS_POR_AVISO == 0:
+                self._notificar()
+
+        pdf.ln(3)
+
+    def _entrada(self, informe):
+        pdf = self.pdf
+
+        # Línea de fecha y hora (la medianoche indica que no hay hora)
+        linea_fecha = f"Fecha: {informe.fecha.strftime('%d/%m/%Y')}"
+        if informe.hora.hour or informe.hora.minute:
+            linea_fecha += f" | Hora: {informe.hora.strftime('%H:%M')}"
+
+        pdf.set_font(FUENTE, 'B', 11)
+        pdf.write(6, linea_fecha)
+        pdf.ln(6)
+
+        # Descripción
+        pdf.set_font(FUENTE, '', 11)
+        pdf.write(6, informe.descripcion.encode('latin-1', 'replace').decode('latin-1'))
+        pdf.ln(8)
+
+        # Agregar imagen si existe (centrada y con espacio)
+        if informe.imagen:
+            with self.fases.medir('imagenes'):
+                self._imagen(os.path.join(self.carpeta_imagenes, informe.imagen))
+
+        # Línea divisoria sutil entre informes
+        pdf.line(15, pdf.get_y(), 195, pdf.get_y())
+        pdf.ln(5)
+
+    def _imagen(self, image_path):
+        pdf = self.pdf
+        if not os.path.exists(image_path):
+            return
+        if self.preparar_imagen is not None:
+            image_path = self.preparar_imagen(image_path)
+        try:
+            # Verificar espacio suficiente
+            if pdf.get_y() + 50 > pdf.h - pdf.b_margin:
+                pdf.add_page()
+                pdf.ln(5)
+
+            # Centrar la imagen
+            pdf.cell(0, 10, '', 0, 1, 'C')
+            pdf.image(image_path, w=TAMANO_IMAGEN, h=TAMANO_IMAGEN)
+            pdf.ln(5)
+        except Exception:
+            pass  # Si hay error con la imagen, continuar sin mostrarla
+
+    def _pie(self):
+        pdf = self.pdf
+
+        # Pie de página profesional
+        pdf.set_y(-20)
+        pdf.set_font(FUENTE, 'I', 8)
+        pdf.set_text_color(*GRIS_PIE)
+        if self.datos_al is not None:
+            texto = f'Datos actualizados al {self.datos_al.astimezone().strftime("%d/%m/%Y a las %H:%M")}'
+        else:
+            texto = f'Informe generado el {datetime.now().strftime("%d/%m/%Y a las %H:%M")}'
+        pdf.cell(0, 10, texto, 0, 0, 'C')
+
+
+def generar_informe(informes, titulo, periodo_text, carpeta_imagenes, ruta_salida,
+                    preparar_imagen=None, al_progresar=None, fases=None, resumen=None, datos_al=None):
+    """Renderiza los informes y guarda el PDF en ruta_salida"""
+    renderizador = RenderizadorInforme(titulo, periodo_text, carpeta_imagenes, preparar_imagen, al_progresar,
+                                       fases, resumen, datos_al)
+    renderizador.renderizar(informes)
+    return renderizador.guardar(ruta_salida)
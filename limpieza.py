@@ -0,0 +1,263 @@
+"""Limpieza en segundo plano de subidas huérfanas e informes generados antiguos.
+
+Las subidas se comparan con la tabla `imagenes`, que los triggers mantienen a
+partir de `informes.imagen`. Todo se recorre por lotes con pausas entre ellos
+para no competir con las peticiones, y los archivos más recientes que el
+periodo de gracia nunca se tocan (pueden pertenecer a una operación en curso).
+"""
+import os
+import time
+import threading
+
+from db import conexion
+from imagenes import CARPETA_VARIANTES, purgar_imagenes
+from cache_informes import PREFIJO as PREFIJO_CACHE
+from sincronizacion import purgar_bajas
+
+# Prefijo de las carpetas temporales de los paquetes por máquina
+PREFIJO_PAQUETES = 'paquete_'
+
+
+class _Detenido(Exception):
+    """Se pidió detener la limpieza a mitad de una pasada"""
+
+
+def _archivos(carpeta):
+    """Recorre los archivos bajo `carpeta` sin construir la lista completa"""
+    pendientes = [carpeta]
+    while pendientes:
+        actual = pendientes.pop()
+        try:
+            with os.scandir(actual) as it:
+                for entrada in it:
+                    if entrada.is_dir(follow_symlinks=False):
+                        pendientes.append(entrada.path)
+                    elif entrada.is_file(follow_symlinks=False):
+                        yield entrada
+        except FileNotFoundError:
+            continue
+
+
+def _borrar(ruta):
+    try:
+        os.remove(ruta)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+class Liberado:
+    """Archivos y bytes liberados por categoría en una pasada"""
+
+    def __init__(self):
+        self.categorias = {}
+
+    def sumar(self, categoria, tamano, archivos=1):
+        actual = self.categorias.setdefault(categoria, [0, 0])
+        actual[0] += archivos
+        actual[1] += tamano
+
+    @property
+    def archivos(self):
+        return sum(a for a, _ in self.categorias.values())
+
+    @property
+    def bytes(self):
+        return sum(b for _, b in self.categorias.values())
+
+    def resumen(self):
+        return ', '.join(f"{categoria} {archivos} ({tamano / 1024 / 1024:.1f} MB)"
+                         for categoria, (archivos, tamano) in sorted(self.categorias.items()))
+
+
+class Limpiador:
+    """Elimina subidas sin informe y expira los informes generados por edad y tamaño.
+
+    - Subidas: originales y variantes sin fila en `imagenes`, y temporales de
+      subidas abandonadas. La comprobación y el borrado se hacen con el
+      candado de escritura tomado, igual que purgar_imagenes, para no borrar
+      un archivo que una transacción en curso acaba de colocar.
+    - Informes: las entradas de la caché sin usar desde `max_edad_informes` y,
+      del resto de archivos (trabajos, progreso, paquetes, PDF antiguos), los
+      que superan esa edad o, si juntos pasan de `max_bytes_trabajos`, los más
+      antiguos hasta quedar bajo el límite.
+
+    También purga las bajas de la sincronización con más de `max_edad_bajas`
+    días (None las conserva). `al_liberar(categoria, archivos, bytes)` recibe
+    lo liberado en cada pasada.
+    """
+
+    def __init__(self, carpeta_uploads, carpeta_informes, cache_informes=None, intervalo=3600, gracia=3600,
+                 max_edad_informes=7 * 24 * 3600, max_bytes_trabajos=500 * 1024 * 1024, max_edad_bajas=None,
+                 lote=500, pausa=0.05, al_liberar=None):
+        self.carpeta_uploads = carpeta_uploads
+        self.carpeta_informes = carpeta_informes
+        self.cache_informes = cache_informes
+        self.intervalo = intervalo
+        self.gracia = gracia
+        self.max_edad_informes = max_edad_informes
+        self.max_bytes_trabajos = max_bytes_trabajos
+        self.max_edad_bajas = max_edad_bajas
+        self.lote = lote
+        self.pausa = pausa
+        self.al_liberar = al_liberar
+        self._detener = threading.Event()
+        self._hilo = None
+
+    def iniciar(self):
+        """Arranca el hilo que hace una pasada cada `intervalo` segundos"""
+        if self._hilo is not None:
+            return
+        self._hilo = threading.Thread(target=self._ciclo, name='limpieza', daemon=True)
+        self._hilo.start()
+
+    def detener(self):
+        self._detener.set()
+        if self._hilo is not None:
+            self._hilo.join()
+            self._hilo = None
+
+    def _ciclo(self):
+        while not self._detener.wait(self.intervalo):
+            try:
+                self.pasada()
+            except Exception as e:
+                print(f"Error en la limpieza: {e}")
+
+    def _pausar(self):
+        # Entre lotes: ceder el disco y la base de datos a las peticiones
+        if self._detener.wait(self.pausa):
+            raise _Detenido
+
+    def pasada(self, simular=False):
+        """Una pasada completa; devuelve lo liberado (o lo que se liberaría si `simular`)"""
+        inicio = time.perf_counter()
+        liberado = Liberado()
+        try:
+            self.limpiar_subidas(liberado, simular)
+            self.limpiar_informes(liberado, simular)
+        except _Detenido:
+            pass
+        if liberado.archivos and not simular:
+            print(f"Limpieza: {liberado.archivos} archivos, {liberado.bytes / 1024 / 1024:.1f} MB liberados "
+                  f"en {time.perf_counter() - inicio:.1f} s ({liberado.resumen()})")
+        if self.al_liberar is not None and not simular:
+            for categoria, (archivos, tamano) in liberado.categorias.items():
+                self.al_liberar(categoria, archivos, tamano)
+        if self.max_edad_bajas is not None and not simular and not self._detener.is_set():
+            with conexion() as conn:
+                bajas = purgar_bajas(conn, self.max_edad_bajas)
+            if bajas:
+                print(f"Limpieza: {bajas} bajas de sincronización con más de {self.max_edad_bajas} días eliminadas")
+        return liberado
+
+    # Subidas
+
+    def limpiar_subidas(self, liberado, simular=False):
+        # Primero las imágenes con cero referencias (p. ej. si se cortó la purga tras un borrado)
+        if not simular:
+            with conexion() as conn:
+                purgadas = purgar_imagenes(conn, self.carpeta_uploads)
+            if purgadas:
+                liberado.sumar('sin_referencias', 0, len(purgadas))
+
+        limite = time.time() - self.gracia
+        candidatas = []
+        for entrada in _archivos(self.carpeta_uploads):
+            st = entrada.stat()
+            if st.st_mtime > limite:
+                continue
+            relativa = os.path.relpath(entrada.path, self.carpeta_uploads).replace(os.sep, '/')
+            if entrada.name.endswith('.tmp'):
+                # Subida o variante que no llegó a terminarse
+                if simular or _borrar(entrada.path):
+                    liberado.sumar('temporales', st.st_size)
+                continue
+            if entrada.name.startswith('.'):
+                # .gitkeep y similares no son subidas
+                continue
+            candidatas.append((relativa, entrada.path, st.st_size))
+            if len(candidatas) >= self.lote:
+                self._borrar_huerfanas(candidatas, liberado, simular)
+                candidatas = []
+                self._pausar()
+        if candidatas:
+            self._borrar_huerfanas(candidatas, liberado, simular)
+
+    def _borrar_huerfanas(self, candidatas, liberado, simular):
+        prefijo_variantes = CARPETA_VARIANTES + '/'
+        with conexion() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for relativa, ruta, tamano in candidatas:
+                    if relativa.startswith(prefijo_variantes):
+                        # variantes/ab/cd/<hash>.<variante>.webp pertenece a ab/cd/<hash>.<ext>
+                        base = relativa[len(prefijo_variantes):].rsplit('.', 2)[0]
+                        en_uso = conn.execute("SELECT 1 FROM imagenes WHERE ruta > ? AND ruta < ? LIMIT 1",
+                                              (base + '.', base + '/')).fetchone()
+                        categoria = 'variantes'
+                    else:
+                        en_uso = conn.execute("SELECT 1 FROM imagenes WHERE ruta = ?", (relativa,)).fetchone()
+                        categoria = 'subidas'
+                    if en_uso is None and (simular or _borrar(ruta)):
+                        liberado.sumar(categoria, tamano)
+            finally:
+                conn.rollback()
+
+    # Informes generados
+
+    def limpiar_informes(self, liberado, simular=False):
+        if self.cache_informes is not None:
+            entradas, tamano = self.cache_informes.expirar(self.max_edad_informes, simular)
+            if entradas:
+                liberado.sumar('cache_informes', tamano, entradas)
+
+        ahora = time.time()
+        conservados = []
+        vistos = 0
+        for entrada in _archivos(self.carpeta_informes):
+            temporal = entrada.name.endswith('.tmp')
+            # La caché se administra a sí misma, salvo sus PDF a medio escribir
+            if (not temporal and entrada.name.startswith(PREFIJO_CACHE)
+                    and os.path.dirname(entrada.path) == self.carpeta_informes):
+                continue
+            st = entrada.stat()
+            edad = ahora - st.st_mtime
+            if edad < self.gracia:
+                continue
+            if temporal:
+                # Quedó de un proceso interrumpido mientras escribía
+                if simular or _borrar(entrada.path):
+                    liberado.sumar('temporales', st.st_size)
+                continue
+            if edad > self.max_edad_informes:
+                if simular or _borrar(entrada.path):
+                    liberado.sumar('informes', st.st_size)
+            else:
+                conservados.append((st.st_mtime, st.st_size, entrada.path))
+            vistos += 1
+            if vistos % self.lote == 0:
+                self._pausar()
+
+        # Cuota de tamaño: los más antiguos primero
+        total = sum(tamano for _, tamano, _ in conservados)
+        for _, tamano, ruta in sorted(conservados):
+            if total <= self.max_bytes_trabajos:
+                break
+            if simular or _borrar(ruta):
+                liberado.sumar('informes', tamano)
+            total -= tamano
+
+        if not simular:
+            self._borrar_paquetes_vacios(ahora)
+
+    def _borrar_paquetes_vacios(self, ahora):
+        # Carpetas de paquetes que quedaron de una descarga interrumpida por un cierre brusco
+        with os.scandir(self.carpeta_informes) as it:
+            for entrada in it:
+                if (entrada.name.startswith(PREFIJO_PAQUETES) and entrada.is_dir(follow_symlinks=False)
+                        and ahora - entrada.stat().st_mtime > self.gracia):
+                    try:
+                        os.rmdir(entrada.path)
+                    except OSError:
+                        pass
@@ -0,0 +1,237 @@
+"""Métricas de la aplicación en formato de texto de Prometheus.
+
+Contadores e histogramas con etiquetas, sin dependencias externas, y un
+cronómetro por fases para saber en qué se va el tiempo de un informe PDF.
+"""
+import math
+import threading
+from time import perf_counter
+from contextlib import contextmanager
+
+# Límites (en segundos) de los histogramas de duración
+LIMITES_DURACION = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+# Límites de los histogramas de cantidad de consultas por petición
+LIMITES_CANTIDAD = (0, 1, 2, 5, 10, 20, 50, 100, 500, 1000)
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _etiquetas(nombres, valores, extra=()):
+    pares = [f'{n}="{_escapar(v)}"' for n, v in zip(nombres, valores)] + list(extra)
+    return '{' + ','.join(pares) + '}' if pares else ''
+
+
+def _numero(valor):
+    if valor == math.inf:
+        return '+Inf'
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class Contador:
+    """Valor que solo crece, uno por combinación de etiquetas"""
+
+    tipo = 'counter'
+
+    def __init__(self, nombre, ayuda, etiquetas=()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self._lock = threading.Lock()
+        self._valores = {}
+
+    def incrementar(self, cantidad=1, **etiquetas):
+        clave = tuple(etiquetas[n] for n in self.etiquetas)
+        with self._lock:
+            self._valores[clave] = self._valores.get(clave, 0) + cantidad
+
+    def valor(self, **etiquetas):
+        return self._valores.get(tuple(etiquetas[n] for n in self.etiquetas), 0)
+
+    def muestras(self):
+        with self._lock:
+            valores = sorted(self._valores.items())
+        for clave, valor in valores:
+            yield f"{self.nombre}{_etiquetas(self.etiquetas, clave)} {_numero(valor)}"
+
+
+class Histograma:
+    """Distribución de observaciones en cubetas acumuladas, con suma y cantidad"""
+
+    tipo = 'histogram'
+
+    def __init__(self, nombre, ayuda, etiquetas=(), limites=LIMITES_DURACION):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self.limites = tuple(limites) + (math.inf,)
+        self._lock = threading.Lock()
+        # clave -> [cuentas por cubeta (no acumuladas), suma, cantidad]
+        self._series = {}
+
+    def observar(self, valor, **etiquetas):
+        clave = tuple(etiquetas[n] for n in self.etiquetas)
+        indice = next(i for i, limite in enumerate(self.limites) if valor <= limite)
+        with self._lock:
+            serie = self._series.get(clave)
+            if serie is None:
+                serie = self._series[clave] = [[0] * len(self.limites), 0.0, 0]
+            serie[0][indice] += 1
+            serie[1] += valor
+            serie[2] += 1
+
+    def muestras(self):
+        with self._lock:
+            series = sorted((clave, (list(c), s, n)) for clave, (c, s, n) in self._series.items())
+        for clave, (cuentas, suma, cantidad) in series:
+            acumulado = 0
+            for limite, cuenta in zip(self.limites, cuentas):
+                acumulado += cuenta
+                le = f'le="{_numero(limite)}"'
+                yield f"{self.nombre}_bucket{_etiquetas(self.etiquetas, clave, [le])} {acumulado}"
+            yield f"{self.nombre}_sum{_etiquetas(self.etiquetas, clave)} {_numero(suma)}"
+            yield f"{self.nombre}_count{_etiquetas(self.etiquetas, clave)} {cantidad}"
+
+
+class Lectura:
+    """Valor que se lee de una función al exponer las métricas (p. ej. el tamaño de una caché)"""
+
+    def __init__(self, nombre, ayuda, leer, tipo='gauge'):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.tipo = tipo
+        self.leer = leer
+
+    def muestras(self):
+        yield f"{self.nombre} {_numero(self.leer())}"
+
+
+class Registro:
+    """Conjunto de métricas que se exponen juntas"""
+
+    def __init__(self):
+        self._metricas = []
+
+    def contador(self, nombre, ayuda, etiquetas=()):
+        metrica = Contador(nombre, ayuda, etiquetas)
+        self._metricas.append(metrica)
+        return metrica
+
+    def histograma(self, nombre, ayuda, etiquetas=(), limites=LIMITES_DURACION):
+        metrica = Histograma(nombre, ayuda, etiquetas, limites)
+        self._metricas.append(metrica)
+        return metrica
+
+    def lectura(self, nombre, ayuda, leer, tipo='gauge'):
+        """Registra una métrica leída al exponer; reemplaza a la anterior con el mismo nombre"""
+        metrica = Lectura(nombre, ayuda, leer, tipo)
+        self._metricas = [m for m in self._metricas if m.nombre != nombre]
+        self._metricas.append(metrica)
+        return metrica
+
+    def exponer(self):
+        """Texto en el formato de exposición de Prometheus (versión 0.0.4)"""
+        lineas = []
+        for metrica in self._metricas:
+            lineas.append(f"# HELP {metrica.nombre} {metrica.ayuda}")
+            lineas.append(f"# TYPE {metrica.nombre} {metrica.tipo}")
+            lineas.extend(metrica.muestras())
+        return '\n'.join(lineas) + '\n'
+
+
+class Fases:
+    """Tiempo propio acumulado por fase.
+
+    Las fases pueden anidarse: el tiempo de una fase interna se descuenta de
+    la que la contiene, así la suma de todas es el tiempo total medido.
+    """
+
+    def __init__(self):
+        self.tiempos = {}
+        self._pila = []
+
+    @contextmanager
+    def medir(self, fase):
+        inicio = perf_counter()
+        self._pila.append(0.0)
+        try:
+            yield
+        finally:
+            total = perf_counter() - inicio
+            hijas = self._pila.pop()
+            self.tiempos[fase] = self.tiempos.get(fase, 0.0) + total - hijas
+            if self._pila:
+                self._pila[-1] += total
+
+    def iterar(self, iterable, fase):
+        """Recorre `iterable` atribuyendo a `fase` el tiempo de obtener cada elemento"""
+        iterador = iter(iterable)
+        while True:
+            with self.medir(fase):
+                try:
+                    elemento = next(iterador)
+                except StopIteration:
+                    return
+            yield elemento
+
+    def como_dict(self):
+        return {fase: round(segundos, 4) for fase, segundos in self.tiempos.items()}
+
+    def resumen(self):
+        return ', '.join(f"{fase} {segundos * 1000:.0f} ms" for fase, segundos in self.tiempos.items())
+
+
+class MetricasAplicacion(Registro):
+    """Métricas de peticiones HTTP, consultas SQL, informes PDF y cachés"""
+
+    def __init__(self, prefijo='informes'):
+        super().__init__()
+        self.prefijo = prefijo
+        self.peticiones = self.contador(f'{prefijo}_http_peticiones_total', 'Peticiones atendidas',
+                                        ('metodo', 'ruta', 'estado'))
+        self.duracion = self.histograma(f'{prefijo}_http_duracion_segundos', 'Latencia de las peticiones',
+                                        ('metodo', 'ruta'))
+        self.consultas_peticion = self.histograma(f'{prefijo}_http_consultas_sql', 'Consultas SQL por petición',
+                                                  ('ruta',), LIMITES_CANTIDAD)
+        self.sql_peticion = self.histograma(f'{prefijo}_http_sql_segundos', 'Tiempo en SQL por petición',
+                                            ('ruta',))
+        self.consultas = self.contador(f'{prefijo}_sql_consultas_total', 'Consultas SQL ejecutadas')
+        self.sql_segundos = self.contador(f'{prefijo}_sql_segundos_total', 'Tiempo total en consultas SQL')
+        self.pdf_generados = self.contador(f'{prefijo}_pdf_generados_total', 'Informes PDF renderizados',
+                                           ('tipo',))
+        self.pdf_fases = self.histograma(f'{prefijo}_pdf_fase_segundos', 'Tiempo de cada fase del renderizado',
+                                         ('tipo', 'fase'))
+        self.limpieza_archivos = self.contador(f'{prefijo}_limpieza_archivos_total',
+                                               'Archivos eliminados por la limpieza', ('categoria',))
+        self.limpieza_bytes = self.contador(f'{prefijo}_limpieza_bytes_total', 'Bytes liberados por la limpieza',
+                                            ('categoria',))
+
+    def registrar_cache_fragmentos(self, cache):
+        """Expone los aciertos, fallos, entradas y bytes de una CacheFragmentos"""
+        nombre = f'{self.prefijo}_cache_fragmentos'
+        for clave, sufijo, ayuda, tipo in (
+                ('aciertos', 'aciertos_total', 'Fragmentos HTML servidos desde la caché', 'counter'),
+                ('fallos', 'fallos_total', 'Fragmentos HTML que hubo que renderizar', 'counter'),
+                ('entradas', 'entradas', 'Fragmentos HTML guardados', 'gauge'),
+                ('bytes', 'bytes', 'Tamaño de los fragmentos HTML guardados', 'gauge')):
+            self.lectura(f'{nombre}_{sufijo}', ayuda, lambda clave=clave: cache.estadisticas()[clave], tipo)
+
+    def registrar_peticion(self, metodo, ruta, estado, segundos, consultas, segundos_sql):
+        self.peticiones.incrementar(metodo=metodo, ruta=ruta, estado=estado)
+        self.duracion.observar(segundos, metodo=metodo, ruta=ruta)
+        self.consultas_peticion.observar(consultas, ruta=ruta)
+        self.sql_peticion.observar(segundos_sql, ruta=ruta)
+
+    def registrar_consulta(self, segundos):
+        self.consultas.incrementar()
+        self.sql_segundos.incrementar(segundos)
+
+    def registrar_limpieza(self, categoria, archivos, tamano):
+        self.limpieza_archivos.incrementar(archivos, categoria=categoria)
+        self.limpieza_bytes.incrementar(tamano, categoria=categoria)
+
+    def registrar_pdf(self, tipo, fases):
+        self.pdf_generados.incrementar(tipo=tipo)
+        for fase, segundos in fases.items():
+            self.pdf_fases.observar(segundos, tipo=tipo, fase=fase)
@@ -0,0 +1,408 @@
+import sqlite3
+
+from db import conexion
+
+def comprobar_claves_foraneas(conn):
+    """Falla (y revierte la migración) si alguna fila viola una clave foránea"""
+    violaciones = conn.execute("PRAGMA foreign_key_check").fetchall()
+    if violaciones:
+        raise sqlite3.IntegrityError(f"{len(violaciones)} filas violan claves foráneas, p. ej. {violaciones[0]}")
+
+
+# Triggers que mantienen el índice FTS5 de las descripciones
+TRIGGERS_FTS = [
+    '''CREATE TRIGGER IF NOT EXISTS informes_fts_ai AFTER INSERT ON informes BEGIN
+           INSERT INTO informes_fts (rowid, descripcion) VALUES (new.id, new.descripcion);
+       END''',
+    '''CREATE TRIGGER IF NOT EXISTS informes_fts_ad AFTER DELETE ON informes BEGIN
+           INSERT INTO informes_fts (informes_fts, rowid, descripcion)
+           VALUES ('delete', old.id, old.descripcion);
+       END''',
+    '''CREATE TRIGGER IF NOT EXISTS informes_fts_au AFTER UPDATE OF descripcion ON informes BEGIN
+           INSERT INTO informes_fts (informes_fts, rowid, descripcion)
+           VALUES ('delete', old.id, old.descripcion);
+           INSERT INTO informes_fts (rowid, descripcion) VALUES (new.id, new.descripcion);
+       END''',
+]
+
+# Triggers que cuentan las referencias de cada imagen
+TRIGGERS_IMAGENES = [
+    '''CREATE TRIGGER IF NOT EXISTS imagenes_ai AFTER INSERT ON informes
+       WHEN new.imagen IS NOT NULL BEGIN
+           INSERT INTO imagenes (ruta, referencias) VALUES (new.imagen, 1)
+           ON CONFLICT (ruta) DO UPDATE SET referencias = referencias + 1;
+       END''',
+    '''CREATE TRIGGER IF NOT EXISTS imagenes_ad AFTER DELETE ON informes
+       WHEN old.imagen IS NOT NULL BEGIN
+           UPDATE imagenes SET referencias = referencias - 1 WHERE ruta = old.imagen;
+       END''',
+    '''CREATE TRIGGER IF NOT EXISTS imagenes_au AFTER UPDATE OF imagen ON informes
+       WHEN old.imagen IS NOT new.imagen BEGIN
+           UPDATE imagenes SET referencias = referencias - 1 WHERE ruta = old.imagen;
+           INSERT INTO imagenes (ruta, referencias) SELECT new.imagen, 1 WHERE new.imagen IS NOT NULL
+           ON CONFLICT (ruta) DO UPDATE SET referencias = referencias + 1;
+       END''',
+]
+
+
+# Primer día del periodo de una fecha, como lo define la migración 10. Es una copia
+# fija de analitica.PERIODOS_SQL: si esa definición cambia, una migración nueva debe
+# recrear los triggers y recalcular informes_periodo
+PERIODOS_MIGRACION_10 = {
+    'dia': "{fecha}",
+    'semana': "date({fecha}, '-6 days', 'weekday 1')",
+    'mes': "substr({fecha}, 1, 8) || '01'",
+}
+
+
+def sumar_en_periodos(fila):
+    """Sentencia que suma el informe `fila` (new) al total de su máquina en su día, semana y mes"""
+    valores = ', '.join(f"('{agrupacion}', {sql.format(fecha=f'{fila}.fecha')}, {fila}.maquina_id, 1)"
+                        for agrupacion, sql in PERIODOS_MIGRACION_10.items())
+    return f"""INSERT INTO informes_periodo (agrupacion, periodo, maquina_id, total) VALUES {valores}
+               ON CONFLICT (agrupacion, periodo, maquina_id) DO UPDATE SET total = total + 1;"""
+
+
+def restar_en_periodos(fila):
+    """Sentencias que restan el informe `fila` (old) de su día, semana y mes y quitan los totales a cero"""
+    periodos = ' OR '.join(f"(agrupacion = '{agrupacion}' AND periodo = {sql.format(fecha=f'{fila}.fecha')})"
+                           for agrupacion, sql in PERIODOS_MIGRACION_10.items())
+    condicion = f"maquina_id = {fila}.maquina_id AND ({periodos})"
+    return f"""UPDATE informes_periodo SET total = total - 1 WHERE {condicion};
+               DELETE FROM informes_periodo WHERE {condicion} AND total <= 0;"""
+
+
+# Migraciones del esquema en orden. Cada una tiene un número de versión, una
+# descripción y una lista de pasos; un paso es una sentencia SQL o una función
+# que recibe la conexión. La versión aplicada se guarda en PRAGMA user_version.
+MIGRACIONES = [
+    (1, "Tablas iniciales de máquinas e informes", [
+        '''CREATE TABLE IF NOT EXISTS maquinas
+           (id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nombre TEXT UNIQUE NOT NULL)''',
+        '''CREATE TABLE IF NOT EXISTS informes
+           (id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nombre_maquina TEXT NOT NULL,
+            fecha DATE NOT NULL,
+            hora TIME NOT NULL,
+            descripcion TEXT NOT NULL,
+            imagen TEXT,
+            creado_en TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (nombre_maquina) REFERENCES maquinas (nombre))''',
+    ]),
+    (2, "Índices para consultas por máquina y por rango de fechas", [
+        # Filtro por máquina ordenado por fecha y hora; también sirve el
+        # listado general ordenado por nombre_maquina, fecha, hora
+        '''CREATE INDEX IF NOT EXISTS idx_informes_maquina_fecha
+           ON informes (nombre_maquina, fecha, hora)''',
+        # Rango de fechas (WHERE fecha BETWEEN ...)
+        '''CREATE INDEX IF NOT EXISTS idx_informes_fecha
+           ON informes (fecha, nombre_maquina, hora)''',
+    ]),
+    (3, "Versión de los datos para invalidar cachés", [
+        '''CREATE TABLE IF NOT EXISTS estado_datos
+           (id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL)''',
+        "INSERT OR IGNORE INTO estado_datos (id, version) VALUES (1, 1)",
+    ]),
+    (4, "Búsqueda de texto completo en las descripciones (FTS5)", [
+        # Índice externo sobre informes.descripcion; sin acentos para que
+        # "maquina" encuentre "máquina"
+        '''CREATE VIRTUAL TABLE IF NOT EXISTS informes_fts USING fts5
+           (descripcion, content='informes', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2')''',
+        *TRIGGERS_FTS,
+        # Indexar los informes existentes
+        "INSERT INTO informes_fts (informes_fts) VALUES ('rebuild')",
+    ]),
+    (5, "Estadísticas por máquina mantenidas por triggers", [
+        # Total de informes y última fecha por máquina
+        '''CREATE TABLE IF NOT EXISTS maquina_stats
+           (nombre_maquina TEXT PRIMARY KEY,
+            total INTEGER NOT NULL DEFAULT 0,
+            ultima_fecha DATE)''',
+        # Informes por máquina y mes (AAAA-MM), para "informes este mes"
+        '''CREATE TABLE IF NOT EXISTS maquina_stats_mes
+           (nombre_maquina TEXT NOT NULL,
+            mes TEXT NOT NULL,
+            total INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (nombre_maquina, mes)) WITHOUT ROWID''',
+        '''CREATE TRIGGER IF NOT EXISTS maquina_stats_ai AFTER INSERT ON informes BEGIN
+               INSERT INTO maquina_stats (nombre_maquina, total, ultima_fecha)
+               VALUES (new.nombre_maquina, 1, new.fecha)
+               ON CONFLICT (nombre_maquina) DO UPDATE
+               SET total = total + 1, ultima_fecha = MAX(COALESCE(ultima_fecha, ''), excluded.ultima_fecha);
+               INSERT INTO maquina_stats_mes (nombre_maquina, mes, total)
+               VALUES (new.nombre_maquina, substr(new.fecha, 1, 7), 1)
+               ON CONFLICT (nombre_maquina, mes) DO UPDATE SET total = total + 1;
+           END''',
+        # Al borrar, la última fecha se vuelve a leer del índice (máquina, fecha)
+        '''CREATE TRIGGER IF NOT EXISTS maquina_stats_ad AFTER DELETE ON informes BEGIN
+               UPDATE maquina_stats
+               SET total = total - 1,
+                   ultima_fecha = (SELECT MAX(fecha) FROM informes WHERE nombre_maquina = old.nombre_maquina)
+               WHERE nombre_maquina = old.nombre_maquina;
+               DELETE FROM maquina_stats WHERE nombre_maquina = old.nombre_maquina AND total <= 0;
+               UPDATE maquina_stats_mes SET total = total - 1
+               WHERE nombre_maquina = old.nombre_maquina AND mes = substr(old.fecha, 1, 7);
+               DELETE FROM maquina_stats_mes
+               WHERE nombre_maquina = old.nombre_maquina AND mes = substr(old.fecha, 1, 7) AND total <= 0;
+           END''',
+        # Una edición que cambia máquina o fecha equivale a borrar e insertar
+        '''CREATE TRIGGER IF NOT EXISTS maquina_stats_au AFTER UPDATE OF nombre_maquina, fecha ON informes BEGIN
+               UPDATE maquina_stats
+               SET total = total - 1,
+                   ultima_fecha = (SELECT MAX(fecha) FROM informes WHERE nombre_maquina = old.nombre_maquina)
+               WHERE nombre_maquina = old.nombre_maquina;
+               DELETE FROM maquina_stats WHERE nombre_maquina = old.nombre_maquina AND total <= 0;
+               UPDATE maquina_stats_mes SET total = total - 1
+               WHERE nombre_maquina = old.nombre_maquina AND mes = substr(old.fecha, 1, 7);
+               DELETE FROM maquina_stats_mes
+               WHERE nombre_maquina = old.nombre_maquina AND mes = substr(old.fecha, 1, 7) AND total <= 0;
+               INSERT INTO maquina_stats (nombre_maquina, total, ultima_fecha)
+               VALUES (new.nombre_maquina, 1, new.fecha)
+               ON CONFLICT (nombre_maquina) DO UPDATE
+               SET total = total + 1,
+                   ultima_fecha = (SELECT MAX(fecha) FROM informes WHERE nombre_maquina = new.nombre_maquina);
+               INSERT INTO maquina_stats_mes (nombre_maquina, mes, total)
+               VALUES (new.nombre_maquina, substr(new.fecha, 1, 7), 1)
+               ON CONFLICT (nombre_maquina, mes) DO UPDATE SET total = total + 1;
+           END''',
+        # Calcular las estadísticas de los informes existentes (por nombre; la
+        # migración 8 las vuelve a calcular por id)
+        '''INSERT INTO maquina_stats (nombre_maquina, total, ultima_fecha)
+           SELECT nombre_maquina, COUNT(*), MAX(fecha) FROM informes GROUP BY nombre_maquina''',
+        '''INSERT INTO maquina_stats_mes (nombre_maquina, mes, total)
+           SELECT nombre_maquina, substr(fecha, 1, 7), COUNT(*) FROM informes
+           GROUP BY nombre_maquina, substr(fecha, 1, 7)''',
+    ]),
+    (6, "Fecha de la última modificación de los datos", [
+        # Para Last-Modified en las páginas; se actualiza junto con la versión
+        "ALTER TABLE estado_datos ADD COLUMN modificado_en TIMESTAMP",
+        "UPDATE estado_datos SET modificado_en = CURRENT_TIMESTAMP",
+    ]),
+    (7, "Referencias a las imágenes almacenadas por contenido", [
+        # Una fila por archivo en static/uploads; una imagen se borra del
+        # disco solo cuando ningún informe la referencia
+        '''CREATE TABLE IF NOT EXISTS imagenes
+           (ruta TEXT PRIMARY KEY,
+            referencias INTEGER NOT NULL DEFAULT 0) WITHOUT ROWID''',
+        '''CREATE INDEX IF NOT EXISTS idx_imagenes_sin_referencias
+           ON imagenes (referencias) WHERE referencias <= 0''',
+        *TRIGGERS_IMAGENES,
+        # Registrar las imágenes existentes; los archivos se pasan al
+        # almacenamiento por contenido con imagenes.migrar_imagenes_antiguas
+        '''INSERT OR IGNORE INTO imagenes (ruta, referencias)
+           SELECT imagen, COUNT(*) FROM informes WHERE imagen IS NOT NULL GROUP BY imagen''',
+    ]),
+    (8, "Clave entera de la máquina en los informes (maquina_id)", [
+        # Máquinas que solo aparecían en informes (la clave por nombre no se validaba)
+        "INSERT OR IGNORE INTO maquinas (nombre) SELECT DISTINCT nombre_maquina FROM informes",
+        # SQLite no permite cambiar una clave foránea: se rehace la tabla
+        # conservando los ids, que son los rowid del índice FTS
+        '''CREATE TABLE informes_nueva
+           (id INTEGER PRIMARY KEY AUTOINCREMENT,
+            maquina_id INTEGER NOT NULL REFERENCES maquinas (id) ON DELETE CASCADE,
+            fecha DATE NOT NULL,
+            hora TIME NOT NULL,
+            descripcion TEXT NOT NULL,
+            imagen TEXT,
+            creado_en TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''',
+        '''INSERT INTO informes_nueva (id, maquina_id, fecha, hora, descripcion, imagen, creado_en)
+           SELECT i.id, m.id, i.fecha, i.hora, i.descripcion, i.imagen, i.creado_en
+           FROM informes i JOIN maquinas m ON m.nombre = i.nombre_maquina''',
+        # Mantener el contador de AUTOINCREMENT para no reutilizar ids de informes borrados
+        "DELETE FROM sqlite_sequence WHERE name = 'informes_nueva'",
+        """INSERT INTO sqlite_sequence (name, seq)
+           SELECT 'informes_nueva', seq FROM sqlite_sequence WHERE name = 'informes'""",
+        # Quitar los triggers antes de borrar la tabla para que no toquen el
+        # índice FTS ni las referencias de las imágenes
+        "DROP TRIGGER informes_fts_ai",
+        "DROP TRIGGER informes_fts_ad",
+        "DROP TRIGGER informes_fts_au",
+        "DROP TRIGGER maquina_stats_ai",
+        "DROP TRIGGER maquina_stats_ad",
+        "DROP TRIGGER maquina_stats_au",
+        "DROP TRIGGER imagenes_ai",
+        "DROP TRIGGER imagenes_ad",
+        "DROP TRIGGER imagenes_au",
+        "DROP TABLE informes",
+        "ALTER TABLE informes_nueva RENAME TO informes",
+        # Los mismos índices de la migración 2, ahora sobre el entero
+        '''CREATE INDEX idx_informes_maquina_fecha
+           ON informes (maquina_id, fecha, hora)''',
+        '''CREATE INDEX idx_informes_fecha
+           ON informes (fecha, maquina_id, hora)''',
+        *TRIGGERS_FTS,
+        *TRIGGERS_IMAGENES,
+        # Estadísticas por id de máquina
+        "DROP TABLE maquina_stats",
+        "DROP TABLE maquina_stats_mes",
+        '''CREATE TABLE maquina_stats
+           (maquina_id INTEGER PRIMARY KEY,
+            total INTEGER NOT NULL DEFAULT 0,
+            ultima_fecha DATE)''',
+        '''CREATE TABLE maquina_stats_mes
+           (maquina_id INTEGER NOT NULL,
+            mes TEXT NOT NULL,
+            total INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (maquina_id, mes)) WITHOUT ROWID''',
+        '''CREATE TRIGGER maquina_stats_ai AFTER INSERT ON informes BEGIN
+               INSERT INTO maquina_stats (maquina_id, total, ultima_fecha)
+               VALUES (new.maquina_id, 1, new.fecha)
+               ON CONFLICT (maquina_id) DO UPDATE
+               SET total = total + 1, ultima_fecha = MAX(COALESCE(ultima_fecha, ''), excluded.ultima_fecha);
+               INSERT INTO maquina_stats_mes (maquina_id, mes, total)
+               VALUES (new.maquina_id, substr(new.fecha, 1, 7), 1)
+               ON CONFLICT (maquina_id, mes) DO UPDATE SET total = total + 1;
+           END''',
+        # También se dispara por cada informe que borra la cascada de una máquina
+        '''CREATE TRIGGER maquina_stats_ad AFTER DELETE ON informes BEGIN
+               UPDATE maquina_stats
+               SET total = total - 1,
+                   ultima_fecha = (SELECT MAX(fecha) FROM informes WHERE maquina_id = old.maquina_id)
+               WHERE maquina_id = old.maquina_id;
+               DELETE FROM maquina_stats WHERE maquina_id = old.maquina_id AND total <= 0;
+               UPDATE maquina_stats_mes SET total = total - 1
+               WHERE maquina_id = old.maquina_id AND mes = substr(old.fecha, 1, 7);
+               DELETE FROM maquina_stats_mes
+               WHERE maquina_id = old.maquina_id AND mes = substr(old.fecha, 1, 7) AND total <= 0;
+           END''',
+        '''CREATE TRIGGER maquina_stats_au AFTER UPDATE OF maquina_id, fecha ON informes BEGIN
+               UPDATE maquina_stats
+               SET total = total - 1,
+                   ultima_fecha = (SELECT MAX(fecha) FROM informes WHERE maquina_id = old.maquina_id)
+               WHERE maquina_id = old.maquina_id;
+               DELETE FROM maquina_stats WHERE maquina_id = old.maquina_id AND total <= 0;
+               UPDATE maquina_stats_mes SET total = total - 1
+               WHERE maquina_id = old.maquina_id AND mes = substr(old.fecha, 1, 7);
+               DELETE FROM maquina_stats_mes
+               WHERE maquina_id = old.maquina_id AND mes = substr(old.fecha, 1, 7) AND total <= 0;
+               INSERT INTO maquina_stats (maquina_id, total, ultima_fecha)
+               VALUES (new.maquina_id, 1, new.fecha)
+               ON CONFLICT (maquina_id) DO UPDATE
+               SET total = total + 1,
+                   ultima_fecha = (SELECT MAX(fecha) FROM informes WHERE maquina_id = new.maquina_id);
+               INSERT INTO maquina_stats_mes (maquina_id, mes, total)
+               VALUES (new.maquina_id, substr(new.fecha, 1, 7), 1)
+               ON CONFLICT (maquina_id, mes) DO UPDATE SET total = total + 1;
+           END''',
+        # Volver a calcular las estadísticas de los informes existentes, ahora por id
+        "DELETE FROM maquina_stats",
+        "DELETE FROM maquina_stats_mes",
+        '''INSERT INTO maquina_stats (maquina_id, total, ultima_fecha)
+           SELECT maquina_id, COUNT(*), MAX(fecha) FROM informes GROUP BY maquina_id''',
+        '''INSERT INTO maquina_stats_mes (maquina_id, mes, total)
+           SELECT maquina_id, substr(fecha, 1, 7), COUNT(*) FROM informes
+           GROUP BY maquina_id, substr(fecha, 1, 7)''',
+        comprobar_claves_foraneas,
+    ]),
+    (9, "Registro de cambios para la sincronización incremental", [
+        # Un cambio por fila (el último): INSERT OR REPLACE le asigna un seq
+        # nuevo, y AUTOINCREMENT garantiza que los seq nunca retroceden. Un
+        # borrado deja una baja (borrado = 1, con su momento) que se purga
+        # pasado un tiempo
+        '''CREATE TABLE IF NOT EXISTS cambios
+           (seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            tabla TEXT NOT NULL,
+            fila_id INTEGER NOT NULL,
+            borrado INTEGER NOT NULL DEFAULT 0,
+            momento TIMESTAMP,
+            UNIQUE (tabla, fila_id))''',
+        # Cursor mínimo válido: el seq de la última baja purgada
+        "ALTER TABLE estado_datos ADD COLUMN sincronizacion_minima INTEGER NOT NULL DEFAULT 0",
+        '''CREATE TRIGGER IF NOT EXISTS cambios_maquinas_ai AFTER INSERT ON maquinas BEGIN
+               INSERT OR REPLACE INTO cambios (tabla, fila_id) VALUES ('maquinas', new.id);
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS cambios_maquinas_au AFTER UPDATE ON maquinas BEGIN
+               INSERT OR REPLACE INTO cambios (tabla, fila_id) VALUES ('maquinas', new.id);
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS cambios_maquinas_ad AFTER DELETE ON maquinas BEGIN
+               INSERT OR REPLACE INTO cambios (tabla, fila_id, borrado, momento)
+               VALUES ('maquinas', old.id, 1, CURRENT_TIMESTAMP);
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS cambios_informes_ai AFTER INSERT ON informes BEGIN
+               INSERT OR REPLACE INTO cambios (tabla, fila_id) VALUES ('informes', new.id);
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS cambios_informes_au AFTER UPDATE ON informes BEGIN
+               INSERT OR REPLACE INTO cambios (tabla, fila_id) VALUES ('informes', new.id);
+           END''',
+        # También para los informes que borra la cascada al eliminar su máquina
+        '''CREATE TRIGGER IF NOT EXISTS cambios_informes_ad AFTER DELETE ON informes BEGIN
+               INSERT OR REPLACE INTO cambios (tabla, fila_id, borrado, momento)
+               VALUES ('informes', old.id, 1, CURRENT_TIMESTAMP);
+           END''',
+        # Los datos existentes como cambios iniciales, máquinas primero
+        "INSERT OR IGNORE INTO cambios (tabla, fila_id) SELECT 'maquinas', id FROM maquinas ORDER BY id",
+        "INSERT OR IGNORE INTO cambios (tabla, fila_id) SELECT 'informes', id FROM informes ORDER BY id",
+    ]),
+    (10, "Informes por máquina y periodo mantenidos por triggers", [
+        # Total de cada máquina por día, semana y mes (periodo = su primer día)
+        '''CREATE TABLE IF NOT EXISTS informes_periodo
+           (agrupacion TEXT NOT NULL,
+            periodo TEXT NOT NULL,
+            maquina_id INTEGER NOT NULL,
+            total INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (agrupacion, periodo, maquina_id)) WITHOUT ROWID''',
+        # También se disparan por cada informe que borra la cascada de una máquina
+        f'''CREATE TRIGGER IF NOT EXISTS informes_periodo_ai AFTER INSERT ON informes BEGIN
+               {sumar_en_periodos('new')}
+           END''',
+        f'''CREATE TRIGGER IF NOT EXISTS informes_periodo_ad AFTER DELETE ON informes BEGIN
+               {restar_en_periodos('old')}
+           END''',
+        f'''CREATE TRIGGER IF NOT EXISTS informes_periodo_au AFTER UPDATE OF maquina_id, fecha ON informes BEGIN
+               {restar_en_periodos('old')}
+               {sumar_en_periodos('new')}
+           END''',
+        # Calcular los totales de los informes existentes
+        '''INSERT INTO informes_periodo (agrupacion, periodo, maquina_id, total)
+           SELECT 'dia', fecha, maquina_id, COUNT(*) FROM informes GROUP BY 2, 3''',
+        '''INSERT INTO informes_periodo (agrupacion, periodo, maquina_id, total)
+           SELECT 'semana', date(fecha, '-6 days', 'weekday 1'), maquina_id, COUNT(*) FROM informes
+           GROUP BY 2, 3''',
+        '''INSERT INTO informes_periodo (agrupacion, periodo, maquina_id, total)
+           SELECT 'mes', substr(fecha, 1, 8) || '01', maquina_id, COUNT(*) FROM informes GROUP BY 2, 3''',
+    ]),
+]
+
+VERSION_ACTUAL = MIGRACIONES[-1][0]
+
+
+def version_esquema(conn):
+    """Versión del esquema aplicada a la base de datos"""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrar():
+    """Aplica las migraciones pendientes; devuelve la versión final del esquema"""
+    with conexion() as conn:
+        if version_esquema(conn) >= VERSION_ACTUAL:
+            return VERSION_ACTUAL
+        return aplicar_migraciones(conn)
+
+
+def aplicar_migraciones(conn, hasta=VERSION_ACTUAL):
+    """Aplica sobre `conn` las migraciones pendientes hasta la versión `hasta` incluida"""
+    for version, descripcion, pasos in MIGRACIONES:
+        if version > hasta:
+            break
+        # Cada migración en su propia transacción; se vuelve a leer la
+        # versión con el candado tomado por si otro proceso ya migró
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if version_esquema(conn) >= version:
+                conn.rollback()
+                continue
+            for paso in pasos:
+                if callable(paso):
+                    paso(conn)
+                else:
+                    conn.execute(paso)
+            conn.execute(f"PRAGMA user_version = {version:d}")
+            conn.commit()
+            print(f"Migración {version} aplicada: {descripcion}")
+        except Exception:
+            conn.rollback()
+            raise
+    return version_esquema(conn)
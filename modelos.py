@@ -0,0 +1,223 @@
+import threading
+from datetime import date, datetime, time, timezone
+
+# Campos de un informe en el orden que espera informe_desde_fila
+CAMPOS_INFORME = ('id', 'nombre_maquina', 'fecha', 'hora', 'descripcion', 'imagen', 'creado_en')
+# Las mismas columnas en SQL; el nombre de la máquina sale de la tabla maquinas
+COLUMNAS_INFORME = "i.id, m.nombre, i.fecha, i.hora, i.descripcion, i.imagen, i.creado_en"
+# Tablas de las que se leen COLUMNAS_INFORME
+TABLAS_INFORME = "informes i JOIN maquinas m ON m.id = i.maquina_id"
+
+# Hora usada cuando un informe no tiene hora válida
+MEDIANOCHE = time(0, 0)
+
+
+# Parsear una hora no vacía; lanza ValueError si no es válida
+def parse_hora_estricta(hora_str):
+    try:
+        return time.fromisoformat(hora_str)
+    except ValueError:
+        # Horas sin cero inicial (p. ej. "9:05")
+        return datetime.strptime(hora_str, '%H:%M').time()
+
+
+# Función auxiliar para parsear hora de manera segura
+def parse_hora(hora_str):
+    if not hora_str or not hora_str.strip():  # Si no hay hora, usar medianoche
+        return MEDIANOCHE
+    try:
+        return parse_hora_estricta(hora_str)
+    except ValueError:
+        # En caso de error, usar medianoche
+        return MEDIANOCHE
+
+
+class Informe:
+    """Registro compacto de un informe.
+
+    Admite acceso por atributo (plantillas) y por clave (informe['fecha']),
+    igual que los diccionarios que se usaban antes.
+    """
+    __slots__ = ('id', 'nombre_maquina', 'fecha', 'hora', 'descripcion', 'imagen', 'creado_en')
+
+    def __init__(self, id, nombre_maquina, fecha, hora, descripcion, imagen, creado_en):
+        self.id = id
+        self.nombre_maquina = nombre_maquina
+        self.fecha = fecha
+        self.hora = hora
+        self.descripcion = descripcion
+        self.imagen = imagen
+        self.creado_en = creado_en
+
+    def __getitem__(self, clave):
+        try:
+            return getattr(self, clave)
+        except (AttributeError, TypeError):
+            raise KeyError(clave) from None
+
+    def __contains__(self, clave):
+        return clave in self.__slots__
+
+    def get(self, clave, defecto=None):
+        return getattr(self, clave, defecto) if clave in self.__slots__ else defecto
+
+    def keys(self):
+        return list(self.__slots__)
+
+    def as_dict(self):
+        return {clave: getattr(self, clave) for clave in self.__slots__}
+
+    def __eq__(self, otro):
+        if not isinstance(otro, Informe):
+            return NotImplemented
+        return all(getattr(self, c) == getattr(otro, c) for c in self.__slots__)
+
+    def __repr__(self):
+        return f"Informe(id={self.id!r}, nombre_maquina={self.nombre_maquina!r}, fecha={self.fecha!r})"
+
+
+def informe_desde_fila(row):
+    """Convierte una fila (COLUMNAS_INFORME) en un Informe"""
+    creado_en = row[6]
+    return Informe(
+        row[0],
+        row[1],
+        date.fromisoformat(row[2]),
+        parse_hora(row[3]),
+        row[4],
+        row[5],
+        datetime.fromisoformat(creado_en) if creado_en else None,
+    )
+
+
+def consultar_informes(conn, fecha_inicio=None, fecha_fin=None, maquina_id=None):
+    """Recorre los informes ordenados por máquina, fecha y hora (opcionalmente por rango y máquina)"""
+    condiciones, parametros = [], []
+    if fecha_inicio is not None and fecha_fin is not None:
+        condiciones.append("i.fecha BETWEEN ? AND ?")
+        parametros += [fecha_inicio, fecha_fin]
+    if maquina_id is not None:
+        condiciones.append("i.maquina_id = ?")
+        parametros.append(maquina_id)
+    where = f"WHERE {' AND '.join(condiciones)}" if condiciones else ''
+    c = conn.cursor()
+    # CROSS JOIN fija el orden: las máquinas por nombre (índice único) y los informes
+    # de cada una por idx_informes_maquina_fecha, ya ordenados y sin ordenar en memoria
+    c.execute(f"""SELECT {COLUMNAS_INFORME}
+                  FROM maquinas m CROSS JOIN informes i ON i.maquina_id = m.id
+                  {where}
+                  ORDER BY m.nombre, i.fecha, i.hora""", parametros)
+    for row in c:
+        yield informe_desde_fila(row)
+
+
+def consultar_maquinas_con_informes(conn, fecha_inicio, fecha_fin):
+    """Máquinas (id, nombre, total) con informes en el rango, de la que más tiene a la que menos"""
+    # Un conteo por máquina sobre idx_informes_maquina_fecha; el orden por total
+    # (unos cientos de filas) se hace aquí y no con un B-tree temporal
+    filas = conn.execute("""SELECT m.id, m.nombre, COUNT(*) AS total
+                            FROM maquinas m CROSS JOIN informes i ON i.maquina_id = m.id
+                            WHERE i.fecha BETWEEN ? AND ?
+                            GROUP BY m.id""", (fecha_inicio, fecha_fin)).fetchall()
+    return sorted(filas, key=lambda fila: (-fila[2], fila[1]))
+
+
+def consultar_rango_fechas(conn):
+    """Primera y última fecha con informes, o (None, None) si no hay"""
+    # Dos subconsultas: MIN y MAX juntos en un SELECT recorren el índice entero
+    fecha_min, fecha_max = conn.execute("""SELECT (SELECT MIN(fecha) FROM informes),
+                                                  (SELECT MAX(fecha) FROM informes)""").fetchone()
+    if fecha_min is None:
+        return None, None
+    return date.fromisoformat(fecha_min), date.fromisoformat(fecha_max)
+
+
+def consultar_version_datos(conn):
+    """Versión actual de los datos; cambia con cada escritura de informes o máquinas"""
+    return conn.execute("SELECT version FROM estado_datos WHERE id = 1").fetchone()[0]
+
+
+def consultar_estado_datos(conn):
+    """Versión de los datos y fecha (UTC) de su última modificación"""
+    version, modificado_en = conn.execute("SELECT version, modificado_en FROM estado_datos WHERE id = 1").fetchone()
+    return version, datetime.fromisoformat(modificado_en).replace(tzinfo=timezone.utc)
+
+
+def incrementar_version_datos(conn):
+    """Avanza la versión de los datos dentro de la transacción de escritura en curso"""
+    conn.execute("""UPDATE estado_datos
+                    SET version = version + 1, modificado_en = CURRENT_TIMESTAMP
+                    WHERE id = 1""")
+
+
+def reconstruir_estadisticas_maquinas(conn):
+    """Recalcula maquina_stats y maquina_stats_mes desde los informes.
+
+    Los triggers las mantienen al día; esto sirve para la migración inicial o
+    para corregirlas si se editó la base fuera de la aplicación. Debe llamarse
+    dentro de una transacción.
+    """
+    conn.execute("DELETE FROM maquina_stats")
+    conn.execute("DELETE FROM maquina_stats_mes")
+    conn.execute("""INSERT INTO maquina_stats (maquina_id, total, ultima_fecha)
+                    SELECT maquina_id, COUNT(*), MAX(fecha)
+                    FROM informes
+                    GROUP BY maquina_id""")
+    conn.execute("""INSERT INTO maquina_stats_mes (maquina_id, mes, total)
+                    SELECT maquina_id, substr(fecha, 1, 7), COUNT(*)
+                    FROM informes
+                    GROUP BY maquina_id, substr(fecha, 1, 7)""")
+
+
+def consultar_maquinas_con_estadisticas(conn, mes):
+    """Máquinas con su total de informes, última fecha e informes del mes (AAAA-MM)"""
+    c = conn.execute("""SELECT m.id, m.nombre, COALESCE(s.total, 0), s.ultima_fecha, COALESCE(sm.total, 0)
+                        FROM maquinas m
+                        LEFT JOIN maquina_stats s ON s.maquina_id = m.id
+                        LEFT JOIN maquina_stats_mes sm ON sm.maquina_id = m.id AND sm.mes = ?
+                        ORDER BY m.nombre""", (mes,))
+    return [{
+        'id': row[0],
+        'nombre': row[1],
+        'total_informes': row[2],
+        'ultima_fecha': date.fromisoformat(row[3]) if row[3] else None,
+        'informes_mes': row[4],
+    } for row in c]
+
+
+class IdsMaquinas:
+    """Id de cada máquina por su nombre, guardado en memoria tras la primera consulta.
+
+    Los ids (AUTOINCREMENT) nunca se reutilizan, así que un id guardado solo
+    deja de valer si se borra la máquina: quien la borre debe llamar a
+    olvidar() después de confirmar. Los nombres que no existen no se guardan
+    porque pueden crearse en cualquier momento (p. ej. en una importación).
+
+    Una consulta que empezó antes de un olvidar() puede haber leído el id de la
+    máquina borrada; la generación, que olvidar() incrementa, evita guardarlo.
+    """
+
+    def __init__(self):
+        self._ids = {}
+        self._generacion = 0
+        self._lock = threading.Lock()
+
+    def obtener(self, conn, nombre):
+        """Id de la máquina `nombre`, o None si no existe"""
+        with self._lock:
+            id = self._ids.get(nombre)
+            generacion = self._generacion
+        if id is not None:
+            return id
+        fila = conn.execute("SELECT id FROM maquinas WHERE nombre = ?", (nombre,)).fetchone()
+        if fila is None:
+            return None
+        with self._lock:
+            if self._generacion == generacion:
+                self._ids[nombre] = fila[0]
+        return fila[0]
+
+    def olvidar(self, nombre):
+        with self._lock:
+            self._ids.pop(nombre, None)
+            self._generacion += 1
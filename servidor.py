@@ -0,0 +1,93 @@
+import time
+import signal
+
+from waitress import create_server, wasyncore
+from waitress.channel import HTTPChannel
+from waitress.server import BaseWSGIServer
+
+
+def crear_servidor(app, host='127.0.0.1', puerto=5000, hilos=8, max_conexiones=100, cola=64):
+    """Servidor WSGI multihilo (waitress) para producción, sin depurador.
+
+    `hilos` atiende peticiones en paralelo; conviene que no supere el tamaño
+    del pool de conexiones. `max_conexiones` limita las conexiones abiertas
+    que esperan un hilo y `cola` es el backlog del socket de escucha.
+    """
+    app.debug = False
+    return create_server(app, host=host, port=puerto, threads=hilos, connection_limit=max_conexiones,
+                         backlog=cola, ident='InformesMaquinas')
+
+
+def _mapa(servidor):
+    # Sockets del bucle de waitress (uno o varios de escucha, conexiones y el trigger)
+    return servidor.map if hasattr(servidor, 'map') else servidor._map
+
+
+def peticiones_en_curso(servidor):
+    """Conexiones con una petición sin terminar o con respuesta aún por enviar"""
+    return sum(1 for canal in list(_mapa(servidor).values())
+               if isinstance(canal, HTTPChannel) and (canal.requests or canal.total_outbufs_len))
+
+
+def _dejar_de_escuchar(servidor):
+    # Cerrar solo los sockets de escucha: las conexiones abiertas siguen atendiéndose
+    for despachador in list(_mapa(servidor).values()):
+        if isinstance(despachador, BaseWSGIServer):
+            wasyncore.dispatcher.close(despachador)
+
+
+def servir(app, al_iniciar=(), al_apagar=(), espera_maxima=30, **opciones):
+    """Atiende peticiones hasta recibir SIGINT/SIGTERM y luego apaga en orden.
+
+    Antes de abrir el puerto se llama a cada función de `al_iniciar` (p. ej.
+    aplicar las migraciones).
+
+    Al apagar se deja de aceptar conexiones y se siguen atendiendo las
+    peticiones en curso (incluido el envío de sus respuestas) hasta que
+    terminan o pasan `espera_maxima` segundos; una segunda señal no espera.
+    Después se llama a cada función de `al_apagar` (p. ej. vaciar la cola de
+    informes PDF).
+    """
+    for funcion in al_iniciar:
+        funcion()
+    servidor = crear_servidor(app, **opciones)
+    senales = []
+
+    def _detener(signum, frame):
+        if senales:
+            raise SystemExit(1)
+        senales.append(signum)
+
+    for nombre in ('SIGINT', 'SIGTERM', 'SIGBREAK'):
+        if hasattr(signal, nombre):
+            signal.signal(getattr(signal, nombre), _detener)
+
+    print(f"Sirviendo en http://{servidor.effective_host}:{servidor.effective_port} "
+          f"con {servidor.adj.threads} hilos (Ctrl+C para detener)")
+    mapa = _mapa(servidor)
+    espera = servidor.adj.asyncore_loop_timeout
+    try:
+        # Una vuelta del bucle de waitress por iteración para revisar si llegó una señal
+        while not senales:
+            wasyncore.loop(timeout=espera, map=mapa, use_poll=servidor.adj.asyncore_use_poll, count=1)
+
+        _dejar_de_escuchar(servidor)
+        limite = time.monotonic() + espera_maxima
+        pendientes = peticiones_en_curso(servidor)
+        if pendientes:
+            print(f"Esperando {pendientes} peticiones en curso (hasta {espera_maxima} s)...")
+        while pendientes and time.monotonic() < limite:
+            wasyncore.loop(timeout=0.1, map=mapa, use_poll=servidor.adj.asyncore_use_poll, count=1)
+            pendientes = peticiones_en_curso(servidor)
+        if pendientes:
+            print(f"Se cortan {pendientes} peticiones que no terminaron a tiempo")
+    finally:
+        # Sin peticiones en curso los hilos están libres y shutdown() no espera
+        servidor.task_dispatcher.shutdown()
+        wasyncore.close_all(mapa)
+        print("Servidor detenido; terminando los trabajos pendientes...")
+        for funcion in al_apagar:
+            try:
+                funcion()
+            except Exception as e:
+                print(f"Error al apagar: {e}")
@@ -0,0 +1,103 @@
+"""Sincronización incremental para los kioscos y tabletas de campo.
+
+Cada alta, edición o borrado de máquinas e informes deja en la tabla
+`cambios` (mantenida por triggers) una entrada con un número de secuencia
+creciente. El cliente guarda el último `cursor` recibido y pide solo lo que
+cambió después; los borrados llegan como bajas con el id de la fila.
+
+Las respuestas van en lotes acotados por cantidad de cambios y por tamaño,
+con las filas como listas (los nombres de las columnas van una sola vez).
+"""
+import json
+
+# Columnas de cada tabla en el orden de las filas de la respuesta
+COLUMNAS = {
+    'maquinas': ('id', 'nombre'),
+    'informes': ('id', 'maquina_id', 'fecha', 'hora', 'descripcion', 'imagen', 'creado_en'),
+}
+
+
+def _codificar(valor):
+    return json.dumps(valor, ensure_ascii=False, separators=(',', ':'))
+
+
+def consultar_cambios(conn, desde=0, limite=500, max_bytes=512 * 1024):
+    """Lote de cambios con seq mayor que `desde`, en orden.
+
+    Devuelve un diccionario listo para enviar como JSON:
+    - cursor: seq del último cambio incluido (o `desde` si no hay ninguno)
+    - hay_mas: si quedan cambios después del lote
+    - reiniciar: el cursor es anterior a bajas ya purgadas; el cliente debe
+      descartar sus datos y sincronizar desde 0
+    - maquinas / informes: columnas y filas actuales de lo que cambió
+    - bajas: ids borrados por tabla
+
+    El lote se corta en `limite` cambios o al superar unos `max_bytes` de
+    filas codificadas, pero siempre incluye al menos un cambio.
+    """
+    minima = conn.execute("SELECT sincronizacion_minima FROM estado_datos WHERE id = 1").fetchone()[0]
+    if 0 < desde < minima:
+        return {'cursor': 0, 'hay_mas': True, 'reiniciar': True,
+                **{tabla: {'columnas': columnas, 'filas': []} for tabla, columnas in COLUMNAS.items()},
+                'bajas': {tabla: [] for tabla in COLUMNAS}}
+
+    filas = {tabla: [] for tabla in COLUMNAS}
+    bajas = {tabla: [] for tabla in COLUMNAS}
+    cursor = desde
+    tamano = 0
+    hay_mas = False
+    # Una sola consulta: todo el lote sale de la misma instantánea de la base.
+    # En la sincronización completa (desde 0) las bajas no hacen falta
+    c = conn.execute("""SELECT c.seq, c.tabla, c.fila_id, c.borrado,
+                               m.nombre,
+                               i.maquina_id, i.fecha, i.hora, i.descripcion, i.imagen, i.creado_en
+                        FROM cambios c
+                        LEFT JOIN maquinas m ON c.tabla = 'maquinas' AND m.id = c.fila_id
+                        LEFT JOIN informes i ON c.tabla = 'informes' AND i.id = c.fila_id
+                        WHERE c.seq > ? AND (c.borrado = 0 OR ? > 0)
+                        ORDER BY c.seq
+                        LIMIT ?""", (desde, desde, limite + 1))
+    for indice, (seq, tabla, fila_id, borrado, nombre, *informe) in enumerate(c):
+        if indice == limite or (tamano >= max_bytes and indice > 0):
+            hay_mas = True
+            break
+        if borrado:
+            bajas[tabla].append(fila_id)
+            tamano += len(str(fila_id)) + 1
+        else:
+            fila = [fila_id, nombre] if tabla == 'maquinas' else [fila_id, *informe]
+            filas[tabla].append(fila)
+            tamano += len(_codificar(fila).encode('utf-8')) + 1
+        cursor = seq
+    c.close()
+
+    return {
+        'cursor': cursor,
+        'hay_mas': hay_mas,
+        'reiniciar': False,
+        **{tabla: {'columnas': COLUMNAS[tabla], 'filas': filas[tabla]} for tabla in COLUMNAS},
+        'bajas': bajas,
+    }
+
+
+def codificar_respuesta(lote):
+    """JSON compacto (sin espacios ni escapes de caracteres no ASCII) en UTF-8"""
+    return _codificar(lote).encode('utf-8')
+
+
+def purgar_bajas(conn, max_edad_dias):
+    """Elimina las bajas más antiguas que `max_edad_dias`; devuelve cuántas.
+
+    Los clientes con un cursor anterior a la última baja purgada reciben
+    `reiniciar` y vuelven a sincronizar desde cero.
+    """
+    with conn:
+        ultima = conn.execute("""SELECT MAX(seq) FROM cambios
+                                 WHERE borrado = 1 AND momento < datetime('now', ?)""",
+                              (f'-{max_edad_dias:d} days',)).fetchone()[0]
+        if ultima is None:
+            return 0
+        purgadas = conn.execute("DELETE FROM cambios WHERE borrado = 1 AND seq <= ?", (ultima,)).rowcount
+        conn.execute("UPDATE estado_datos SET sincronizacion_minima = MAX(sincronizacion_minima, ?) WHERE id = 1",
+                     (ultima,))
+    return purgadas
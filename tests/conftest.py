@@ -0,0 +1,53 @@
+import os
+import sys
+import subprocess
+
+import pytest
+
+# Los módulos de la aplicación están en la raíz del repositorio
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if RAIZ not in sys.path:
+    sys.path.insert(0, RAIZ)
+
+
+def lanzar_python(codigo, *argumentos, **opciones):
+    """Ejecuta `codigo` en un intérprete nuevo con los módulos de la aplicación en el path.
+
+    Solo para lo que necesita otro proceso (p. ej. enviarle señales); lo demás se
+    prueba en este proceso con los fixtures `aplicacion` y `cliente`.
+    """
+    entorno = dict(os.environ, PYTHONPATH=RAIZ, PYTHONUNBUFFERED='1')
+    return subprocess.Popen([sys.executable, '-c', codigo, *map(str, argumentos)], env=entorno, **opciones)
+
+
+@pytest.fixture
+def conn(tmp_path):
+    """Conexión a una base temporal con todas las migraciones aplicadas"""
+    from db import conectar
+    from migraciones import aplicar_migraciones
+
+    conexion = conectar(str(tmp_path / 'informes.db'), wal=True)
+    aplicar_migraciones(conexion)
+    yield conexion
+    conexion.close()
+
+
+@pytest.fixture
+def aplicacion(tmp_path, monkeypatch):
+    """Módulo app iniciado sobre una base y carpetas temporales, sin la limpieza en segundo plano"""
+    # Las plantillas se buscan en el directorio de trabajo del primer import
+    monkeypatch.chdir(RAIZ)
+    import app
+
+    for clave, ruta in (('DATABASE', 'informes.db'), ('UPLOAD_FOLDER', 'uploads'),
+                        ('REPORT_FOLDER', 'reports'), ('IMAGE_CACHE_FOLDER', 'cache/imagenes')):
+        monkeypatch.setitem(app.app.config, clave, str(tmp_path / ruta))
+    monkeypatch.setitem(app.app.config, 'TEMPLATE_CACHE_FOLDER', None)
+    app.iniciar_aplicacion(limpieza=False)
+    yield app
+    app.apagar()
+
+
+@pytest.fixture
+def cliente(aplicacion):
+    return aplicacion.app.test_client()
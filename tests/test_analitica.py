@@ -0,0 +1,75 @@
+"""Analítica por periodo: los totales de los triggers coinciden con un recuento desde cero."""
+from collections import Counter
+from datetime import date, timedelta
+
+from db import conectar
+from analitica import conteos_por_periodo, inicio_periodo, reconstruir_conteos_periodo
+
+INICIO = date(2025, 1, 1)
+
+
+def sembrar(conn):
+    with conn:
+        conn.executemany("INSERT INTO maquinas (nombre) VALUES (?)", [(f"Máquina {i}",) for i in range(4)])
+        ids = [fila[0] for fila in conn.execute("SELECT id FROM maquinas ORDER BY id")]
+        conn.executemany("""INSERT INTO informes (maquina_id, fecha, hora, descripcion)
+                            VALUES (?, ?, '08:30', 'Revisión')""",
+                         [(ids[n % 4], (INICIO + timedelta(days=n * 7 % 120)).isoformat()) for n in range(600)])
+    return ids
+
+
+def recuento(conn, agrupacion, fecha_inicio, fecha_fin):
+    """Lo mismo que conteos_por_periodo, contando los informes uno a uno"""
+    conteos = {}
+    for maquina_id, fecha in conn.execute("SELECT maquina_id, fecha FROM informes WHERE fecha BETWEEN ? AND ?",
+                                          (fecha_inicio.isoformat(), fecha_fin.isoformat())):
+        periodo = inicio_periodo(agrupacion, date.fromisoformat(fecha)).isoformat()
+        conteos.setdefault(periodo, Counter())[maquina_id] += 1
+    return {periodo: dict(totales) for periodo, totales in conteos.items()}
+
+
+def comprobar(conn):
+    # Rangos con extremos parciales (del 10 de enero al 20 de abril) y enteros
+    for fecha_inicio, fecha_fin in [(date(2025, 1, 10), date(2025, 4, 20)), (date(2024, 12, 30), date(2025, 5, 4))]:
+        for agrupacion in ('dia', 'semana', 'mes'):
+            esperado = recuento(conn, agrupacion, fecha_inicio, fecha_fin)
+            obtenido = {periodo: totales
+                        for periodo, totales in conteos_por_periodo(conn, agrupacion, fecha_inicio, fecha_fin)
+                        if totales}
+            assert obtenido == esperado, (agrupacion, fecha_inicio, fecha_fin)
+
+
+def test_totales_siguen_altas_ediciones_y_borrados(conn):
+    ids = sembrar(conn)
+    comprobar(conn)
+    with conn:
+        conn.execute("UPDATE informes SET fecha = '2025-03-31' WHERE id % 5 = 0")
+        conn.execute("UPDATE informes SET maquina_id = ? WHERE id % 7 = 0", (ids[1],))
+        conn.execute("DELETE FROM informes WHERE id % 11 = 0")
+    comprobar(conn)
+    # La cascada de una máquina borrada también descuenta sus informes
+    with conn:
+        conn.execute("DELETE FROM maquinas WHERE id = ?", (ids[2],))
+    comprobar(conn)
+    assert conn.execute("SELECT COUNT(*) FROM informes_periodo WHERE total <= 0").fetchone()[0] == 0
+
+    antes = conn.execute("SELECT * FROM informes_periodo ORDER BY 1, 2, 3").fetchall()
+    with conn:
+        reconstruir_conteos_periodo(conn)
+    assert conn.execute("SELECT * FROM informes_periodo ORDER BY 1, 2, 3").fetchall() == antes
+
+
+def test_consulta_no_espera_a_un_escritor(conn, tmp_path):
+    sembrar(conn)
+    escritor = conectar(str(tmp_path / 'informes.db'), wal=True)
+    escritor.execute("BEGIN IMMEDIATE")
+    escritor.execute("DELETE FROM informes")
+    try:
+        # Con el candado de escritura tomado por otro la consulta lee su instantánea sin bloquearse
+        conn.execute("PRAGMA busy_timeout = 0")
+        serie = conteos_por_periodo(conn, 'mes', date(2025, 1, 1), date(2025, 4, 30))
+    finally:
+        escritor.rollback()
+        escritor.close()
+    assert sum(sum(totales.values()) for _, totales in serie) == 600
+    assert not conn.in_transaction
@@ -0,0 +1,29 @@
+"""Páginas condicionales: If-Modified-Since no da un 304 viejo tras dos escrituras en el mismo segundo."""
+from datetime import datetime, timezone
+
+from db import conexion
+
+
+def fijar_modificacion(momento):
+    with conexion() as conn, conn:
+        conn.execute("UPDATE estado_datos SET modificado_en = ? WHERE id = 1", (momento,))
+
+
+def test_if_modified_since_solo_con_el_segundo_terminado(aplicacion, cliente, monkeypatch):
+    monkeypatch.setattr(aplicacion, 'ARRANQUE', datetime(2020, 1, 1, tzinfo=timezone.utc))
+
+    # Aún puede haber otra escritura en ese segundo: ni se envía ni se respeta la fecha
+    fijar_modificacion('2999-01-01 00:00:00')
+    assert cliente.get('/').last_modified is None
+    respuesta = cliente.get('/', headers={'If-Modified-Since': 'Tue, 01 Jan 2999 00:00:00 GMT'})
+    assert respuesta.status_code == 200 and respuesta.last_modified is None
+
+    # Con el segundo ya terminado, If-Modified-Since vale, salvo que también llegue If-None-Match
+    fijar_modificacion('2021-06-01 12:00:00')
+    respuesta = cliente.get('/')
+    assert respuesta.status_code == 200
+    assert respuesta.last_modified == datetime(2021, 6, 1, 12, tzinfo=timezone.utc)
+    fecha = respuesta.headers['Last-Modified']
+    assert cliente.get('/', headers={'If-Modified-Since': fecha}).status_code == 304
+    respuesta = cliente.get('/', headers={'If-Modified-Since': fecha, 'If-None-Match': '"otra"'})
+    assert respuesta.status_code == 200
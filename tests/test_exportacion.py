@@ -0,0 +1,68 @@
+"""Exportación en streaming: la memoria no crece con la cantidad de informes."""
+import csv
+import io
+import json
+import zlib
+import tracemalloc
+
+import pytest
+
+from db import conectar
+from migraciones import aplicar_migraciones
+from exportacion import CAMPOS, GENERADORES, comprimir_gzip, consultar_filas_exportacion
+
+FILAS = 80000
+# Pico de memoria permitido mientras se recorren los trozos; la salida completa ocupa al menos el doble
+PRESUPUESTO = 4 * 1024 * 1024
+
+
+def filas_sinteticas(n):
+    for i in range(n):
+        hora = '' if i % 10 == 0 else f"{i % 24:02d}:{i % 60:02d}"
+        yield (f"Máquina {i % 50}", f"20{10 + i % 15}-{1 + i % 12:02d}-{1 + i % 28:02d}", hora,
+               f"Descripción del informe {i}: revisión del monedero y limpieza del lector")
+
+
+@pytest.fixture(scope='module')
+def conn_grande(tmp_path_factory):
+    conn = conectar(str(tmp_path_factory.mktemp('exportacion') / 'informes.db'), wal=True)
+    aplicar_migraciones(conn)
+    with conn:
+        conn.executemany("INSERT INTO maquinas (nombre) VALUES (?)", [(f"Máquina {i}",) for i in range(50)])
+        conn.executemany("""INSERT INTO informes (maquina_id, fecha, hora, descripcion)
+                            VALUES ((SELECT id FROM maquinas WHERE nombre = ?), ?, ?, ?)""", filas_sinteticas(FILAS))
+    yield conn
+    conn.close()
+
+
+@pytest.mark.parametrize('gzip', [False, True], ids=['plano', 'gzip'])
+@pytest.mark.parametrize('formato', ['csv', 'jsonl'])
+def test_exportacion_con_memoria_acotada(conn_grande, formato, gzip):
+    trozos = GENERADORES[formato](consultar_filas_exportacion(conn_grande))
+    if gzip:
+        trozos = comprimir_gzip(trozos)
+    descompresor = zlib.decompressobj(31) if gzip else None
+    total = 0
+    lineas = 0
+    ultimo = b''
+    tracemalloc.start()
+    try:
+        for trozo in trozos:
+            if descompresor is not None:
+                trozo = descompresor.decompress(trozo)
+            total += len(trozo)
+            lineas += trozo.count(b'\n')
+            ultimo = trozo[-4096:] or ultimo
+        pico = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    assert total > 2 * PRESUPUESTO
+    assert pico < PRESUPUESTO, f"pico de {pico / 1024 / 1024:.1f} MB"
+    # Todas las filas, y la última completa (la exportación ordena por máquina, fecha y hora)
+    assert lineas == FILAS + (formato == 'csv')
+    final = ultimo.decode('utf-8').rstrip('\n').rsplit('\n', 1)[-1]
+    if formato == 'csv':
+        assert next(csv.reader(io.StringIO(final)))[1] == 'Máquina 9'
+    else:
+        assert set(json.loads(final)) == set(CAMPOS)
@@ -0,0 +1,25 @@
+"""URLs de las imágenes subidas: siguen a UPLOAD_FOLDER en vez de suponer static/uploads."""
+import os
+
+from imagenes import ProcesadorImagenes, ruta_variante
+
+
+def test_url_variante_con_el_prefijo_de_las_subidas(tmp_path):
+    procesador = ProcesadorImagenes(str(tmp_path), max_hilos=1, prefijo_url='datos/fotos/')
+    try:
+        # Sin la variante se muestra la original
+        assert procesador.url_variante('a1b2.png', 'tarjeta') == 'datos/fotos/a1b2.png'
+        variante = ruta_variante(str(tmp_path), 'a1b2.png', 'tarjeta')
+        os.makedirs(os.path.dirname(variante))
+        open(variante, 'wb').close()
+        assert procesador.url_variante('a1b2.png', 'tarjeta') == 'datos/fotos/variantes/a1b2.tarjeta.webp'
+    finally:
+        procesador.cerrar()
+
+
+def test_url_imagen_sigue_a_upload_folder(aplicacion, monkeypatch):
+    aplicacion.apagar()
+    monkeypatch.setitem(aplicacion.app.config, 'UPLOAD_FOLDER', os.path.join(aplicacion.app.static_folder, 'fotos'))
+    aplicacion.iniciar_aplicacion(limpieza=False)
+    with aplicacion.app.test_request_context():
+        assert aplicacion.url_imagen('a1b2.png') == '/static/fotos/a1b2.png'
@@ -0,0 +1,53 @@
+"""Importación de CSV: la codificación se resuelve antes de guardar ninguna fila y un error de la base
+de datos solo afecta a su fila."""
+import io
+
+import pytest
+
+from importacion import Importador, leer_filas
+
+CABECERA = 'nombre_maquina;fecha;hora;descripcion\r\n'
+
+
+def csv_con(filas, codificacion):
+    lineas = [f'Máquina {n % 3};2025-03-{1 + n % 28:02d};08:30;Revisión del lector nº {n}\r\n' for n in range(filas)]
+    return (CABECERA + ''.join(lineas)).encode(codificacion)
+
+
+def importar(conn, contenido, tmp_path):
+    importador = Importador(conn, str(tmp_path / 'uploads'), tamano_lote=10)
+    return importador.importar(leer_filas(io.BytesIO(contenido), 'csv'))
+
+
+@pytest.mark.parametrize('codificacion', ['utf-8', 'utf-8-sig', 'cp1252'])
+def test_csv_en_utf8_o_ansi(conn, tmp_path, codificacion):
+    resultado = importar(conn, csv_con(50, codificacion), tmp_path)
+    assert resultado.insertados == 50 and not resultado.errores
+    assert resultado.maquinas_creadas == 3
+    nombres = [fila[0] for fila in conn.execute("SELECT nombre FROM maquinas ORDER BY nombre")]
+    assert nombres == ['Máquina 0', 'Máquina 1', 'Máquina 2']
+    assert conn.execute("SELECT COUNT(*) FROM informes WHERE descripcion LIKE 'Revisión del lector nº %'"
+                        ).fetchone()[0] == 50
+
+
+def test_mezcla_de_codificaciones_se_rechaza_sin_importar_nada(conn, tmp_path):
+    # Varios lotes en UTF-8 y, más allá del primer bloque leído, una fila en cp1252
+    contenido = csv_con(2000, 'utf-8') + 'Máquina 9;2025-03-01;;Sin novedad\r\n'.encode('cp1252')
+    assert len(contenido) > 64 * 1024
+    with pytest.raises(ValueError, match='mezcla'):
+        importar(conn, contenido, tmp_path)
+    assert conn.execute("SELECT COUNT(*) FROM informes").fetchone()[0] == 0
+
+
+def test_fila_rechazada_por_la_base_no_tumba_su_lote(conn, tmp_path):
+    # Una restricción que solo viola una fila del segundo lote
+    conn.execute("""CREATE TRIGGER rechazar_fila BEFORE INSERT ON informes
+                    WHEN new.descripcion = 'Revisión del lector nº 13' BEGIN
+                        SELECT RAISE(ABORT, 'fila rechazada');
+                    END""")
+    resultado = importar(conn, csv_con(25, 'utf-8'), tmp_path)
+    # La fila 1 es la cabecera: el informe nº 13 está en la fila 15
+    assert resultado.errores == [(15, 'Error guardando la fila: fila rechazada')]
+    assert resultado.insertados == 24
+    assert resultado.maquinas_creadas == 3
+    assert conn.execute("SELECT COUNT(*) FROM informes").fetchone()[0] == 24
@@ -0,0 +1,139 @@
+"""Regresión del motor compartido de informes PDF (RenderizadorInforme).
+
+La referencia (datos/referencia_informes_pdf.json) se generó con las rutas
+anteriores al motor compartido, que armaban cada PDF con su propio bucle, a
+partir de los mismos datos fijos. El informe general y el personalizado deben
+tener las mismas páginas y el mismo texto; la fecha del pie se ignora.
+"""
+import os
+import re
+import json
+import random
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+
+REFERENCIA = os.path.join(os.path.dirname(__file__), 'datos', 'referencia_informes_pdf.json')
+
+MAQUINAS = ['Cívica - Gran Avenida', 'Metro - Cable Aéreo', 'Recaudo - Niquía', 'Tullave - Poblado']
+TITULO_GENERAL = 'INFORME TÉCNICO DE MÁQUINAS'
+TITULO_PERSONALIZADO = 'INFORME DEL 1 AL 15 DE MARZO'
+RANGO_PERSONALIZADO = ('2025-03-01', '2025-03-15')
+PIES = ('Informe generado el', 'Datos actualizados al')
+
+
+def informes_fijos():
+    """(máquina, fecha, hora, descripción) deterministas: varias páginas, horas vacías y acentos"""
+    aleatorio = random.Random(5)
+    frases = ['Se realiza mantenimiento preventivo del monedero.', 'Se reemplaza la impresora térmica (modelo B).',
+              'El lector rechazaba tarjetas válidas; se limpia el cabezal.', 'Sin novedad — servicio normal.',
+              'Se encontró polvo acumulado en los ventiladores y se limpia con aire comprimido.']
+    filas = {}
+    while len(filas) < 90:
+        fecha = date(2025, 2, 1) + timedelta(days=aleatorio.randrange(60))
+        hora = '' if aleatorio.random() < 0.2 else f"{aleatorio.randint(6, 21):02d}:{aleatorio.randrange(60):02d}"
+        descripcion = ' '.join(aleatorio.choice(frases) for _ in range(aleatorio.randint(1, 4)))
+        # Sin empates de máquina, fecha y hora: el orden de las filas no depende del desempate
+        filas.setdefault((aleatorio.choice(MAQUINAS), fecha.isoformat(), hora), descripcion)
+    return [(*clave, descripcion) for clave, descripcion in filas.items()]
+
+
+def extraer(pdf):
+    """Cantidad de páginas y textos dibujados (sin el pie con la fecha) de un PDF sin comprimir"""
+    paginas = len(re.findall(rb'/Type /Page\b(?!s)', pdf))
+    textos = []
+    for crudo in re.findall(rb'\(((?:\\.|[^\\)])*)\) Tj', pdf):
+        texto = re.sub(rb'\\(.)', rb'\1', crudo).decode('latin-1')
+        if not texto.startswith(PIES):
+            textos.append(texto)
+    return {'paginas': paginas, 'textos': textos}
+
+
+def renderizar(conn, titulo, fecha_inicio=None, fecha_fin=None):
+    from informes_pdf import RenderizadorInforme, formatear_periodo
+    from modelos import consultar_informes, consultar_rango_fechas
+
+    if fecha_inicio is None:
+        periodo = formatear_periodo(*consultar_rango_fechas(conn))
+    else:
+        periodo = formatear_periodo(date.fromisoformat(fecha_inicio), date.fromisoformat(fecha_fin))
+    renderizador = RenderizadorInforme(titulo, periodo, 'no_existe')
+    renderizador.pdf.set_compression(False)
+    renderizador.renderizar(consultar_informes(conn, fecha_inicio, fecha_fin))
+    return extraer(bytes(renderizador.pdf.output()))
+
+
+@pytest.fixture
+def conn_con_informes(conn):
+    with conn:
+        conn.executemany("INSERT INTO maquinas (nombre) VALUES (?)", [(m,) for m in MAQUINAS])
+        conn.executemany("""INSERT INTO informes (maquina_id, fecha, hora, descripcion)
+                            VALUES ((SELECT id FROM maquinas WHERE nombre = ?), ?, ?, ?)""", informes_fijos())
+    return conn
+
+
+@pytest.fixture(scope='module')
+def referencia():
+    with open(REFERENCIA, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def test_informe_general_igual_que_antes(conn_con_informes, referencia):
+    resultado = renderizar(conn_con_informes, TITULO_GENERAL)
+    assert resultado['paginas'] == referencia['general']['paginas']
+    assert resultado['textos'] == referencia['general']['textos']
+
+
+def test_informe_personalizado_igual_que_antes(conn_con_informes, referencia):
+    resultado = renderizar(conn_con_informes, TITULO_PERSONALIZADO, *RANGO_PERSONALIZADO)
+    assert resultado['paginas'] == referencia['personalizado']['paginas']
+    assert resultado['textos'] == referencia['personalizado']['textos']
+
+
+def test_pie_con_la_fecha_de_los_datos(conn_con_informes):
+    # Un PDF de la caché puede servirse días después: el pie no lleva la hora de generación
+    from informes_pdf import RenderizadorInforme
+    from modelos import consultar_informes
+
+    datos_al = datetime(2025, 3, 16, 14, 5, tzinfo=timezone.utc)
+    renderizador = RenderizadorInforme(TITULO_GENERAL, 'Periodo', 'no_existe', datos_al=datos_al)
+    renderizador.pdf.set_compression(False)
+    renderizador.renderizar(consultar_informes(conn_con_informes))
+    pdf = bytes(renderizador.pdf.output())
+    esperado = f"Datos actualizados al {datos_al.astimezone().strftime('%d/%m/%Y a las %H:%M')}"
+    assert f"({esperado}) Tj".encode('latin-1') in pdf
+    assert b'Informe generado el' not in pdf
+
+
+def test_guardados_simultaneos_en_la_misma_ruta(conn_con_informes, tmp_path, monkeypatch):
+    # Dos peticiones idénticas a la vez escriben el mismo archivo de la caché
+    import threading
+    from concurrent.futures import ThreadPoolExecutor
+    import informes_pdf
+    from modelos import consultar_informes
+
+    informes = list(consultar_informes(conn_con_informes))
+    carpeta = tmp_path / 'reports'
+    carpeta.mkdir()
+    ruta = str(carpeta / 'cache_igual.pdf')
+
+    # Ambos terminan de escribir su temporal antes de que cualquiera lo renombre
+    ambos_escritos = threading.Barrier(2, timeout=30)
+    reemplazar = os.replace
+
+    def reemplazar_juntos(origen, destino):
+        ambos_escritos.wait()
+        reemplazar(origen, destino)
+
+    monkeypatch.setattr(informes_pdf.os, 'replace', reemplazar_juntos)
+
+    def guardar(_):
+        renderizador = informes_pdf.RenderizadorInforme(TITULO_GENERAL, 'Periodo', 'no_existe')
+        renderizador.renderizar(informes)
+        return renderizador.guardar(ruta)
+
+    with ThreadPoolExecutor(2) as hilos:
+        assert list(hilos.map(guardar, range(2))) == [ruta] * 2
+    assert os.listdir(carpeta) == ['cache_igual.pdf']
+    with open(ruta, 'rb') as f:
+        assert f.read(5) == b'%PDF-'
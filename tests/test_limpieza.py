@@ -0,0 +1,40 @@
+"""Limpieza de informes generados: los PDF a medio escribir no se acumulan y el hilo arranca con la app."""
+import os
+import time
+
+from limpieza import Liberado, Limpiador
+
+
+def crear(ruta, edad):
+    with open(ruta, 'wb') as f:
+        f.write(b'%PDF-')
+    antes = time.time() - edad
+    os.utime(ruta, (antes, antes))
+
+
+def test_temporales_de_la_cache_se_borran_tras_la_gracia(tmp_path):
+    informes = tmp_path / 'reports'
+    informes.mkdir()
+    crear(informes / 'cache_a.pdf', 7200)
+    crear(informes / 'cache_a.pdf.k3j9x_1f.tmp', 7200)
+    crear(informes / 'cache_b.pdf.p0q2m7zd.tmp', 60)
+    limpiador = Limpiador(str(tmp_path / 'uploads'), str(informes), gracia=3600)
+
+    liberado = Liberado()
+    limpiador.limpiar_informes(liberado)
+
+    # La entrada de la caché y el temporal reciente (quizá en escritura) se conservan
+    assert sorted(os.listdir(informes)) == ['cache_a.pdf', 'cache_b.pdf.p0q2m7zd.tmp']
+    assert liberado.categorias == {'temporales': [1, 5]}
+
+
+def test_limpieza_arranca_con_la_aplicacion_y_no_al_importar(aplicacion):
+    # El fixture inicia la aplicación sin la limpieza, como los comandos de consola
+    assert aplicacion.limpiador._hilo is None
+    aplicacion.apagar()
+
+    aplicacion.iniciar_aplicacion()
+    hilo = aplicacion.limpiador._hilo
+    assert hilo is not None and hilo.is_alive()
+    aplicacion.apagar()
+    assert not hilo.is_alive()
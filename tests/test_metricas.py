@@ -0,0 +1,30 @@
+"""Exposición de métricas: la caché de fragmentos publica sus aciertos, fallos y tamaño."""
+from cache_fragmentos import CacheFragmentos
+from metricas import MetricasAplicacion
+
+
+def muestras(metricas):
+    return dict(linea.rsplit(' ', 1) for linea in metricas.exponer().splitlines() if not linea.startswith('#'))
+
+
+def test_cache_fragmentos_en_metricas():
+    cache = CacheFragmentos()
+    metricas = MetricasAplicacion()
+    metricas.registrar_cache_fragmentos(cache)
+
+    cache.obtener(1, 'lista', lambda: '<ul></ul>')
+    cache.obtener(1, 'lista', lambda: '<ul></ul>')
+    cache.obtener(1, 'pagina', lambda: '<p>ñ</p>')
+    valores = muestras(metricas)
+    assert valores['informes_cache_fragmentos_aciertos_total'] == '1'
+    assert valores['informes_cache_fragmentos_fallos_total'] == '2'
+    assert valores['informes_cache_fragmentos_entradas'] == '2'
+    assert valores['informes_cache_fragmentos_bytes'] == str(len('<ul></ul>') + len('<p>ñ</p>'.encode('utf-8')))
+    assert '# TYPE informes_cache_fragmentos_aciertos_total counter' in metricas.exponer()
+    assert '# TYPE informes_cache_fragmentos_bytes gauge' in metricas.exponer()
+
+    # Una escritura (versión nueva) vacía la caché y el tamaño expuesto lo refleja
+    cache.obtener(2, 'lista', lambda: '<ul><li>1</li></ul>')
+    valores = muestras(metricas)
+    assert valores['informes_cache_fragmentos_entradas'] == '1'
+    assert valores['informes_cache_fragmentos_fallos_total'] == '3'
@@ -0,0 +1,44 @@
+"""Caché de ids de máquinas frente a borrados concurrentes."""
+from types import SimpleNamespace
+
+from modelos import IdsMaquinas
+
+
+def crear_maquina(conn, nombre):
+    with conn:
+        return conn.execute("INSERT INTO maquinas (nombre) VALUES (?)", (nombre,)).lastrowid
+
+
+def test_id_leido_durante_un_borrado_no_se_guarda(conn):
+    ids = IdsMaquinas()
+    viejo = crear_maquina(conn, 'Metro - Niquía')
+
+    class BorradoEnMedio:
+        """La máquina se borra (y se olvida) justo después de que la consulta lee su id"""
+
+        def execute(self, sql, parametros=()):
+            fila = conn.execute(sql, parametros).fetchone()
+            with conn:
+                conn.execute("DELETE FROM maquinas WHERE nombre = ?", parametros)
+            ids.olvidar(parametros[0])
+            return SimpleNamespace(fetchone=lambda: fila)
+
+    assert ids.obtener(BorradoEnMedio(), 'Metro - Niquía') == viejo
+
+    # Se vuelve a crear con el mismo nombre: el id viejo no quedó guardado
+    nuevo = crear_maquina(conn, 'Metro - Niquía')
+    assert nuevo != viejo
+    assert ids.obtener(conn, 'Metro - Niquía') == nuevo
+
+
+def test_olvidar_tras_borrar(conn):
+    ids = IdsMaquinas()
+    viejo = crear_maquina(conn, 'Cívica - Poblado')
+    assert ids.obtener(conn, 'Cívica - Poblado') == viejo
+    with conn:
+        conn.execute("DELETE FROM maquinas WHERE id = ?", (viejo,))
+    ids.olvidar('Cívica - Poblado')
+    assert ids.obtener(conn, 'Cívica - Poblado') is None
+    assert ids.obtener(conn, 'Cívica - Poblado') is None
+    nuevo = crear_maquina(conn, 'Cívica - Poblado')
+    assert ids.obtener(conn, 'Cívica - Poblado') == nuevo
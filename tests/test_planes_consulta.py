@@ -0,0 +1,107 @@
+"""Planes de las consultas de lectura de informes (EXPLAIN QUERY PLAN).
+
+Cada función de lectura se ejecuta sobre una base migrada y se captura el SQL
+que envía a SQLite. Las que listan informes deben recorrer un índice
+idx_informes_* ya en el orden pedido: sin SCAN de la tabla informes y sin
+B-tree temporal para el ORDER BY. La lectura de un informe por su id usa la
+clave primaria y solo se comprueba que no recorra la tabla.
+"""
+import re
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+import pytest
+
+import db
+from exportacion import consultar_filas_exportacion
+from modelos import consultar_informes, consultar_maquinas_con_informes, consultar_rango_fechas
+
+MAQUINAS = ['Metro - Niquía', 'Cívica - Poblado', 'Recaudo - Envigado']
+RANGO = ('2025-01-10', '2025-01-20')
+
+
+@contextmanager
+def capturar_consultas():
+    """Lista con el SQL de cada consulta ejecutada dentro del bloque"""
+    consultas = []
+    anterior = db._observador
+    db.observar_consultas(lambda sql, segundos: consultas.append(sql))
+    try:
+        yield consultas
+    finally:
+        db.observar_consultas(anterior)
+
+
+def lecturas_de_informes(consultas):
+    return [sql for sql in consultas
+            if sql.lstrip().upper().startswith('SELECT') and re.search(r'\binformes\b', sql)]
+
+
+def plan(conn, sql):
+    parametros = [None] * sql.count('?')
+    return [fila[3] for fila in conn.execute(f"EXPLAIN QUERY PLAN {sql}", parametros)]
+
+
+def revisar_plan(conn, sql, usa_indice=True):
+    pasos = plan(conn, sql)
+    detalle = f"{sql}\n" + '\n'.join(pasos)
+    assert not any(re.match(r'SCAN (informes|i)\b', paso) for paso in pasos), detalle
+    assert not any('USE TEMP B-TREE FOR ORDER BY' in paso for paso in pasos), detalle
+    if usa_indice:
+        assert any('idx_informes_' in paso for paso in pasos), detalle
+
+
+@pytest.fixture
+def conn_con_informes(conn):
+    filas = []
+    for n in range(600):
+        fecha = date(2025, 1, 1) + timedelta(days=n % 40)
+        filas.append((MAQUINAS[n % len(MAQUINAS)], fecha.isoformat(), f"{6 + n % 12:02d}:{n % 60:02d}",
+                      f"Novedad {n}"))
+    with conn:
+        conn.executemany("INSERT INTO maquinas (nombre) VALUES (?)", [(m,) for m in MAQUINAS])
+        conn.executemany("""INSERT INTO informes (maquina_id, fecha, hora, descripcion)
+                            VALUES ((SELECT id FROM maquinas WHERE nombre = ?), ?, ?, ?)""", filas)
+    return conn
+
+
+@pytest.mark.parametrize('leer', [
+    lambda conn: list(consultar_informes(conn)),
+    lambda conn: list(consultar_informes(conn, *RANGO)),
+    lambda conn: list(consultar_informes(conn, maquina_id=1)),
+    lambda conn: list(consultar_informes(conn, *RANGO, maquina_id=1)),
+    lambda conn: consultar_maquinas_con_informes(conn, *RANGO),
+    lambda conn: consultar_rango_fechas(conn),
+    lambda conn: list(consultar_filas_exportacion(conn)),
+    lambda conn: list(consultar_filas_exportacion(conn, fecha_inicio=RANGO[0], fecha_fin=RANGO[1])),
+    lambda conn: list(consultar_filas_exportacion(conn, maquina_id=2)),
+], ids=['informes', 'informes_rango', 'informes_maquina', 'informes_maquina_rango', 'maquinas_con_informes',
+        'rango_fechas', 'exportacion', 'exportacion_rango', 'exportacion_maquina'])
+def test_lecturas_de_modelos_usan_indices(conn_con_informes, leer):
+    with capturar_consultas() as consultas:
+        assert leer(conn_con_informes)
+    lecturas = lecturas_de_informes(consultas)
+    assert lecturas
+    for sql in lecturas:
+        revisar_plan(conn_con_informes, sql)
+
+
+def test_lecturas_de_la_aplicacion_usan_indices(conn_con_informes, aplicacion):
+    maquina = MAQUINAS[0]
+    with capturar_consultas() as consultas:
+        assert aplicacion.get_informes_por_maquina(maquina)
+        pagina = aplicacion.get_pagina_informes_maquina(maquina, 5)
+        siguiente = aplicacion.decodificar_cursor(pagina['siguiente'])
+        pagina = aplicacion.get_pagina_informes_maquina(maquina, 5, despues=siguiente)
+        aplicacion.get_pagina_informes_maquina(maquina, 5, antes=aplicacion.decodificar_cursor(pagina['anterior']))
+        assert aplicacion.get_informes_por_fechas(*RANGO)
+        assert aplicacion.get_rango_fechas()
+    lecturas = lecturas_de_informes(consultas)
+    assert len(lecturas) == 6
+    for sql in lecturas:
+        revisar_plan(conn_con_informes, sql)
+
+    with capturar_consultas() as consultas:
+        assert aplicacion.get_informe_by_id(1)
+    for sql in lecturas_de_informes(consultas):
+        revisar_plan(conn_con_informes, sql, usa_indice=False)
@@ -0,0 +1,127 @@
+"""Apagado del servidor: las peticiones en curso terminan antes de cerrar."""
+import sys
+import time
+import signal
+import socket
+import subprocess
+import threading
+import urllib.request
+
+import pytest
+from flask import Flask
+from waitress import wasyncore
+from waitress.channel import HTTPChannel
+from waitress.server import BaseWSGIServer
+
+from conftest import lanzar_python
+from servidor import _dejar_de_escuchar, _mapa, crear_servidor, peticiones_en_curso
+
+SERVIDOR = r'''
+import sys, time
+from flask import Flask, Response, request
+from servidor import servir
+
+app = Flask(__name__)
+
+@app.route('/lento')
+def lento():
+    lineas = int(request.args.get('lineas', 10))
+
+    def generar():
+        for n in range(lineas):
+            time.sleep(0.2)
+            yield f"{n}\n"
+    return Response(generar(), mimetype='text/plain')
+
+servir(app, al_apagar=[lambda: print('apagado', flush=True)], espera_maxima=float(sys.argv[2]),
+       puerto=int(sys.argv[1]), hilos=2)
+'''
+
+
+def puerto_libre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def arrancar(espera_maxima):
+    puerto = puerto_libre()
+    proceso = lanzar_python(SERVIDOR, puerto, espera_maxima, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                            text=True)
+    assert 'Sirviendo en' in proceso.stdout.readline()
+    return proceso, f'http://127.0.0.1:{puerto}/lento'
+
+
+def pedir_en_segundo_plano(url):
+    respuesta = {}
+
+    def pedir():
+        try:
+            with urllib.request.urlopen(url, timeout=10) as r:
+                respuesta['cuerpo'] = r.read().decode()
+        except Exception as e:
+            respuesta['error'] = e
+
+    hilo = threading.Thread(target=pedir)
+    hilo.start()
+    time.sleep(0.5)
+    return hilo, respuesta
+
+
+@pytest.mark.skipif(sys.platform == 'win32', reason='SIGTERM no se puede atrapar en Windows')
+def test_sigterm_espera_la_peticion_en_curso():
+    proceso, url = arrancar(espera_maxima=10)
+    hilo, respuesta = pedir_en_segundo_plano(url)
+    proceso.send_signal(signal.SIGTERM)
+    hilo.join(10)
+    salida, _ = proceso.communicate(timeout=10)
+
+    assert respuesta.get('cuerpo') == ''.join(f"{n}\n" for n in range(10))
+    assert proceso.returncode == 0
+    assert 'Esperando 1 peticiones en curso' in salida and 'apagado' in salida
+
+
+@pytest.mark.skipif(sys.platform == 'win32', reason='SIGTERM no se puede atrapar en Windows')
+def test_espera_maxima_corta_la_peticion():
+    # 100 líneas a 0,2 s: la petición duraría 20 s
+    proceso, url = arrancar(espera_maxima=0.3)
+    hilo, respuesta = pedir_en_segundo_plano(url + '?lineas=100')
+    inicio = time.monotonic()
+    proceso.send_signal(signal.SIGTERM)
+    salida, _ = proceso.communicate(timeout=15)
+    hilo.join(10)
+
+    assert respuesta.get('cuerpo', '').count('\n') < 100
+    assert 'Se cortan 1 peticiones' in salida and 'apagado' in salida
+    # espera_maxima más los 5 s que waitress espera a sus hilos
+    assert time.monotonic() - inicio < 8
+
+
+def test_internos_de_waitress_que_usa_el_apagado():
+    # servidor.py usa partes internas de waitress (versión fijada en requirements.txt);
+    # si una versión nueva las cambia, esto falla en vez de un apagado que no espera
+    servidor = crear_servidor(Flask(__name__), puerto=0, hilos=1)
+    mapa = _mapa(servidor)
+    try:
+        assert isinstance(mapa, dict)
+        assert any(isinstance(d, BaseWSGIServer) for d in mapa.values())
+        assert servidor.adj.asyncore_loop_timeout > 0
+        assert isinstance(servidor.adj.asyncore_use_poll, bool)
+        assert callable(servidor.task_dispatcher.shutdown)
+
+        with socket.create_connection(('127.0.0.1', servidor.effective_port)):
+            for _ in range(20):
+                wasyncore.loop(timeout=0.1, map=mapa, count=1)
+                canales = [c for c in mapa.values() if isinstance(c, HTTPChannel)]
+                if canales:
+                    break
+            assert canales, 'waitress no dejó la conexión aceptada en el mapa'
+            assert canales[0].requests == [] and canales[0].total_outbufs_len == 0
+            assert peticiones_en_curso(servidor) == 0
+
+            _dejar_de_escuchar(servidor)
+            assert not any(isinstance(d, BaseWSGIServer) for d in mapa.values())
+            assert canales[0] in mapa.values()
+    finally:
+        servidor.task_dispatcher.shutdown()
+        wasyncore.close_all(mapa)
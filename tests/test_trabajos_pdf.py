@@ -0,0 +1,56 @@
+"""Cola de informes PDF: un proceso que muere no deja la cola inservible y un PDF borrado no da un 500."""
+import os
+import concurrent.futures
+
+import pytest
+
+from trabajos_pdf import ERROR, TERMINADO, ColaInformes
+
+
+@pytest.fixture
+def cola(tmp_path):
+    cola = ColaInformes(str(tmp_path / 'trabajos'), max_procesos=1)
+    yield cola
+    cola.cerrar(esperar=True)
+
+
+@pytest.fixture
+def config(conn, tmp_path):
+    return {
+        'DATABASE': str(tmp_path / 'informes.db'),
+        'UPLOAD_FOLDER': str(tmp_path / 'uploads'),
+        'IMAGE_CACHE_FOLDER': str(tmp_path / 'cache'),
+        'IMAGE_CACHE_MAX_BYTES': 1024 * 1024,
+    }
+
+
+def esperar(trabajo):
+    concurrent.futures.wait([trabajo.future], timeout=60)
+    return trabajo.estado
+
+
+def test_pool_roto_se_reemplaza(cola, config):
+    # El único proceso del pool muere y con él el pool; el trabajo que esperaba falla
+    cola._get_executor().submit(os._exit, 1)
+    perdido = cola.enviar('personalizado', 'PRUEBA', '2025-01-01', '2025-01-31', config)
+    assert esperar(perdido) == ERROR
+    assert 'terminated abruptly' in perdido.como_dict()['error']
+
+    # La misma solicitud no reutiliza el trabajo fallido y se renderiza en un pool nuevo
+    trabajo = cola.enviar('personalizado', 'PRUEBA', '2025-01-01', '2025-01-31', config)
+    assert trabajo is not perdido
+    assert esperar(trabajo) == TERMINADO
+    assert os.path.getsize(trabajo.ruta_salida) > 0
+
+
+def test_descarga_de_un_pdf_desalojado(aplicacion, cliente):
+    id = cliente.post('/informes/trabajos', json={'tipo': 'general'}).get_json()['id']
+    trabajo = aplicacion.cola_informes.obtener(id)
+    trabajo.future.result(timeout=60)
+    assert cliente.get(f'/informes/trabajos/{id}/descarga').status_code == 200
+
+    # El desalojo de la caché o la limpieza borran el PDF
+    os.remove(trabajo.ruta_salida)
+    respuesta = cliente.get(f'/informes/trabajos/{id}/descarga')
+    assert respuesta.status_code == 410
+    assert 'vuelva a solicitarlo' in respuesta.get_json()['error']
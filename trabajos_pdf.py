@@ -0,0 +1,342 @@
+import os
+import sys
+import json
+import uuid
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from datetime import date, datetime
+
+from db import conectar
+from analitica import actividad_maquinas, agrupacion_para_rango
+from modelos import consultar_estado_datos, consultar_informes, consultar_rango_fechas
+from informes_pdf import formatear_periodo, generar_informe
+from imagenes import CacheDerivados
+from metricas import Fases
+
+logger = logging.getLogger(__name__)
+
+# Cuántas máquinas renderiza un proceso del paquete antes de ser reemplazado,
+# para que la memoria que retiene fpdf no crezca sin límite
+TAREAS_POR_PROCESO = 25
+
+# Estados de un trabajo
+PENDIENTE = 'pendiente'
+EN_PROCESO = 'en_proceso'
+TERMINADO = 'terminado'
+ERROR = 'error'
+
+
+def _escribir_progreso(ruta, datos):
+    temporal = f"{ruta}.tmp"
+    with open(temporal, 'w', encoding='utf-8') as f:
+        json.dump(datos, f)
+    os.replace(temporal, ruta)
+
+
+def resumen_actividad(conn, fecha_inicio, fecha_fin):
+    """Datos de la página de resumen de un informe entre dos fechas ISO"""
+    fecha_inicio, fecha_fin = date.fromisoformat(fecha_inicio), date.fromisoformat(fecha_fin)
+    return actividad_maquinas(conn, agrupacion_para_rango(fecha_inicio, fecha_fin), fecha_inicio, fecha_fin)
+
+
+def renderizar_en_proceso(parametros):
+    """Renderiza un informe en un proceso del pool.
+
+    No depende de la aplicación Flask: abre su propia conexión y escribe el
+    progreso (y al final el tiempo de cada fase) en un archivo JSON que el
+    proceso principal consulta.
+    """
+    ruta_progreso = parametros['ruta_progreso']
+    _escribir_progreso(ruta_progreso, {'estado': EN_PROCESO, 'maquinas': 0, 'filas': 0})
+
+    progreso = {'maquinas': 0, 'filas': 0}
+
+    def al_progresar(maquinas, filas):
+        progreso.update(maquinas=maquinas, filas=filas)
+        _escribir_progreso(ruta_progreso, {'estado': EN_PROCESO, **progreso})
+
+    cache = CacheDerivados(parametros['carpeta_cache'], parametros['cache_max_bytes'], ancho_mm=45, dpi=150)
+    fases = Fases()
+    conn = conectar(parametros['database'])
+    try:
+        fecha_inicio = parametros['fecha_inicio']
+        fecha_fin = parametros['fecha_fin']
+        if fecha_inicio is None:
+            with fases.medir('consulta'):
+                periodo_text = formatear_periodo(*consultar_rango_fechas(conn))
+        else:
+            periodo_text = formatear_periodo(date.fromisoformat(fecha_inicio), date.fromisoformat(fecha_fin))
+        resumen = None
+        if parametros.get('resumen') and fecha_inicio is not None:
+            with fases.medir('consulta'):
+                resumen = resumen_actividad(conn, fecha_inicio, fecha_fin)
+        # El PDF puede ir a la caché: el pie lleva la fecha de los datos, no la de hoy
+        _, datos_al = consultar_estado_datos(conn)
+        generar_informe(consultar_informes(conn, fecha_inicio, fecha_fin), parametros['titulo'], periodo_text,
+                        parametros['carpeta_imagenes'], parametros['ruta_salida'], cache.obtener, al_progresar,
+                        fases, resumen, datos_al)
+    finally:
+        conn.close()
+    _escribir_progreso(ruta_progreso, {'estado': EN_PROCESO, **progreso, 'fases': fases.como_dict()})
+    return parametros['ruta_salida']
+
+
+def renderizar_maquina_en_proceso(parametros):
+    """Renderiza el PDF de una sola máquina; devuelve los segundos por fase.
+
+    Las filas se leen del cursor a medida que se dibujan y el PDF se escribe
+    en disco, así la memoria del proceso depende solo de esa máquina.
+    """
+    fases = Fases()
+    cache = CacheDerivados(parametros['carpeta_cache'], parametros['cache_max_bytes'], ancho_mm=45, dpi=150)
+    conn = conectar(parametros['database'])
+    try:
+        informes = consultar_informes(conn, parametros['fecha_inicio'], parametros['fecha_fin'],
+                                      parametros['maquina_id'])
+        generar_informe(informes, parametros['titulo'], parametros['periodo_text'], parametros['carpeta_imagenes'],
+                        parametros['ruta_salida'], cache.obtener, fases=fases)
+    finally:
+        conn.close()
+    return fases.como_dict()
+
+
+class Trabajo:
+    """Estado de un informe PDF generado en segundo plano"""
+
+    def __init__(self, id, clave, titulo, nombre_descarga, ruta_salida, ruta_progreso):
+        self.id = id
+        self.clave = clave
+        self.titulo = titulo
+        self.nombre_descarga = nombre_descarga
+        self.ruta_salida = ruta_salida
+        self.ruta_progreso = ruta_progreso
+        self.creado_en = datetime.now()
+        self.future = None
+
+    @property
+    def estado(self):
+        if self.future is None or not self.future.done():
+            return EN_PROCESO if os.path.exists(self.ruta_progreso) else PENDIENTE
+        return ERROR if self.future.exception() is not None else TERMINADO
+
+    def _leer_progreso(self):
+        try:
+            with open(self.ruta_progreso, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def progreso(self):
+        datos = self._leer_progreso()
+        return datos.get('maquinas', 0), datos.get('filas', 0)
+
+    def fases(self):
+        """Segundos por fase del renderizado, una vez terminado (o None)"""
+        return self._leer_progreso().get('fases')
+
+    def como_dict(self):
+        maquinas, filas = self.progreso()
+        estado = self.estado
+        datos = {
+            'id': self.id,
+            'titulo': self.titulo,
+            'estado': estado,
+            'maquinas': maquinas,
+            'filas': filas,
+            'creado_en': self.creado_en.isoformat(timespec='seconds'),
+        }
+        if estado == ERROR:
+            datos['error'] = str(self.future.exception())
+        elif estado == TERMINADO:
+            fases = self.fases()
+            if fases:
+                datos['fases'] = fases
+        return datos
+
+
+class ColaInformes:
+    """Cola de informes PDF renderizados en un pool de procesos.
+
+    Las solicitudes idénticas (mismo tipo, título, rango y versión de datos)
+    mientras una está en curso comparten el mismo trabajo. Con una caché de
+    informes, un acierto devuelve un trabajo ya terminado sin renderizar.
+    `al_medir(tipo, fases)` recibe los segundos por fase de cada renderizado.
+    """
+
+    def __init__(self, carpeta, max_procesos=2, max_terminados=100, cache=None, al_medir=None):
+        self.carpeta = carpeta
+        self.max_procesos = max_procesos
+        self.max_terminados = max_terminados
+        self.cache = cache
+        self.al_medir = al_medir
+        self._executor = None
+        # Reentrante: el callback de un trabajo ya terminado se ejecuta dentro de enviar()
+        self._lock = threading.RLock()
+        self._trabajos = {}
+        self._en_curso = {}
+        os.makedirs(carpeta, exist_ok=True)
+
+    def _get_executor(self):
+        # 'spawn' evita heredar hilos y conexiones abiertas, y es lo que usa Windows
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_procesos,
+                                                 mp_context=multiprocessing.get_context('spawn'))
+        return self._executor
+
+    def _enviar_al_pool(self, funcion, parametros):
+        try:
+            return self._get_executor().submit(funcion, parametros)
+        except BrokenProcessPool as e:
+            # Si un proceso murió (p. ej. sin memoria) el pool queda roto: el propio pool marca
+            # con BrokenProcessPool los trabajos que tenía, no acepta más y este va a uno nuevo
+            logger.warning("Pool de informes PDF roto (%s); se crea uno nuevo", e)
+            self._executor.shutdown(wait=False)
+            self._executor = None
+            return self._get_executor().submit(funcion, parametros)
+
+    def enviar(self, tipo, titulo, fecha_inicio, fecha_fin, config, version=None, resumen=False):
+        """Encola un informe o devuelve el trabajo idéntico que ya está en curso"""
+        clave = (tipo, titulo, fecha_inicio, fecha_fin, version, resumen)
+        with self._lock:
+            trabajo = self._trabajos.get(self._en_curso.get(clave))
+            if trabajo is not None and trabajo.estado in (PENDIENTE, EN_PROCESO):
+                return trabajo
+
+            id = uuid.uuid4().hex
+            prefijo = 'informe_maquinas' if tipo == 'general' else 'informe_personalizado'
+            nombre_descarga = f"{prefijo}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
+            ruta_salida = os.path.join(self.carpeta, f"{id}.pdf")
+
+            clave_cache = None
+            if self.cache is not None and version is not None:
+                clave_cache = self.cache.clave(tipo, titulo, fecha_inicio, fecha_fin, version, resumen)
+                ruta_salida = self.cache.ruta(clave_cache)
+                if self.cache.obtener(clave_cache) is not None:
+                    # Acierto: el trabajo nace terminado
+                    trabajo = Trabajo(id, clave, titulo, nombre_descarga, ruta_salida,
+                                      os.path.join(self.carpeta, f"{id}.json"))
+                    trabajo.future = Future()
+                    trabajo.future.set_result(ruta_salida)
+                    self._trabajos[id] = trabajo
+                    self._purgar()
+                    return trabajo
+
+            trabajo = Trabajo(id, clave, titulo, nombre_descarga, ruta_salida,
+                              os.path.join(self.carpeta, f"{id}.json"))
+            parametros = {
+                'database': config['DATABASE'],
+                'carpeta_imagenes': config['UPLOAD_FOLDER'],
+                'carpeta_cache': config['IMAGE_CACHE_FOLDER'],
+                'cache_max_bytes': config['IMAGE_CACHE_MAX_BYTES'],
+                'titulo': titulo,
+                'fecha_inicio': fecha_inicio,
+                'fecha_fin': fecha_fin,
+                'resumen': resumen,
+                'ruta_salida': trabajo.ruta_salida,
+                'ruta_progreso': trabajo.ruta_progreso,
+            }
+            trabajo.future = self._enviar_al_pool(renderizar_en_proceso, parametros)
+            trabajo.future.add_done_callback(
+                lambda f, trabajo=trabajo, clave_cache=clave_cache: self._terminar(f, trabajo, clave_cache))
+            self._trabajos[id] = trabajo
+            self._en_curso[clave] = id
+            self._purgar()
+            return trabajo
+
+    def _terminar(self, future, trabajo, clave_cache):
+        with self._lock:
+            if self._en_curso.get(trabajo.clave) == trabajo.id:
+                del self._en_curso[trabajo.clave]
+        if future.cancelled() or future.exception() is not None:
+            return
+        if clave_cache is not None:
+            self.cache.registrar(clave_cache)
+        fases = trabajo.fases()
+        if self.al_medir is not None and fases:
+            self.al_medir(trabajo.clave[0], fases)
+
+    def _purgar(self):
+        # Olvidar los trabajos terminados más antiguos (sus archivos quedan en disco)
+        terminados = [t for t in self._trabajos.values() if t.future is not None and t.future.done()]
+        for trabajo in sorted(terminados, key=lambda t: t.creado_en)[:-self.max_terminados or None]:
+            del self._trabajos[trabajo.id]
+            if os.path.exists(trabajo.ruta_progreso):
+                os.remove(trabajo.ruta_progreso)
+
+    def obtener(self, id):
+        with self._lock:
+            return self._trabajos.get(id)
+
+    def cerrar(self, esperar=True):
+        if self._executor is not None:
+            self._executor.shutdown(wait=esperar)
+
+
+class PaqueteMaquinas:
+    """Renderiza un PDF por máquina en un pool de procesos, uno por núcleo.
+
+    Las máquinas se envían de la que más informes tiene a la que menos, así
+    las grandes empiezan primero y el paquete termina en un tiempo cercano al
+    de la máquina más grande. `al_medir(tipo, fases)` recibe los segundos por
+    fase de cada PDF.
+    """
+
+    def __init__(self, max_procesos=None, al_medir=None):
+        self.max_procesos = max_procesos or os.cpu_count() or 2
+        self.al_medir = al_medir
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self, roto=None):
+        with self._lock:
+            # Un pool roto (un proceso murió) no acepta más envíos: se reemplaza, salvo que
+            # otro hilo ya lo haya hecho
+            if roto is not None and self._executor is roto:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+            if self._executor is None:
+                opciones = {}
+                if sys.version_info >= (3, 11):
+                    opciones['max_tasks_per_child'] = TAREAS_POR_PROCESO
+                self._executor = ProcessPoolExecutor(max_workers=self.max_procesos,
+                                                     mp_context=multiprocessing.get_context('spawn'), **opciones)
+            return self._executor
+
+    def renderizar(self, maquinas, parametros, carpeta):
+        """Entrega (nombre, ruta del PDF, error) a medida que cada PDF termina.
+
+        `maquinas` son pares (id, nombre).
+
+        Si quien consume deja de iterar (p. ej. el cliente cortó la descarga),
+        se cancelan las máquinas que aún no empezaron.
+        """
+        executor = self._get_executor()
+        futures = {}
+        for i, (maquina_id, nombre) in enumerate(maquinas):
+            ruta = os.path.join(carpeta, f"{i:05d}.pdf")
+            parametros_maquina = dict(parametros, maquina_id=maquina_id, ruta_salida=ruta)
+            try:
+                future = executor.submit(renderizar_maquina_en_proceso, parametros_maquina)
+            except BrokenProcessPool as e:
+                # Las máquinas ya enviadas fallan con el pool; las demás van a uno nuevo
+                logger.warning("Pool de paquetes PDF roto (%s); se crea uno nuevo", e)
+                executor = self._get_executor(roto=executor)
+                future = executor.submit(renderizar_maquina_en_proceso, parametros_maquina)
+            futures[future] = (nombre, ruta)
+        try:
+            for future in as_completed(futures):
+                nombre, ruta = futures[future]
+                error = future.exception()
+                if error is None and self.al_medir is not None:
+                    self.al_medir('maquina', future.result())
+                yield nombre, ruta, error
+        finally:
+            for future in futures:
+                future.cancel()
+
+    def cerrar(self, esperar=True):
+        if self._executor is not None:
+            self._executor.shutdown(wait=esperar, cancel_futures=True)